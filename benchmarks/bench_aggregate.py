@@ -0,0 +1,58 @@
+"""Cost per reading of WindowAggregator, and the memory it holds.
+
+Readings from many sources arrive every few seconds, including a stream of
+sources heard only once (as with rolling codes changed on battery swaps).
+Run with:
+
+    python benchmarks/bench_aggregate.py [sources] [hours]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.message import TempMessage
+from rfxcom.aggregate import WindowAggregator
+
+def readings(n, seconds, seed=1):
+    rng = random.Random(seed)
+    temps = [rng.uniform(15, 25) for i in range(n)]
+    transient = 0
+    for t in range(seconds):
+        for i in range(0, n, 40):
+            s = (t + i) % n
+            yield t, TempMessage(source='thgr228n.%d' % s, temp=temps[s], humidity=50)
+        transient += 1
+        yield t, TempMessage(source='transient.%d' % transient, temp=20.0)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    messages = list(readings(n, int(hours * 3600)))
+    print('%d readings from %d sources and %d transient ones' % (len(messages), n, int(hours * 3600)))
+    print('%-20s %12s %12s %12s %10s' % ('', 'us/reading', 'summaries', 'max series', 'evicted'))
+    for window, step, max_series in ((60, None, 10000), (300, 60, 10000), (60, None, 200)):
+        summaries = [0]
+        def on_summary(summary):
+            summaries[0] += 1
+        agg = WindowAggregator(on_summary, window=window, step=step, max_series=max_series)
+        largest = 0
+        start = timer()
+        for i, (now, message) in enumerate(messages):
+            agg.add(message, now)
+            if not i % 1000:
+                largest = max(largest, len(agg.series))
+        agg.flush()
+        elapsed = timer() - start
+        name = '%ds%s' % (window, step and ' every %ds' % step or '')
+        if max_series < 10000:
+            name += ' max %d' % max_series
+        print('%-20s %12.2f %12d %12d %10d' % (name, elapsed / len(messages) * 1e6,
+                                              summaries[0], largest, agg.evicted))
+
+if __name__ == '__main__':
+    main()
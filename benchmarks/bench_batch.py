@@ -0,0 +1,44 @@
+"""Per-frame decoding vs batch decoding of an archive with NumPy.
+
+Run with:
+
+    python benchmarks/bench_batch.py [packets]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import logging
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, batch
+from rfxcom.framing import FrameBuffer
+from rfxcom.generators import frames, wire
+
+def per_frame(data):
+    rfx = RFXCom(None, log=False, dedup=0)
+    buffer = FrameBuffer()
+    buffer.feed(data)
+    return sum(1 for length, packet in buffer if rfx.decode(length, packet))
+
+def batched(data):
+    return sum(len(columns['frame']) for columns in batch.decode(data).values())
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    data = wire(frames(n, invalid=0.05, seed=1))
+    print('%-10s %10s %12s %10s' % ('method', 'decoded', 'frames/s', 'us/frame'))
+    for name, func in (('per-frame', per_frame), ('batch', batched)):
+        start = timer()
+        decoded = func(data)
+        elapsed = timer() - start
+        print('%-10s %10d %12.0f %10.2f' % (name, decoded, n / elapsed, elapsed / n * 1e6))
+
+if __name__ == '__main__':
+    main()
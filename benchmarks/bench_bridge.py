@@ -0,0 +1,154 @@
+"""Streaming to many clients: BridgeServer vs a blocking send per record.
+
+A capture of synthetic frames is replayed into a server with a number of
+clients on loopback, each wanting frames and messages, and drained by one
+reader thread. The naive server encodes each record again for each client
+and sends it with sendall(); BridgeServer encodes it once and writes
+what each pass of its loop produced with one non-blocking send per
+client. Then one more client connects and never reads: the naive server
+is held up by it until its sends time out, while BridgeServer evicts it
+and carries on. Both servers have a small kernel send buffer per client
+then, so the stalled one is noticed within the capture. Run with:
+
+    python benchmarks/bench_bridge.py [frames]
+"""
+from __future__ import print_function
+
+import io
+import os
+import sys
+import socket
+import select
+import logging
+import threading
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.bridge import BridgeServer, encode_frame, encode_message, SIZE, KINDS
+from rfxcom.capture import CaptureWriter, CaptureReader, ReplayRFXSerial
+from rfxcom.dedup import Deduplicator
+from rfxcom.generators import frames
+from rfxcom.parsers import registry
+
+# kernel send buffer per client with a stalled one, so it is found out
+# within the capture rather than after megabytes
+SNDBUF = 16384
+
+def capture(n):
+    f = io.BytesIO()
+    w = CaptureWriter(f, start=0.0)
+    for i, (length, data) in enumerate(frames(n, invalid=0.05, seed=1)):
+        w.write(length, data, offset=i * 0.001)
+    return f.getvalue()
+
+def consume(socks, received):
+    """Read every socket until the server closes it."""
+    waiting = list(socks)
+    while waiting:
+        ready = select.select(waiting, [], [], 5.0)[0]
+        if not ready:
+            return
+        for sock in ready:
+            data = sock.recv(1 << 16)
+            received[0] += len(data)
+            if not data:
+                waiting.remove(sock)
+
+def connect(address, count):
+    socks = []
+    for i in range(count):
+        sock = socket.create_connection(address)
+        sock.sendall(SIZE.pack(KINDS))
+        socks.append(sock)
+    return socks
+
+def stalled(address):
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(address)
+    sock.sendall(SIZE.pack(KINDS))
+    return sock
+
+def naive(data, count, stall):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(64)
+    socks = connect(listener.getsockname(), count)
+    extra = [stalled(listener.getsockname())] if stall else []
+    clients = []
+    for i in range(count + len(extra)):
+        sock, address = listener.accept()
+        sock.recv(1)
+        sock.settimeout(2.0)
+        if stall:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SNDBUF)
+        clients.append(sock)
+    received = [0]
+    reader = threading.Thread(target=consume, args=(socks, received))
+    reader.start()
+    start = timer()
+    dedup = Deduplicator(2.5)
+    blocked = False
+    try:
+        for offset, length, payload in CaptureReader(io.BytesIO(data)):
+            records = [encode_frame(length, payload)]
+            message = registry.parse(length, bytearray(payload))
+            if message and not dedup.seen(message):
+                records.append(encode_message(message))
+            for client in clients:
+                for record in records:
+                    client.sendall(record)
+    except socket.timeout:
+        blocked = True
+    for sock in clients:
+        sock.close()
+    reader.join()
+    elapsed = timer() - start
+    for sock in socks + extra + [listener]:
+        sock.close()
+    return elapsed, received[0], 'blocked' if blocked else ''
+
+def bridged(data, count, stall):
+    server = BridgeServer(('127.0.0.1', 0), udp=False)
+    if stall:
+        server.sndbuf = SNDBUF
+    socks = connect(server.address, count)
+    extra = [stalled(server.address)] if stall else []
+    while len(server) < count + len(extra):
+        server.run_once()
+    received = [0]
+    reader = threading.Thread(target=consume, args=(socks, received))
+    reader.start()
+    start = timer()
+    receiver = server.add('replay', device=io.BytesIO(data), serial_type=ReplayRFXSerial)
+    while receiver.fin.in_waiting:
+        server.run_once()
+    # a stalled client short of max_buffer is never drained
+    behind = set(sock.getsockname() for sock in extra)
+    while any(c.buffer for c in server.clients.values() if c.address not in behind):
+        server.run_once()
+    evicted = server.evicted
+    server.close()
+    reader.join()
+    elapsed = timer() - start
+    for sock in socks + extra:
+        sock.close()
+    return elapsed, received[0], 'evicted %d' % evicted if evicted else ''
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logging.disable(logging.WARNING)
+    data = capture(n)
+    print('%d frames' % n)
+    print('%8s %8s %-8s %10s %12s %10s  %s' % (
+        'clients', 'stalled', 'server', 'seconds', 'frames/s', 'kB/client', ''))
+    for count, stall in ((1, False), (10, False), (50, False), (10, True)):
+        for name, run in (('naive', naive), ('bridge', bridged)):
+            elapsed, received, note = run(data, count, stall)
+            print('%8d %8s %-8s %10.3f %12.0f %10.1f  %s' % (
+                count, 'yes' if stall else 'no', name, elapsed, n / elapsed,
+                received / 1e3 / count, note))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""CPU and allocation per frame: memoryview frames vs copied, unpacked ones.
+
+The old path copied each payload out of the buffer as bytes, then into a
+tuple with struct.unpack('%dB' % len(packet), packet), building the format
+string every time. Frames are now memoryview slices of the buffer that
+parsers index directly. Both are run over a mixed stream fed in 64 byte
+reads, framing alone and with parsing. Per frame the old path allocated
+a bytearray slice, a bytes copy, a format string and a tuple; now it is
+one memoryview. tracemalloc gives the bytes held per frame when packets
+are kept, as the trace does. Run with:
+
+    python benchmarks/bench_decode.py [frames]
+"""
+from __future__ import print_function
+
+import os
+import gc
+import sys
+import struct
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.framing import FrameBuffer, frame_size
+from rfxcom.generators import frames, wire
+from rfxcom.parsers import registry
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+class CopyingFrameBuffer(FrameBuffer):
+    """FrameBuffer as it was, copying each payload out as bytes."""
+
+    def next_frame(self):
+        buf = self.buffer
+        pos = self.pos
+        if pos >= len(buf):
+            return None
+        length = buf[pos]
+        end = pos + 1 + frame_size(length)
+        if end > len(buf):
+            return None
+        data = bytes(buf[pos+1:end])
+        if end == len(buf):
+            del buf[:]
+            self.pos = 0
+        else:
+            self.pos = end
+        return length, data
+
+def copied(chunks, parse, keep=None):
+    buffer = CopyingFrameBuffer()
+    for chunk in chunks:
+        buffer.feed(chunk)
+        for length, data in buffer:
+            packet = struct.unpack('%dB' % len(data), data)
+            if parse:
+                parse(length, packet)
+            if keep is not None:
+                keep.append(packet)
+
+def viewed(chunks, parse, keep=None):
+    buffer = FrameBuffer()
+    for chunk in chunks:
+        buffer.feed(chunk)
+        for length, packet in buffer:
+            if parse:
+                parse(length, packet)
+            if keep is not None:
+                keep.append(packet)
+
+def timed(func, chunks, parse, n, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = timer()
+        func(chunks, parse)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / n * 1e6
+
+def held(func, chunks, n):
+    """Bytes held per frame with the packets kept."""
+    if tracemalloc is None:
+        return None
+    keep = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    func(chunks, None, keep)
+    held = (tracemalloc.get_traced_memory()[0] - before) / float(n)
+    tracemalloc.stop()
+    return held
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    data = wire(frames(n, seed=1))
+    chunks = [data[i:i + 64] for i in range(0, len(data), 64)]
+    gc.disable()
+    print('%-8s %12s %12s %12s' % ('', 'framing us', 'decode us', 'held B/fr'))
+    for name, func in (('copied', copied), ('viewed', viewed)):
+        size = held(func, chunks, n)
+        print('%-8s %12.3f %12.3f %12s' % (
+            name, timed(func, chunks, None, n), timed(func, chunks, registry.parse, n),
+            size is None and '-' or '%.0f' % size))
+
+if __name__ == '__main__':
+    main()
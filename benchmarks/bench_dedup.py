@@ -0,0 +1,90 @@
+"""Per-packet cost of duplicate suppression as the window grows.
+
+Compares the old parallel-list window from RFXCom.decode against
+rfxcom.dedup.Deduplicator, over the Record types decode yields for
+synthetic frames of every protocol (see rfxcom.generators), arriving in
+shuffled order. Run with:
+
+    python benchmarks/bench_dedup.py
+"""
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.dedup import Deduplicator
+from rfxcom.generators import frames
+from rfxcom.parsers import registry
+
+class ListWindow(object):
+    """The list based window previously inlined in RFXCom.decode."""
+    def __init__(self, dedup=2.5):
+        self.dedup = dedup
+        self.last_messages = []
+        self.last_timestamps = []
+
+    def seen(self, message, now):
+        expire_before = now - self.dedup
+        while self.last_messages and self.last_timestamps[0] < expire_before:
+            self.last_messages.pop(0)
+            self.last_timestamps.pop(0)
+        if message in self.last_messages:
+            i = self.last_messages.index(message)
+            self.last_messages.pop(i)
+            self.last_timestamps.pop(i)
+            self.last_messages.append(message)
+            self.last_timestamps.append(now)
+            return True
+        self.last_messages.append(message)
+        self.last_timestamps.append(now)
+        return False
+
+def messages(n, seed=1):
+    """n distinct messages, decoded from synthetic frames."""
+    msgs = []
+    seen = set()
+    for length, data in frames(n * 4, seed=seed):
+        message = registry.parse(length, bytearray(data))
+        if message is not None and message not in seen:
+            seen.add(message)
+            msgs.append(message)
+            if len(msgs) == n:
+                break
+    return msgs
+
+def arrivals(msgs, packets, seed=2):
+    # each round of len(msgs) packets is every message once, in a new order,
+    # so repeats are found anywhere in the window, not at its head
+    rng = random.Random(seed)
+    order = []
+    while len(order) < packets:
+        batch = list(msgs)
+        rng.shuffle(batch)
+        order.extend(batch)
+    return order[:packets]
+
+def run(window, order, n):
+    # steady state: window holds n live entries, arriving 1/n s apart
+    now = 0.0
+    step = 1.0 / n
+    for message in order:
+        window.seen(message, now)
+        now += step
+
+def main():
+    packets = 20000
+    print('%8s %14s %14s' % ('window', 'list us/pkt', 'hashed us/pkt'))
+    for size in (10, 100, 1000, 5000):
+        msgs = messages(size)
+        order = arrivals(msgs, packets)
+        results = []
+        for factory in (ListWindow, Deduplicator):
+            # a TTL of 2.5s with each message repeating within 2s keeps every message live
+            t = min(timeit.repeat(lambda: run(factory(2.5), order, size), number=1, repeat=3))
+            results.append(t / packets * 1e6)
+        print('%8d %14.2f %14.2f' % (size, results[0], results[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""End to end through a pty: rfxcom.emulator load profiles read by RFXCom.
+
+Each profile is sent by an Emulator at the pace of a 4800 baud line and
+read through Pyserial (or TTYSerial without pyserial) for the given
+seconds. Reported are frames sent and read, the messages they made,
+short reads and resyncs, the delay from a transmission being due to its
+last byte being sent (queueing on the line, then its own transfer) and
+RFXCom's latency from a frame's first byte to on_message, as means and
+the bucket holding the 99th percentile. Sped-up rows show the line
+saturating: the delay grows, while the reader keeps up. Run with:
+
+    python benchmarks/bench_emulator.py [seconds]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, Pyserial
+from rfxcom.emulator import Emulator, TTYSerial, sensors, pir, corrupted, mixed
+
+try:
+    import serial
+    serial_type = Pyserial
+except ImportError:
+    serial_type = TTYSerial
+
+def profiles(seconds):
+    # (name, profile, speed), durations in profile time
+    return [
+        ('500 oregon', sensors(500, duration=seconds, seed=1), 1.0),
+        ('500 oregon x1.5', sensors(500, duration=seconds * 1.5, seed=1), 1.5),
+        ('64 pir + oregon', mixed(sensors(500, duration=seconds, seed=1),
+                                  pir(64, rate=0.05, duration=seconds, seed=2)), 1.0),
+        ('corrupted 2%', corrupted(mixed(sensors(500, duration=seconds, seed=1),
+                                         pir(64, rate=0.05, duration=seconds, seed=2)),
+                                   rate=0.02, seed=3), 1.0),
+    ]
+
+def percentile(histogram, q=0.99):
+    total = histogram['count']
+    for bound, count in histogram['buckets']:
+        if count >= q * total:
+            return bound
+    return '+Inf'
+
+def mean(histogram):
+    return histogram['sum'] / histogram['count'] if histogram['count'] else 0.0
+
+def run(profile, speed, seconds):
+    emulator = Emulator(profile, speed=speed)
+    rfx = RFXCom(lambda message: None, device=emulator.device, serial_type=serial_type)
+    rfx.setup()
+
+    def stop():
+        emulator.wait(seconds * 2 + 10)
+        # let the reader take what is on its way through the pty; misframed
+        # bytes make more or fewer frames than were sent
+        deadline = time.time() + 2
+        while rfx.metrics.frames < emulator.frames and time.time() < deadline:
+            time.sleep(0.01)
+        rfx.stop()
+    stopper = threading.Thread(target=stop)
+    stopper.start()
+    rfx.run()
+    stopper.join()
+    rfx.close()
+    emulator.close()
+    return emulator.stats(), rfx.stats()
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    logging.disable(logging.CRITICAL)
+    print('%s, %gs per profile' % (serial_type.__name__, seconds))
+    print('%-16s %7s %7s %8s %6s %7s %9s %11s %9s %11s' % (
+        '', 'sent', 'read', 'messages', 'short', 'resync', 'delay ms', 'delay p99', 'read ms', 'read p99'))
+    for name, profile, speed in profiles(seconds):
+        emulated, stats = run(profile, speed, seconds)
+        delay, latency = emulated['delay'], stats['latency']
+        print('%-16s %7d %7d %8d %6d %7d %9.1f %11s %9.2f %11s' % (
+            name, emulated['frames'], stats['frames'], stats['messages'], stats['short_reads'],
+            stats['resyncs'], mean(delay) * 1e3, '<= %s' % percentile(delay),
+            mean(latency) * 1e3, '<= %s' % percentile(latency)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Reads and CPU per frame: buffered FrameReader vs the old run_once loop.
+
+The old loop read a one byte header then the payload, setting fin.timeout
+before each. Both are measured over FakeRFXSerial and, when pyserial is
+installed, over Pyserial attached to a pseudo-terminal. Device calls are
+counted at the serial type boundary; run under ``strace -c -f`` for exact
+syscall counts. Run with:
+
+    python benchmarks/bench_framing.py
+"""
+import os
+import sys
+import struct
+import binascii
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import FakeRFXSerial, Pyserial
+from rfxcom.framing import FrameReader
+
+FRAMES = [(32, '649b08f7'), (34, 'c7e05de000'), (0x50, 'fa282462320290053c64'),
+          (120, 'ea00a642000000169bff5f1dc05408')]
+
+def cpu():
+    t = os.times()
+    return t[0] + t[1]
+
+class Counting(object):
+    """Counts calls made on a serial type."""
+    def __init__(self, base):
+        self.__dict__.update(base=base, reads=0, waits=0, timeouts=0)
+
+    def read(self, size=1):
+        self.reads += 1
+        return self.base.read(size)
+
+    @property
+    def in_waiting(self):
+        self.__dict__['waits'] += 1
+        return self.base.in_waiting
+
+    def __setattr__(self, k, v):
+        if k == 'timeout':
+            self.__dict__['timeouts'] += 1
+            setattr(self.base, k, v)
+        else:
+            self.__dict__[k] = v
+
+def legacy(fin, n):
+    for i in range(n):
+        fin.timeout = 1.00
+        while True:
+            b = fin.read(1)
+            if b:
+                break
+        length = ord(b)
+        size = ((length & 0x7F) + 7) // 8
+        fin.timeout = .030
+        data = fin.read(size)
+        assert len(data) == size
+
+def buffered(fin, n):
+    reader = FrameReader(fin)
+    for i in range(n):
+        while True:
+            frame = reader.next_frame()
+            if frame:
+                break
+            reader.fill()
+
+def report(name, fin, n, elapsed):
+    print('%-22s %10.2f %8.3f %8.3f %8.3f' % (
+        name, elapsed / n * 1e6, float(fin.reads) / n,
+        float(fin.waits) / n, float(fin.timeouts) / n))
+
+def bench_fake(n):
+    class Fake(FakeRFXSerial):
+        packets = FRAMES * (n // len(FRAMES))
+    for name, loop in (('fake/legacy', legacy), ('fake/buffered', buffered)):
+        fin = Counting(Fake())
+        start = cpu()
+        loop(fin, len(Fake.packets))
+        report(name, fin, len(Fake.packets), cpu() - start)
+
+def bench_pty(n):
+    try:
+        import serial
+    except ImportError:
+        print('pyserial not installed, skipping pty benchmark')
+        return
+    stream = b''.join(struct.pack('B', length) + binascii.unhexlify(data) for length, data in FRAMES)
+    frames = n // len(FRAMES)
+    for name, loop in (('pyserial/legacy', legacy), ('pyserial/buffered', buffered)):
+        master, slave = os.openpty()
+        fin = Counting(Pyserial(os.ttyname(slave), 4800))
+        def writer():
+            for i in range(frames):
+                os.write(master, stream)
+        t = threading.Thread(target=writer)
+        start = cpu()
+        t.start()
+        loop(fin, frames * len(FRAMES))
+        elapsed = cpu() - start
+        t.join()
+        report(name, fin, frames * len(FRAMES), elapsed)
+        os.close(master)
+        os.close(slave)
+
+def main():
+    n = 20000
+    print('%-22s %10s %8s %8s %8s' % ('', 'cpu us/fr', 'reads', 'waiting', 'timeouts'))
+    bench_fake(n)
+    bench_pty(n)
+
+if __name__ == '__main__':
+    main()
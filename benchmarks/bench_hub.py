@@ -0,0 +1,121 @@
+"""CPU of one Hub over many receivers vs a thread per receiver.
+
+Each receiver is a pseudo-terminal fed by a child process, which answers
+the handshake then writes every transmission to all of them, as when
+several receivers hear the same device. Requires pyserial. Run with:
+
+    python benchmarks/bench_hub.py [receivers] [frames/s] [seconds]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, Pyserial
+from rfxcom.hub import Hub
+from rfxcom.generators import frames, wire
+
+def cpu():
+    t = os.times()
+    return t[0] + t[1]
+
+def feed(masters, rate, seconds):
+    """Fork a child answering each handshake, then writing frames to every master."""
+    pid = os.fork()
+    if pid:
+        return pid
+    try:
+        for master in masters:
+            for command, response in RFXCom.handshake:
+                os.read(master, 2)
+                os.write(master, response)
+        time.sleep(0.5)
+        stream = [wire([f]) for f in frames(int(rate * seconds), invalid=0, seed=1)]
+        start = time.time()
+        for i, data in enumerate(stream):
+            delay = start + float(i) / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            for master in masters:
+                os.write(master, data)
+    finally:
+        os._exit(0)
+
+def ptys(n):
+    pairs = [os.openpty() for i in range(n)]
+    return [m for m, s in pairs], [os.ttyname(s) for m, s in pairs], pairs
+
+def bench_hub(n, rate, seconds):
+    masters, devices, pairs = ptys(n)
+    pid = feed(masters, rate, seconds)
+    delivered = [0]
+    def on_message(message, receivers):
+        delivered[0] += 1
+    hub = Hub(on_message, log=False)
+    for i, device in enumerate(devices):
+        hub.add('r%d' % i, device=device, serial_type=Pyserial)
+    threading.Timer(seconds + 1.0, hub.stop).start()
+    start = cpu()
+    hub.run()
+    elapsed = cpu() - start
+    read = sum(r.frames for r in hub)
+    os.waitpid(pid, 0)
+    hub.close()
+    for m, s in pairs:
+        os.close(m)
+        os.close(s)
+    return elapsed, read, delivered[0]
+
+def bench_threads(n, rate, seconds):
+    masters, devices, pairs = ptys(n)
+    pid = feed(masters, rate, seconds)
+    delivered = [0]
+    lock = threading.Lock()
+    def on_message(message):
+        with lock:
+            delivered[0] += 1
+    receivers = []
+    for device in devices:
+        rfx = RFXCom(on_message, log=False, device=device)
+        rfx.setup()
+        receivers.append(rfx)
+    threads = [threading.Thread(target=rfx.run) for rfx in receivers]
+    start = cpu()
+    for t in threads:
+        t.start()
+    time.sleep(seconds + 1.0)
+    for rfx in receivers:
+        rfx.stop()
+    for t in threads:
+        t.join()
+    elapsed = cpu() - start
+    os.waitpid(pid, 0)
+    for rfx in receivers:
+        rfx.close()
+    for m, s in pairs:
+        os.close(m)
+        os.close(s)
+    return elapsed, rate * seconds * n, delivered[0]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print('%d receivers, %g transmissions/s for %gs' % (n, rate, seconds))
+    print('%-8s %10s %12s %12s' % ('', 'cpu %', 'us/frame', 'delivered'))
+    for name, bench in (('hub', bench_hub), ('threads', bench_threads)):
+        elapsed, frames_read, delivered = bench(n, rate, seconds)
+        print('%-8s %10.1f %12.1f %12d' % (name, elapsed / (seconds + 1.0) * 100,
+                                          elapsed / frames_read * 1e6, delivered))
+
+if __name__ == '__main__':
+    main()
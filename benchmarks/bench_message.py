@@ -0,0 +1,83 @@
+"""Memory, allocations and CPU of Message vs the per-topic record types.
+
+Memory is measured with tracemalloc where available (Python 3), otherwise
+with sys.getsizeof. Run with:
+
+    python benchmarks/bench_message.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import gc
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.message import Message, TOPICS
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SAMPLES = {
+    'x10': dict(group='a', device='11', command='on', source='a11'),
+    'homeeasy': dict(address='31f8177', device='10', command='on', source='31F8177A'),
+    'temp': dict(source='thgr810.62', sensor='thgr810.62', temp=2.3, humidity=59, battery=90),
+    'wind': dict(source='wtgr800', sensor='wtgr800', dir=3, speed=1.2, avgspeed=1.0),
+    'rain': dict(source='pcr800.3f', sensor='pcr800.3f', speed=0.762, total=31.19, battery=90),
+    'owl': dict(current1=6.6, current2=0.0, current3=0.0, source='a6'),
+}
+
+def old(topic, values):
+    return lambda: Message(topic, **values)
+
+def new(topic, values):
+    cls = TOPICS[topic]
+    return lambda: cls(**values)
+
+def old_key(m):
+    return (m.topic, frozenset(m.values.items()))
+
+def new_key(m):
+    return m
+
+def footprint(factory, n=10000):
+    """(bytes, allocated blocks) per message."""
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        keep = [factory() for i in range(n)]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        size = sum(s.size_diff for s in stats) - sys.getsizeof(keep)
+        blocks = sum(s.count_diff for s in stats) - 1
+        return float(size) / n, float(blocks) / n
+    m = factory()
+    size = sys.getsizeof(m)
+    blocks = 1
+    for attr in ('__dict__', 'values'):
+        d = getattr(m, attr, None)
+        if isinstance(d, dict) and not isinstance(getattr(type(m), attr, None), property):
+            size += sys.getsizeof(d)
+            blocks += 1
+    return float(size), float(blocks)
+
+def cost(stmt, number=20000):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+def main():
+    print('%-9s %-6s %8s %8s %9s %9s %9s' % ('topic', 'class', 'bytes', 'blocks', 'new us', 'key+eq us', 'str us'))
+    for topic, values in sorted(SAMPLES.items()):
+        for name, factory, key in (('old', old(topic, values), old_key), ('record', new(topic, values), new_key)):
+            size, blocks = footprint(factory)
+            a, b = factory(), factory()
+            print('%-9s %-6s %8.0f %8.1f %9.2f %9.2f %9.2f' % (
+                topic, name, size, blocks, cost(factory),
+                cost(lambda: key(a) == key(b)), cost(lambda: str(a))))
+
+if __name__ == '__main__':
+    main()
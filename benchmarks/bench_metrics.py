@@ -0,0 +1,74 @@
+"""Cost of the receive path counters.
+
+Runs a stream of generated frames through RFXCom.run(), as it reads from
+the device, with its Metrics and with one that keeps nothing. Run with:
+
+    python benchmarks/bench_metrics.py [packets] [repeats]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import binascii
+import logging
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, FakeRFXSerial
+from rfxcom.metrics import Metrics
+from rfxcom.generators import frames
+
+class NoHistogram(object):
+    def observe(self, value):
+        pass
+
+class NoMetrics(Metrics):
+    """Takes every update RFXCom makes and keeps none of them."""
+    def __init__(self):
+        Metrics.__init__(self)
+        self.latency = NoHistogram()
+
+    def parsed(self, parser, length, packet):
+        pass
+
+def fake(stream):
+    class Fake(FakeRFXSerial):
+        packets = [(length, binascii.hexlify(data)) for length, data in stream]
+
+        def read(self, size=1):
+            data = FakeRFXSerial.read(self, size)
+            if not data:
+                raise EOFError()
+            return data
+    return Fake
+
+def run(serial_type, metrics):
+    rfx = RFXCom(lambda message: None, log=False, dedup=0, serial_type=serial_type)
+    rfx.metrics = metrics
+    rfx.setup()
+    start = timer()
+    rfx.run()
+    return timer() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    serial_type = fake(frames(n, invalid=0.05, seed=1))
+
+    # interleaved, so both see the same machine
+    counted, bare = [], []
+    for i in range(repeats):
+        counted.append(run(serial_type, Metrics()))
+        bare.append(run(serial_type, NoMetrics()))
+    counted, bare = min(counted), min(bare)
+    print('%d frames' % n)
+    print('%-10s %10.2f us/frame' % ('metrics', counted / n * 1e6))
+    print('%-10s %10.2f us/frame' % ('none', bare / n * 1e6))
+    print('%-10s %10.1f %%' % ('overhead', (counted - bare) / bare * 100))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Gap in received messages when the device is unplugged and comes back.
+
+A pseudo-terminal stands in for the dongle, behind a by-id style symlink.
+Every few seconds it is closed (the read fails, as on a USB reset) and a new
+one appears under the symlink after a re-enumeration delay. The Supervisor
+is run with its defaults and, for comparison, with fixed one second retries.
+Requires pyserial. Run with:
+
+    python benchmarks/bench_reconnect.py [glitches] [re-enumeration ms]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, Pyserial
+from rfxcom.generators import frames, wire
+from rfxcom.metrics import clock
+from rfxcom.supervisor import Supervisor
+
+RATE = 20.0
+PERIOD = 2.0
+
+def device(link, glitches, delay, done):
+    """Serve frames from a pty behind link, unplugging it glitches times."""
+    stream = [wire([f]) for f in frames(int(RATE * PERIOD * (glitches + 1)), invalid=0, seed=1)]
+    sent = 0
+    unplugged = []
+    for generation in range(glitches + 1):
+        master, slave = os.openpty()
+        tmp = link + '.new'
+        os.symlink(os.ttyname(slave), tmp)
+        os.rename(tmp, link)
+        for command, response in RFXCom.handshake:
+            os.read(master, 2)
+            os.write(master, response)
+        end = time.time() + PERIOD
+        while time.time() < end:
+            os.write(master, stream[sent % len(stream)])
+            sent += 1
+            time.sleep(1 / RATE)
+        if generation < glitches:
+            unplugged.append(clock())
+        os.remove(link)
+        os.close(master)
+        os.close(slave)
+        if generation < glitches:
+            time.sleep(delay)
+    done.extend(unplugged)
+
+def run(glitches, delay, **supervisor_kwargs):
+    directory = tempfile.mkdtemp()
+    link = os.path.join(directory, 'usb-RFXCOM-if00-port0')
+    received = []
+    unplugged = []
+    rfx = RFXCom(lambda message: received.append(clock()), log=False, dedup=0,
+                 device=os.path.join(directory, 'usb-RFXCOM-*'), serial_type=Pyserial)
+    feeder = threading.Thread(target=device, args=(link, glitches, delay, unplugged))
+    feeder.start()
+    while not os.path.exists(link):
+        time.sleep(0.01)
+    rfx.setup()
+    supervisor = Supervisor(rfx, **supervisor_kwargs)
+    runner = threading.Thread(target=supervisor.run)
+    runner.start()
+    feeder.join()
+    time.sleep(1.0)
+    rfx.stop()
+    runner.join()
+    shutil.rmtree(directory)
+    # the gap in delivery spanning each unplug
+    gaps = []
+    for t in unplugged:
+        before = max([r for r in received if r <= t] or [t])
+        after = min([r for r in received if r > t] or [t])
+        gaps.append(after - before)
+    return gaps, rfx.stats()
+
+def main():
+    glitches = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 200 / 1000.0
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print('%d unplugs, re-enumerating in %gms, %g frames/s' % (glitches, delay * 1000, RATE))
+    print('%-24s %10s %10s %12s' % ('', 'mean gap', 'max gap', 'reconnects'))
+    for name, kwargs in (('supervisor', {}),
+                         ('fixed 1s retries', dict(backoff=1.0, max_backoff=1.0, handshake_timeout=0.5))):
+        gaps, stats = run(glitches, delay, **kwargs)
+        print('%-24s %9.3fs %9.3fs %12d' % (name, sum(gaps) / len(gaps), max(gaps), stats['reconnects']))
+
+if __name__ == '__main__':
+    main()
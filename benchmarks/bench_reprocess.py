@@ -0,0 +1,64 @@
+"""Frames per second reprocessing a capture, serially and across processes.
+
+A capture of synthetic frames is written to a temporary file, then decoded
+to CSV: by a plain loop over CaptureReader, parsing, deduplicating and
+formatting each frame in turn, and by Reprocessor with one process and
+with one per core. Run with:
+
+    python benchmarks/bench_reprocess.py [frames]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import multiprocessing
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.capture import CaptureWriter, CaptureReader
+from rfxcom.dedup import Deduplicator
+from rfxcom.generators import frames
+from rfxcom.parsers import registry
+from rfxcom.reprocess import Reprocessor
+from rfxcom.sinks import CSVSink
+
+def plain(path, out):
+    reader = CaptureReader(path)
+    dedup = Deduplicator(2.5)
+    for offset, length, data in reader:
+        message = registry.parse(length, bytearray(data))
+        t = reader.start + offset
+        if message and not dedup.seen(message, t):
+            out.write((CSVSink.format(t, message) + '\n').encode('utf-8'))
+    reader.close()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    d = tempfile.mkdtemp()
+    try:
+        path = os.path.join(d, 'traffic.rfx')
+        w = CaptureWriter(path, start=1500000000.0)
+        for i, frame in enumerate(frames(n, invalid=0.05, seed=1)):
+            w.write(*frame, offset=i * 0.5)
+        w.close()
+
+        cores = multiprocessing.cpu_count()
+        print('%d frames, %.1f MB, %d cores' % (n, os.path.getsize(path) / 1e6, cores))
+        print('%-16s %10s %10s' % ('', 'seconds', 'frames/s'))
+        runs = [('plain', plain),
+                ('reprocess -j1', Reprocessor(jobs=1).run),
+                ('reprocess -j%d' % cores, Reprocessor(jobs=cores).run)]
+        for name, run in runs:
+            with open(os.path.join(d, 'out.csv'), 'wb') as out:
+                start = timer()
+                run([path] if name != 'plain' else path, out)
+                elapsed = timer() - start
+            print('%-16s %10.2f %10.0f' % (name, elapsed, n / elapsed))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == '__main__':
+    main()
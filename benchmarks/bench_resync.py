@@ -0,0 +1,85 @@
+"""Messages recovered from a corrupted replay, with and without resync.
+
+A stream of valid frames is damaged at random points, by dropping a byte,
+inserting one or flipping a bit, and replayed back to back with no pauses
+to realign on, as from a capture. Run with:
+
+    python benchmarks/bench_resync.py [frames] [corruptions]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+import logging
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, FakeRFXSerial
+from rfxcom.generators import frames, wire
+
+def corrupted(data, n, rng):
+    data = bytearray(data)
+    for i in range(n):
+        pos = rng.randrange(len(data))
+        kind = rng.choice(('drop', 'insert', 'flip'))
+        if kind == 'drop':
+            del data[pos]
+        elif kind == 'insert':
+            data.insert(pos, rng.randrange(256))
+        else:
+            data[pos] ^= 1 << rng.randrange(8)
+    return bytes(data)
+
+def replay(data, chunk=256):
+    class Replay(FakeRFXSerial):
+        packets = []
+
+        def __init__(self, *args, **kwargs):
+            FakeRFXSerial.__init__(self)
+            self.offset = 0
+
+        def _load(self):
+            if not self.buffer and self.offset < len(data):
+                self.buffer += data[self.offset:self.offset + chunk]
+                self.offset += chunk
+
+        def read(self, size=1):
+            self._load()
+            if not self.buffer:
+                raise EOFError()
+            return FakeRFXSerial.read(self, size)
+    return Replay
+
+def count(data, resync):
+    received = []
+    rfx = RFXCom(received.append, log=False, dedup=0, serial_type=replay(data), resync=resync)
+    rfx.setup()
+    start = timer()
+    rfx.run()
+    return received, timer() - start, rfx.stats()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    damage = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    rng = random.Random(1)
+
+    clean = wire(frames(n, seed=1))
+    expected, elapsed, stats = count(clean, False)
+    data = corrupted(clean, damage, rng)
+    print('%d frames, %d bytes, %d corruptions' % (n, len(clean), damage))
+    print('%-10s %12s %12s %10s %10s' % ('', 'recovered %', 'unhandled', 'resyncs', 'us/byte'))
+    print('%-10s %12.1f %12d %10d %10.2f' % ('clean', 100.0, stats['unhandled'], 0, elapsed / len(clean) * 1e6))
+    for resync in (False, True):
+        received, elapsed, stats = count(data, resync)
+        print('%-10s %12.1f %12d %10d %10.2f' % (resync and 'resync' or 'no resync',
+                                                  100.0 * len(received) / len(expected),
+                                                  stats['unhandled'], stats['resyncs'],
+                                                  elapsed / len(data) * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Dispatch cost per message: Router vs every consumer filtering for itself.
+
+Consumers each want a topic, a source, a source prefix or a glob, drawn
+from the sources in a stream of synthetic messages. Naively, every
+consumer is called with every message and filters it with the same
+tests; the Router looks subscribers up in its indexes. Both deliver to
+the same do-nothing handler, so the difference is the cost of finding
+who wants a message. Run with:
+
+    python benchmarks/bench_router.py [messages]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+import fnmatch
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.generators import frames
+from rfxcom.parsers import registry
+from rfxcom.router import Router
+
+def interests(messages, n, rng):
+    """n (topic, source) subscriptions of the kinds a site would have."""
+    topics = sorted(set(m.topic for m in messages))
+    sources = sorted(set(m.get('source') for m in messages))
+    result = []
+    for i in range(n):
+        kind = i % 4
+        source = rng.choice(sources)
+        if kind == 0:
+            result.append((rng.choice(topics), None))
+        elif kind == 1:
+            result.append((None, source))
+        elif kind == 2:
+            result.append((None, source[:3] + '*'))
+        else:
+            result.append((None, '*' + source[-2:]))
+    return result
+
+def filtering(topic, pattern, handle):
+    def consumer(message):
+        if topic is not None and message.topic != topic:
+            return
+        if pattern is not None and not fnmatch.fnmatchcase(message.get('source') or '', pattern):
+            return
+        handle(message)
+    return consumer
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(1)
+    # a site's worth of sources, heard again and again
+    messages = [registry.parse(length, bytearray(data)) for length, data in frames(2000, seed=1)]
+    messages = [m for m in messages if m]
+    stream = [rng.choice(messages) for i in range(n)]
+    delivered = [0]
+    def handle(message):
+        delivered[0] += 1
+
+    print('%12s %12s %12s %10s' % ('subscribers', 'naive us', 'router us', 'matched'))
+    for count in (5, 20, 100, 500):
+        subs = interests(messages, count, rng)
+        consumers = [filtering(topic, source, handle) for topic, source in subs]
+        delivered[0] = 0
+        start = timer()
+        for message in stream:
+            for consumer in consumers:
+                consumer(message)
+        naive = (timer() - start) / n * 1e6
+        matched = delivered[0]
+
+        router = Router()
+        for topic, source in subs:
+            router.subscribe(handle, topic, source)
+        delivered[0] = 0
+        start = timer()
+        for message in stream:
+            router(message)
+        routed = (timer() - start) / n * 1e6
+        assert delivered[0] == matched, (delivered[0], matched)
+        print('%12d %12.2f %12.2f %10.2f' % (count, naive, routed, float(matched) / n))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Encoding and decoding messages: rfxcom.serialize vs json on a dict.
+
+Messages decoded from synthetic frames are encoded by json.dumps() of
+their values with the topic, as a consumer would do for itself, and by
+to_json(), to_binary() and to_batch(), then decoded again. Fan-out is a
+message going to three consumers that each want JSON: the naive way
+encodes it three times, encoded() once. Run with:
+
+    python benchmarks/bench_serialize.py [messages]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.generators import frames
+from rfxcom.message import Message, Record
+from rfxcom.parsers import registry
+from rfxcom.serialize import (to_json, from_json, to_binary, from_binary,
+                              to_batch, from_batch, encoded)
+
+def dumps(message):
+    values = dict(message.values)
+    values['topic'] = message.topic
+    return json.dumps(values, separators=(',', ':'))
+
+def loads(text):
+    values = json.loads(text)
+    return Message(values.pop('topic'), **values)
+
+def fresh(messages):
+    """Copies of messages with nothing cached."""
+    return [m.__class__(*m._astuple(m)) if isinstance(m, Record) else Message(m.topic, **m.values)
+            for m in messages]
+
+def per_message(func, items, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = timer()
+        func(items)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items) * 1e6
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    stream = [registry.parse(length, bytearray(data)) for length, data in frames(n, seed=1)]
+    messages = [m for m in stream if m]
+    n = len(messages)
+
+    json_naive = [dumps(m) for m in messages]
+    json_fast = [to_json(m) for m in messages]
+    binary = [to_binary(m) for m in messages]
+    batch = to_batch(messages)
+
+    print('%d messages' % n)
+    print('%-18s %10s %10s %10s' % ('', 'encode us', 'decode us', 'bytes'))
+    rows = [
+        ('json.dumps dict', lambda ms: [dumps(m) for m in ms], lambda: [loads(t) for t in json_naive],
+         sum(len(t) for t in json_naive)),
+        ('to_json', lambda ms: [to_json(m) for m in ms], lambda: [from_json(t) for t in json_fast],
+         sum(len(t) for t in json_fast)),
+        ('to_binary', lambda ms: [to_binary(m) for m in ms], lambda: [from_binary(d) for d in binary],
+         sum(len(d) for d in binary)),
+        ('to_batch', to_batch, lambda: from_batch(batch), len(batch)),
+    ]
+    for name, encode, decode, size in rows:
+        # fresh messages, so batches do not find the binary encodings cached
+        enc = per_message(lambda ms: encode(fresh(ms)), messages) - per_message(fresh, messages)
+        dec = per_message(lambda ms: decode(), messages)
+        print('%-18s %10.2f %10.2f %10.1f' % (name, enc, dec, float(size) / n))
+
+    print()
+    print('fan-out to 3 consumers wanting JSON, us per message:')
+    copies = fresh(messages)
+    naive = per_message(lambda ms: [dumps(m) for m in ms for i in range(3)], copies)
+    cached = per_message(lambda ms: [encoded(m) for m in fresh(ms) for i in range(3)], messages)
+    cached -= per_message(fresh, messages)
+    print('%-18s %10.2f' % ('json.dumps x3', naive))
+    print('%-18s %10.2f' % ('encoded x3', cached))
+
+if __name__ == '__main__':
+    main()
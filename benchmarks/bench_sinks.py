@@ -0,0 +1,82 @@
+"""Rows/s written by the batched sinks against a write per message.
+
+The naive writers commit (SQLite) or flush and fsync (files) after every
+message, as an on_message writing straight to storage would to be durable.
+Run with:
+
+    python benchmarks/bench_sinks.py [messages]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import sqlite3
+import logging
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom
+from rfxcom.generators import frames
+from rfxcom.sinks import SQLiteSink, LineProtocolSink, CSVSink
+
+def messages(n):
+    rfx = RFXCom(None, log=False, dedup=0)
+    decoded = (rfx.parse(length, packet) for length, packet in frames(n * 2, invalid=0, seed=1))
+    return [m for m in decoded if m][:n]
+
+def naive_sqlite(path):
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE messages (time REAL, topic TEXT, source TEXT, data TEXT)')
+    def on_message(message):
+        db.execute('INSERT INTO messages VALUES (?, ?, ?, ?)',
+                   (0.0, message.topic, message.get('source'), repr(message)))
+        db.commit()
+    on_message.stop = db.close
+    return on_message
+
+def naive_file(path):
+    f = open(path, 'ab')
+    def on_message(message):
+        f.write(('%s\n' % LineProtocolSink.format(0.0, message)).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+    on_message.stop = f.close
+    return on_message
+
+def bench(make, n, stream, directory):
+    path = os.path.join(directory, 'out%d' % bench.count)
+    bench.count += 1
+    sink = make(path)
+    start = timer()
+    for message in stream[:n]:
+        sink(message)
+    sink.stop()
+    return n / (timer() - start)
+bench.count = 0
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    stream = messages(n)
+    directory = tempfile.mkdtemp()
+    try:
+        # naive writers are run over fewer messages, they are that slow
+        few = min(n, 1000)
+        print('%-28s %12s' % ('', 'rows/s'))
+        for name, make, count in (
+                ('sqlite, commit per message', naive_sqlite, few),
+                ('SQLiteSink', SQLiteSink, n),
+                ('file, fsync per message', naive_file, few),
+                ('LineProtocolSink', LineProtocolSink, n),
+                ('CSVSink', CSVSink, n)):
+            print('%-28s %12.0f' % (name, bench(make, count, stream, directory)))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
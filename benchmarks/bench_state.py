@@ -0,0 +1,57 @@
+"""Messages passed on by a ChangeFilter from a day of simulated sensors.
+
+Oregon thermometers report every 40s and drift slowly, an Owl meter reports
+every 6s with a fluctuating load. Run with:
+
+    python benchmarks/bench_state.py [sensors] [hours]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.message import TempMessage, OwlMessage
+from rfxcom.state import ChangeFilter, THRESHOLDS
+
+def thermometer(rng, source, seconds):
+    temp, humidity = rng.uniform(15, 25), rng.randint(40, 60)
+    for t in range(rng.randint(0, 40), seconds, 40):
+        if rng.random() < 0.05:
+            temp = round(temp + rng.choice((-0.1, 0.1)), 1)
+        if rng.random() < 0.02:
+            humidity += rng.choice((-1, 1))
+        yield t, TempMessage(source=source, sensor=source, temp=temp, humidity=humidity, battery=90)
+
+def meter(rng, source, seconds):
+    load = 2.0
+    for t in range(rng.randint(0, 6), seconds, 6):
+        if rng.random() < 0.1:
+            load = max(0.0, load + rng.uniform(-1, 1))
+        yield t, OwlMessage(current1=round(load + rng.uniform(-0.03, 0.03), 2),
+                            current2=0.0, current3=0.0, source=source)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24
+    seconds = int(hours * 3600)
+    rng = random.Random(1)
+    streams = [thermometer(rng, 'thgr228n.%02x' % i, seconds) for i in range(n)]
+    streams.append(meter(rng, 'owl.1', seconds))
+    messages = sorted((m for s in streams for m in s), key=lambda m: m[0])
+
+    for heartbeat in (300, 600, 3600):
+        f = ChangeFilter(lambda message: None, THRESHOLDS, heartbeat=heartbeat)
+        start = timer()
+        for t, message in messages:
+            f.check(message, t)
+        elapsed = timer() - start
+        print('heartbeat %5ds: %d of %d passed on (%.1fx fewer), %.2f us/message' % (
+            heartbeat, f.passed, len(messages), float(len(messages)) / f.passed,
+            elapsed / len(messages) * 1e6))
+
+if __name__ == '__main__':
+    main()
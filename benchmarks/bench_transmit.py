@@ -0,0 +1,102 @@
+"""Time to send a lighting scene: SendQueue vs writing each command in turn.
+
+A scene switches a number of X10 and HomeEasy devices on, and is switched
+off again shortly after, before it has all been sent, as when a button
+is pressed twice. Time is simulated: a write takes the frame's time down
+a 4800 baud line and the air is busy for the frame's airtime.
+
+The naive sender writes every repeat of every command in turn, waiting
+for each write and each frame's airtime. SendQueue overlaps each write
+with the frame before on air and coalesces the commands superseded by
+the second press. Also measured is the CPU time per command spent
+queueing and scheduling. Run with:
+
+    python benchmarks/bench_transmit.py [devices] [second press after, s]
+"""
+from __future__ import print_function
+
+import os
+import sys
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom.message import X10Message, HomeEasyMessage
+from rfxcom.transmit import SendQueue, AIRTIME, REPEATS, frame
+
+class Null(object):
+    def write(self, data):
+        pass
+
+def scene(devices, command):
+    for i in range(devices):
+        if i % 2:
+            group = 'abcdefghijklmnop'[i // 32 % 16]
+            device = '%02d' % (i // 2 % 16 + 1)
+            yield X10Message(group, device, command, group + device)
+        else:
+            yield HomeEasyMessage('%07x' % (0x31f8100 + i // 32), i // 2 % 16, None, command,
+                                  '31F81%02X%X' % (i // 32, i // 2 % 16))
+
+def naive(presses, byte_time):
+    """Every repeat written and waited for in turn: (done, latencies, frames)."""
+    now = 0.0
+    latencies = []
+    frames = 0
+    for at, messages in presses:
+        now = max(now, at)
+        for message in messages:
+            topic = message.topic
+            for i in range(REPEATS[topic]):
+                now += len(frame(message)) * byte_time + AIRTIME[topic]
+                frames += 1
+            latencies.append(now - at)
+    return now, latencies, frames
+
+def queued(presses, byte_time):
+    q = SendQueue(Null(), baudrate=10.0 / byte_time, thread=False)
+    commands = []
+    pending = list(presses)
+    now = 0.0
+    while True:
+        while pending and pending[0][0] <= now:
+            at, messages = pending.pop(0)
+            commands.extend(q.send(m, now=at) for m in messages)
+        delay = q.poll(now)
+        if delay is None and not pending:
+            break
+        if pending and (delay is None or pending[0][0] < now + delay):
+            now = pending[0][0]
+        else:
+            now += delay
+    sent = [c for c in commands if c.done is not None]
+    return max(c.done for c in sent), [c.latency for c in sent], q.frames, q.coalesced
+
+def cpu_per_command(devices, repeat=200):
+    messages = list(scene(devices, 'on')) + list(scene(devices, 'off'))
+    start = timer()
+    for i in range(repeat):
+        q = SendQueue(Null(), airtime={'x10': 0, 'homeeasy': 0}, thread=False)
+        for m in messages:
+            q.send(m, now=0)
+        q.poll(now=0)
+    return (timer() - start) / (repeat * len(messages)) * 1e6
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    second = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    byte_time = 10.0 / 4800
+    presses = [(0.0, list(scene(devices, 'on'))), (second, list(scene(devices, 'off')))]
+
+    print('%d devices, pressed again after %gs' % (devices, second))
+    print('%-10s %8s %8s %10s %10s %10s' % ('', 'frames', 'dropped', 'settled s', 'mean lat s', 'max lat s'))
+    done, latencies, frames = naive(presses, byte_time)
+    print('%-10s %8d %8d %10.2f %10.2f %10.2f' % (
+        'naive', frames, 0, done, sum(latencies) / len(latencies), max(latencies)))
+    done, latencies, frames, coalesced = queued(presses, byte_time)
+    print('%-10s %8d %8d %10.2f %10.2f %10.2f' % (
+        'SendQueue', frames, coalesced, done, sum(latencies) / len(latencies), max(latencies)))
+    print('SendQueue cpu per command: %.1f us' % cpu_per_command(devices))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Time the reading thread spends per frame with a slow on_message.
+
+Inline, the reader is stalled for the whole of every callback; with a
+WorkerPool it only queues the message. Each backpressure policy is run with
+workers that cannot keep up, to show what it costs the reader and how much
+is dropped. Run with:
+
+    python benchmarks/bench_workers.py [packets] [callback ms]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import logging
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, FakeRFXSerial
+from rfxcom.generators import frames
+from rfxcom.workers import WorkerPool, BLOCK, DROP_OLDEST, DROP_NEWEST
+
+def fake(stream):
+    import binascii
+    class Fake(FakeRFXSerial):
+        packets = [(length, binascii.hexlify(data)) for length, data in stream]
+    return Fake
+
+def read_all(on_message, serial_type):
+    rfx = RFXCom(on_message, log=False, dedup=0, serial_type=serial_type)
+    rfx.setup()
+    start = timer()
+    n = 0
+    while rfx.reader.fill() or len(rfx.reader):
+        for length, packet in rfx.reader:
+            message = rfx.decode(length, packet)
+            if message:
+                on_message(message)
+                n += 1
+    return timer() - start, n
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.001
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    serial_type = fake(frames(n, invalid=0, seed=1))
+
+    def slow(message):
+        time.sleep(delay)
+
+    print('%-24s %14s %10s %10s' % ('', 'reader us/msg', 'handled', 'dropped'))
+    elapsed, sent = read_all(slow, serial_type)
+    print('%-24s %14.1f %10d %10d' % ('inline', elapsed / sent * 1e6, sent, 0))
+    for policy in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+        for workers, ordered in ((4, False), (4, True)):
+            pool = WorkerPool(slow, workers=workers, size=100, policy=policy, ordered=ordered)
+            elapsed, sent = read_all(pool, serial_type)
+            pool.close()
+            name = '%s x%d%s' % (policy, workers, ordered and ' ordered' or '')
+            print('%-24s %14.1f %10d %10d' % (name, elapsed / sent * 1e6, pool.processed, pool.dropped))
+
+if __name__ == '__main__':
+    main()
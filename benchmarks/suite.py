@@ -0,0 +1,149 @@
+"""Throughput benchmark suite over synthetic frames.
+
+Measures packets/sec and per-packet latency at three levels:
+
+- parse.<protocol>.{valid,invalid}: each parser's parse()
+- decode: RFXCom.decode, including deduplication
+- run_once: the full read/frame/decode loop over FakeRFXSerial
+
+Results are written as JSON, and can be compared against an earlier run to
+spot regressions. Run with:
+
+    python benchmarks/suite.py -o results.json [--compare baseline.json]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import binascii
+import platform
+import subprocess
+import optparse
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rfxcom import RFXCom, FakeRFXSerial
+from rfxcom import generators
+from rfxcom.parsers import X10Parser, HomeEasyParser, OregonParser, OwlParser
+
+PARSERS = [('x10', X10Parser), ('homeeasy', HomeEasyParser),
+           ('oregon', OregonParser), ('owl', OwlParser)]
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def measure(name, func, items):
+    """Time func(item) for each item, individually and in total."""
+    latencies = []
+    append = latencies.append
+    start = timer()
+    for item in items:
+        t = timer()
+        func(item)
+        append(timer() - t)
+    elapsed = timer() - start
+    latencies.sort()
+    n = len(items)
+    return {
+        'name': name,
+        'packets': n,
+        'seconds': elapsed,
+        'pps': n / elapsed,
+        'latency_us': {
+            'mean': sum(latencies) / n * 1e6,
+            'p50': percentile(latencies, 0.50) * 1e6,
+            'p99': percentile(latencies, 0.99) * 1e6,
+        },
+    }
+
+def as_ints(frames):
+    return [(length, tuple(bytearray(data))) for length, data in frames]
+
+def bench_parsers(n, rng):
+    results = []
+    for protocol, parser in PARSERS:
+        valid = [generators.frame(protocol, rng) for i in range(n)]
+        invalid = [generators.corrupt(f, rng) for f in valid]
+        for kind, frames in (('valid', valid), ('invalid', invalid)):
+            results.append(measure('parse.%s.%s' % (protocol, kind),
+                                   lambda f: parser.parse(*f), as_ints(frames)))
+    return results
+
+def bench_decode(frames):
+    rfx = RFXCom(None, log=False)
+    return [measure('decode', lambda f: rfx.decode(*f), frames)]
+
+def bench_run_once(frames):
+    class Fake(FakeRFXSerial):
+        packets = [(length, binascii.hexlify(data)) for length, data in frames]
+    rfx = RFXCom(None, log=False, serial_type=Fake)
+    rfx.setup()
+    return [measure('run_once', lambda i: rfx.run_once(), range(len(frames)))]
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(n, seed):
+    rng = random.Random(seed)
+    frames = list(generators.frames(n, invalid=0.05, seed=seed))
+    results = bench_parsers(n, rng)
+    results += bench_decode(frames)
+    results += bench_run_once(frames)
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'packets': n,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+def report(report, baseline=None):
+    old = {}
+    if baseline:
+        old = dict((r['name'], r) for r in baseline['results'])
+    print('%-24s %12s %10s %10s %10s' % ('benchmark', 'packets/s', 'mean us', 'p99 us', 'vs base'))
+    for r in report['results']:
+        change = ''
+        if r['name'] in old:
+            change = '%+.1f%%' % ((r['pps'] / old[r['name']]['pps'] - 1) * 100)
+        print('%-24s %12.0f %10.2f %10.2f %10s' % (r['name'], r['pps'],
+              r['latency_us']['mean'], r['latency_us']['p99'], change))
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--packets', type='int', default=20000)
+    parser.add_option('-s', '--seed', type='int', default=1)
+    parser.add_option('-o', '--output', help='write JSON results to file')
+    parser.add_option('-c', '--compare', help='compare with earlier JSON results')
+    options, args = parser.parse_args()
+
+    logger = logging.getLogger('rfxcom')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    results = run(options.packets, options.seed)
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
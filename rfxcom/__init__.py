@@ -2,16 +2,26 @@
 
 import glob
 import re
+import binascii
 import time
 import struct
 import logging
+from collections import deque
 
 import rfxcom.parsers
+from rfxcom.dedup import Deduplicator
+from rfxcom.framing import FrameReader, frame_size, TEXT
+from rfxcom.metrics import Metrics, clock
+from rfxcom.trace import FrameTrace, Hex
 
 class RFXError(Exception):
     """Exception indicating communication with the device has gone screwy."""
     pass
 
+class DeviceError(RFXError):
+    """The device could not be opened, read, written or initialised: it may have been lost."""
+    pass
+
 class Pyserial(object):
     def __init__(self, device, baudrate):
         import serial
@@ -23,7 +33,7 @@ class Pyserial(object):
     def _find_device(self, device):
         serial_ports = glob.glob(device)
         if not serial_ports:
-            raise RFXError('Error: No USB serial ports found')
+            raise DeviceError('Error: No USB serial ports found')
             
         return serial_ports[0]
 
@@ -36,6 +46,24 @@ class Pyserial(object):
     def read(self, bytes):
         return self.ser.read(bytes)
 
+    @property
+    def in_waiting(self):
+        return self.ser.inWaiting()
+
+    @property
+    def timeout(self):
+        return self.ser.timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self.ser.timeout = timeout
+
+    def fileno(self):
+        return self.ser.fileno()
+
+    def close(self):
+        self.ser.close()
+
 class RFXCom(object):
     """Main class
 
@@ -44,65 +72,114 @@ class RFXCom(object):
     >>> def on_message(m):
     ...     global i, rfx
     ...     i += 1
-    ...     print m
+    ...     print(m)
     ...     if i == 3:
     ...         rfx.stop()
     >>> rfx = RFXCom(on_message, serial_type=FakeRFXSerial)
     >>> rfx.setup()
     >>> rfx.run()
-    topic: x10, device: 11, source: a11, command: on, group: a
-    topic: x10, device: 01, source: a01, command: off, group: a
-    topic: homeeasy, device: group, source: 31F8177G, command: off, address: 31f8177
+    topic: x10, group: a, device: 11, command: on, source: a11
+    topic: x10, group: a, device: 01, command: off, source: a01
+    topic: homeeasy, address: 31f8177, device: group, command: off, source: 31F8177G
     """
 
-    parsers = [ getattr(rfxcom.parsers, x)() for x in rfxcom.parsers.__all__ ]
+    parsers = rfxcom.parsers.registry
+
+    # frames are sent whole, so bytes after a pause this long start a new one
+    gap = 0.1
+    # bytes held while deciding whether a frame was misframed
+    suspect_limit = 64
+    # seconds between dumps of the trace on read errors, so that a noisy
+    # channel does not flood the log
+    trace_interval = 60.0
 
-    def __init__(self, on_message, log=True, dedup=2.5, device='/dev/serial/by-id/usb-FTDI_FT232R_USB_UART_*-if00-port0', serial_type=Pyserial):
+    def __init__(self, on_message, log=True, dedup=2.5, device='/dev/serial/by-id/usb-FTDI_FT232R_USB_UART_*-if00-port0', serial_type=Pyserial, record=None, trace=0, resync=True):
         self.on_message = on_message
         self.log = log
+        # realign on valid frames after framing errors
+        self.resync = resync
+        self._unhandled = False
+        self._suspect = None
+        self.record = record
+        # ring buffer of recent raw frames, dumped on errors
+        self.trace = FrameTrace(trace) if trace else None
+        self._trace_dumped = None
+        if not isinstance(dedup, Deduplicator):
+            dedup = Deduplicator(dedup)
         self.dedup = dedup
         self.device = device
         self.serial_type = serial_type
-        
+        self.metrics = Metrics()
+        # when the frame last returned, and the one at the head of the buffer, began arriving
+        self.received = self._head = self._last_read = 0.0
+
         self.logger = logging.getLogger('rfxcom')
         self.stopping = False
-        self.last_messages = []
-        self.last_timestamps = []
+        self.serial = None
+        self._recorder = None
 
     def _connect(self):
-        self.fin = self.serial_type(device=self.device, baudrate=4800)
+        try:
+            self.fin = self.serial = self.serial_type(device=self.device, baudrate=4800)
+        except EnvironmentError as e:
+            raise DeviceError('Cannot open %s: %s' % (self.device, e))
 
-    def setup(self):
+    def setup(self, retries=5, delay=1.0, timeout=None):
+        """Connect and initialise the device, raising DeviceError on failure.
+
+        With timeout, reads during the handshake time out after that long.
+        """
         self.logger.info('Connecting...')
         self._connect()
-        if self.log:
+        serial = self.serial
+        if self.record:
+            if self._recorder is None:
+                from rfxcom.capture import RecordingRFXSerial
+                self._recorder = RecordingRFXSerial(serial, self.record)
+            else:
+                # reconnected, carry on recording to the same capture
+                self._recorder._base = serial
+            self.fin = self._recorder
+        if self.log and LoggingRFXSerial.enabled():
             self.fin = LoggingRFXSerial(self.fin)
-
-        retries = 5
-        while retries > 0:
-            try:
-                self._setup()
-                return
-            except RFXError:
-                self.logger.info('Failed, retrying (%d more retries)' % retries)
-                retries -= 1
-                time.sleep(1)
-
+        self.reader = FrameReader(self.fin)
+
+        read_timeout = getattr(serial, 'timeout', None)
+        if timeout is not None and read_timeout is not None:
+            serial.timeout = timeout
+        try:
+            while True:
+                try:
+                    self._setup()
+                    return
+                except (RFXError, EnvironmentError) as e:
+                    self.metrics.handshake_retries += 1
+                    retries -= 1
+                    if retries <= 0:
+                        raise DeviceError('Failed to initialise: %s' % e)
+                    self.logger.info('Failed, retrying (%d more retries)', retries)
+                    time.sleep(delay)
+        finally:
+            if timeout is not None and read_timeout is not None:
+                serial.timeout = read_timeout
+
+
+    # (command, expected response) pairs sent to initialise the device
+    handshake = [
+        # enable RFXCOM variable length mode
+        (b'\xf0\x2c', b'\x2c'),
+        # version request, unnecessary and slow without slave
+        #(b'\xf0\x20', b'M.(S.)?'),
+        # enable all possible receiving modes
+        (b'\xf0\x2a', b'\x2c'), # 2c not 2a as expected??
+    ]
 
     def _setup(self):
         self.fin.flush()
 
-        # enable RFXCOM variable length mode
-        self.fin.write('\xf0\x2c')
-        self.expect('\x2c')
-
-        # version request, unnecessary and slow without slave
-        #self.fin.write('\xf0\x20')
-        #self.re_expect('M.(S.)?')
-
-        # enable all possible receiving modes
-        self.fin.write('\xf0\x2a')
-        self.expect('\x2c') # 2c not 2a as expected??
+        for command, response in self.handshake:
+            self.fin.write(command)
+            self.expect(response)
 
         self.logger.info('Initialised successfully')
 
@@ -115,72 +192,233 @@ class RFXCom(object):
         if not length:
             length = len(expected)
         r = self.fin.read(length)
-        regex = re.compile('^'+expected+'$')
+        regex = re.compile(b'^'+expected+b'$')
         if not regex.match(r):
             raise RFXError('Expected %r got %r' % (expected, r))
 
     def run(self):
         while not self.stopping:
-            message = self.run_once()
+            try:
+                message = self.run_once()
+            except EOFError:
+                # end of a replayed capture
+                break
+            except Exception:
+                self.dump_trace()
+                raise
             if message:
+                self.metrics.latency.observe(clock() - self.received)
                 self.on_message(message)
             
     def run_once(self):
-        self.fin.timeout = 1.00 # wait forever
+        reader = self.reader
         while not self.stopping:
-            b = self.fin.read(1)
-            if b:
-                break
-        if self.stopping:
-            return
-
-        length = ord(b) # number of bits to follow
-        bytes = ((length & 0x7F) + 7) / 8
-        
-        self.fin.timeout = .030 # 30ms
-        data = self.fin.read(bytes)
-        if len(data) == bytes:
-            return self.decode(length, data)
-        else:
-            self.logger.error('Read short - expected %d, received %d bytes' % (bytes, len(data)))
-            return None
+            frame = reader.next_frame()
+            if frame:
+                self.received = self._head
+                # anything left in the buffer arrived by the last read
+                self._head = self._last_read
+                message = self.decode(*frame)
+                if self._unhandled:
+                    self._unhandled = False
+                    if self.resync:
+                        self.check_framing(*frame)
+                elif self._suspect is not None:
+                    self._suspect = None
+                return message
+
+            pending = len(reader)
+            if pending and self.resync:
+                started = clock()
+            try:
+                filled = reader.fill()
+            except EnvironmentError as e:
+                raise DeviceError('Read failed: %s' % e)
+            if filled:
+                self._last_read = clock()
+                if not pending:
+                    self._head = self._last_read
+                elif self.resync and self._last_read - started > self.gap:
+                    # the frame pending was cut short, what follows the pause is a new one
+                    self.short_read(pending)
+                    self._suspect = None
+                    self._head = self._last_read
+            elif len(reader):
+                # timed out part way through a frame
+                self.short_read()
+                return None
 
     def stop(self):
         self.stopping = True
 
+    def write(self, data):
+        """Write bytes to the device."""
+        try:
+            self.fin.write(data)
+        except EnvironmentError as e:
+            raise DeviceError('Write failed: %s' % e)
+
+    def send(self, message):
+        """Transmit an X10 or HomeEasy message, once.
+
+        See rfxcom.transmit.SendQueue to send repeated and paced to airtime.
+
+        >>> from rfxcom.message import X10Message
+        >>> rfx = RFXCom(None, serial_type=FakeRFXSerial)
+        >>> rfx.setup()
+        >>> rfx.send(X10Message('a', '11', 'on'))
+        >>> rfx.serial.sent == [b'\\x20\\x64\\x9b\\x08\\xf7']
+        True
+        """
+        from rfxcom.transmit import frame
+        self.write(frame(message))
+
+    def close(self):
+        close = getattr(self.fin, 'close', None)
+        if close:
+            close()
+
+    def disconnect(self):
+        """Close the device, keeping any capture open for a reconnect."""
+        close = getattr(self.serial, 'close', None)
+        if close:
+            close()
+
+    def stats(self):
+        """Counters for the receive path, see rfxcom.metrics."""
+        return self.metrics.stats()
+
+    def dump_trace(self):
+        """Log the recent frames held by the trace, if enabled."""
+        if self.trace is not None and len(self.trace):
+            self.logger.error('Recent frames:\n%s', self.trace)
+
+    def _error_trace(self):
+        """Dump the trace for a read error, unless one was dumped within trace_interval."""
+        if self.trace is not None:
+            now = clock()
+            if self._trace_dumped is None or now - self._trace_dumped >= self.trace_interval:
+                self._trace_dumped = now
+                self.dump_trace()
+
+    def short_read(self, size=None, name=None):
+        """Count, log and drop a frame cut short at the head of the reader.
+
+        size is the bytes of it that arrived, by default all those in the
+        reader. They are logged and kept in the trace before being dropped:
+
+        >>> class Cut(FakeRFXSerial):
+        ...     packets = [(32, '649b')]
+        >>> rfx = RFXCom(None, serial_type=Cut, trace=8)
+        >>> rfx.setup()
+        >>> rfx.run_once()
+        >>> [(length, str(Hex(data))) for when, length, data in rfx.trace.dump()]
+        [(32, '64 9b')]
+        >>> rfx.metrics.short_reads, len(rfx.reader)
+        (1, 0)
+        """
+        reader = self.reader
+        if size is None:
+            size = len(reader)
+        start = reader.pos
+        length = reader.buffer[start]
+        data = bytes(reader.buffer[start + 1:start + size])
+        reader.skip(size)
+        self.metrics.short_reads += 1
+        if self.trace is not None:
+            self.trace.record(length, data)
+        self.logger.error('Read short%s - expected %d, received %d bytes [%s]',
+                          ' on %s' % name if name else '', frame_size(length), len(data), Hex(data))
+        self._error_trace()
+
     def decode(self, length, packet):
-        packet = struct.unpack('%dB' % len(packet), packet)
-        for parser in self.parsers:
+        message = self.parse(length, packet)
+        if message:
+            # a replayed capture gives the time the frame was captured
+            if self.dedup.seen(message, getattr(self.serial, 'frame_time', None)):
+                self.metrics.duplicates += 1
+                self.logger.debug('Suppressed duplicate message %s', message)
+                return None
+
+            self.metrics.messages += 1
+            self.logger.info('Message: %s', message)
+            return message
+        return None
+
+    def check_framing(self, length, packet):
+        """Resynchronise the reader if the unhandled frame given was misframed.
+
+        A frame no parser accepts may be corrupt, from an unknown device, or
+        misframed by a byte lost or gained. The frame after it tells them
+        apart: only when it too is not accepted are the bytes rescanned for
+        the next frame with a check that holds (see FrameBuffer.resync).
+        Until the next frame is complete, the stream is realigned only if
+        such a frame is found, and otherwise the decision is put off.
+
+        >>> from rfxcom.generators import wire, x10_frame
+        >>> frames = [x10_frame(g, 1, 'on') for g in 'abcd']
+        >>> data = wire(frames)
+        >>> class Dropped(FakeRFXSerial):
+        ...     packets = [(ord(data[:1]), binascii.hexlify(data[1:3] + data[4:]))]
+        >>> def on_message(message):
+        ...     print(message)
+        ...     if message['source'] == 'd01':
+        ...         rfx.stop()
+        >>> rfx = RFXCom(on_message, serial_type=Dropped)
+        >>> rfx.setup()
+        >>> rfx.run()
+        topic: x10, group: b, device: 01, command: on, source: b01
+        topic: x10, group: c, device: 01, command: on, source: c01
+        topic: x10, group: d, device: 01, command: on, source: d01
+        >>> rfx.metrics.resyncs
+        1
+        """
+        reader = self.reader
+        # as a bytearray, for the suspect bytes to be added to
+        data = bytearray(packet)
+        if self._suspect is not None:
+            data = self._suspect + bytearray((length,)) + data
+        following = reader.peek()
+        if following is not None:
+            self._suspect = None
+            if self.parsers.parse(*following):
+                return
+            skipped = reader.resync(self.anchored, data)
+        else:
+            skipped = reader.resync(self.anchored, data, strict=len(data) < self.suspect_limit)
+            if skipped is None:
+                self._suspect = data
+                return
+            self._suspect = None
+        self.metrics.resyncs += 1
+        self.logger.warning('Resynchronised, skipped %d bytes', skipped)
+
+    def anchored(self, length, payload):
+        """Whether a frame is accepted by a parser that verifies a check on it."""
+        for parser in self.parsers.candidates(length, payload):
+            if getattr(parser, 'checked', False) and parser.parse(length, payload):
+                return True
+        return False
+
+    def parse(self, length, packet):
+        """Parse a frame into a message, without deduplication.
+
+        packet is any sequence of byte values: the memoryview frames from
+        the reader are passed to parsers as they are.
+        """
+        if self.trace is not None:
+            self.trace.record(length, packet)
+        if packet.__class__ in TEXT:
+            packet = bytearray(packet)
+        for parser in self.parsers.candidates(length, packet):
             message = parser.parse(length, packet)
             if message:
-                # clear old messages
-                now = time.time()
-                expire_before = now - self.dedup
-                while self.last_messages and self.last_timestamps[0] < expire_before:
-                    self.last_messages.pop(0)
-                    self.last_timestamps.pop(0)
-
-                # duplicate message?
-                if message in self.last_messages:
-                    # update timestamp and move to front so continuous transmissions are treated as one
-                    # (I'm looking at you HomeEasy 403 PIR)
-                    i = self.last_messages.index(message)
-                    self.last_messages.pop(i)
-                    self.last_timestamps.pop(i)
-                    self.last_messages.append(message)
-                    self.last_timestamps.append(now)
-                    
-                    self.logger.debug('Suppressed duplicate message %s' % message)
-                    return None
-
-                # record for future suppression
-                self.last_messages.append(message)
-                self.last_timestamps.append(now)
-
-                self.logger.info('Message: %s' % message)
+                self.metrics.parsed(parser, length, packet)
                 return message
-        
-        self.logger.warn('Unhandled data: [%s]' % (' '.join('%02x' % d for d in packet)))
+
+        self.metrics.unhandled += 1
+        self._unhandled = True
+        self.logger.warning('Unhandled data: [%s]', Hex(packet))
         return None
 
 class FakeRFXSerial(object):
@@ -191,18 +429,28 @@ class FakeRFXSerial(object):
                ]
 
     def __init__(self, *args, **kwargs):
-        self.buffer = ''
-        self.packets = list(self.packets)
+        self.buffer = b''
+        self.packets = deque(self.packets)
+        # frames written to transmit
+        self.sent = []
 
-    def read(self, size=1):
-        if not self.buffer:
-            if not self.packets:
-                return # stop
+    def _load(self):
+        if not self.buffer and self.packets:
             # data packets prefixed with length
-            p = self.packets.pop(0)
-            packet = struct.pack('B', p[0]) + p[1].decode('hex')
+            p = self.packets.popleft()
+            packet = struct.pack('B', p[0]) + binascii.unhexlify(p[1])
             self.buffer += packet
 
+    @property
+    def in_waiting(self):
+        self._load()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self._load()
+        if not self.buffer:
+            return # stop
+
         ret = self.buffer[0:size]
         self.buffer = self.buffer[size:]
         return ret
@@ -211,12 +459,14 @@ class FakeRFXSerial(object):
         self.buffer += v
 
     def write(self, w):
-        if w == '\xf0\x20':
-            self._respond('\x4d\x18\x53\x30')
-        elif w == '\xf0\x2a':
-            self._respond('\x2c')
-        elif w == '\xf0\x2c':
-            self._respond('\x2c')
+        if w == b'\xf0\x20':
+            self._respond(b'\x4d\x18\x53\x30')
+        elif w == b'\xf0\x2a':
+            self._respond(b'\x2c')
+        elif w == b'\xf0\x2c':
+            self._respond(b'\x2c')
+        elif w and len(w) == 1 + frame_size(bytearray(w)[0]):
+            self.sent.append(w)
         else:
             raise ValueError('command not understood: %r' % w)
 
@@ -224,18 +474,28 @@ class FakeRFXSerial(object):
         pass
 
 class LoggingRFXSerial(object):
+    """Logs wire traffic to the 'wire' logger at DEBUG.
+
+    RFXCom only wraps the serial type with this when that logger is enabled
+    for DEBUG at setup, so it costs nothing otherwise.
+    """
     def __init__(self, base):
         self._base = base
         self._logger = logging.getLogger('wire')
 
+    @staticmethod
+    def enabled():
+        return logging.getLogger('wire').isEnabledFor(logging.DEBUG)
+
     def read(self, size=1):
         ret = self._base.read(size)
-        if ret:
-            self._logger.debug('<-- [%s]' % (' '.join('%02x' % ord(d) for d in ret)))
+        if ret and self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('<-- [%s]', Hex(ret))
         return ret
 
     def write(self, w):
-        self._logger.debug('--> [%s]' % (' '.join('%02x' % ord(d) for d in w)))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('--> [%s]', Hex(w))
         return self._base.write(w)
 
     def flushInput(self):
@@ -0,0 +1,214 @@
+"""Running min/max/mean of sensor readings over time windows."""
+
+import time
+from collections import deque, OrderedDict
+
+from rfxcom.message import Message
+
+# fields aggregated, by topic
+FIELDS = {
+    'temp': ('temp', 'humidity'),
+    'wind': ('speed', 'avgspeed'),
+    'rain': ('speed', 'total'),
+    'owl': ('current1', 'current2', 'current3'),
+}
+
+class Aggregate(object):
+    """Count, min, max and sum of a series of values.
+
+    >>> a = Aggregate()
+    >>> for v in (21.5, 20.5, 22.0):
+    ...     a.add(v)
+    >>> b = Aggregate(); b.add(19.0)
+    >>> a.merge(b)
+    >>> a.count, a.min, a.max, a.mean
+    (4, 19.0, 22.0, 20.75)
+    """
+
+    __slots__ = ('count', 'min', 'max', 'sum')
+
+    def __init__(self):
+        self.count = 0
+        self.min = self.max = None
+        self.sum = 0
+
+    def add(self, value):
+        if not self.count:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count or other.min < self.min:
+            self.min = other.min
+        if not self.count or other.max > self.max:
+            self.max = other.max
+        self.sum += other.sum
+        self.count += other.count
+
+    @property
+    def mean(self):
+        return float(self.sum) / self.count if self.count else None
+
+class WindowAggregator(object):
+    """Summarises readings from each source over windows of time.
+
+    A WindowAggregator is an on_message callable, like WorkerPool. Readings
+    of the fields listed for their topic are folded into running aggregates
+    per source, and each window is summarised in one message to
+    on_summary: topic '<topic>.summary' with source, start, end, count and
+    <field>_min, <field>_max and <field>_mean for each field.
+
+    Windows are window seconds long and aligned to multiples of it. With a
+    step, they slide: one ends every step seconds, and window must be a
+    multiple of step. Readings are kept in aggregates per step, so the cost
+    per reading is constant, and a source holds at most window / step of
+    them. At most max_series sources are tracked at once; beyond that the
+    least recently heard is dropped, and counted in evicted.
+
+    Windows are closed as later readings arrive; call tick() to close them
+    when none do, and flush() to summarise what remains.
+
+    >>> from rfxcom.message import TempMessage
+    >>> def on_summary(summary):
+    ...     print(' '.join(str(summary[k]) for k in ('start', 'end', 'count', 'temp_min', 'temp_max', 'temp_mean')))
+    >>> agg = WindowAggregator(on_summary, window=60)
+    >>> for now, temp in ((0, 21.0), (40, 21.4), (80, 21.8), (130, 22.0)):
+    ...     agg.add(TempMessage(source='thgr228n.4d', temp=temp, humidity=50), now)
+    0 60 2 21.0 21.4 21.2
+    60 120 1 21.8 21.8 21.8
+    >>> agg.flush()
+    120 180 1 22.0 22.0 22.0
+
+    Sliding, a window of a minute every 20 seconds:
+
+    >>> agg = WindowAggregator(on_summary, window=60, step=20)
+    >>> for now, temp in ((0, 21.0), (40, 21.4), (80, 21.8)):
+    ...     agg.add(TempMessage(source='thgr228n.4d', temp=temp), now)
+    -40 20 1 21.0 21.0 21.0
+    -20 40 1 21.0 21.0 21.0
+    0 60 2 21.0 21.4 21.2
+    20 80 1 21.4 21.4 21.4
+    >>> agg.tick(100)
+    40 100 2 21.4 21.8 21.6
+    >>> summary = []
+    >>> agg.on_summary = summary.append
+    >>> agg.flush()
+    >>> summary[0]
+    Message('temp.summary', count=1, end=120, humidity_max=None, humidity_mean=None, humidity_min=None, source='thgr228n.4d', start=60, temp_max=21.8, temp_mean=21.8, temp_min=21.8)
+    """
+
+    def __init__(self, on_summary, window=60, step=None, fields=FIELDS, max_series=10000):
+        step = step or window
+        panes = int(round(float(window) / step))
+        if panes < 1 or abs(panes * step - window) > 1e-9:
+            raise ValueError('window must be a multiple of step: %r, %r' % (window, step))
+        self.on_summary = on_summary
+        self.window = window
+        self.step = step
+        self.panes = panes
+        self.fields = fields
+        self.max_series = max_series
+        # [pane index, readings, aggregates per field] in order, by (topic, source),
+        # least recently heard first
+        self.series = OrderedDict()
+        self.pane = None
+        self.evicted = 0
+
+    def __call__(self, message, *args):
+        self.add(message)
+
+    def add(self, message, now=None):
+        """Fold message's readings into the current pane."""
+        fields = self.fields.get(message.topic)
+        if not fields:
+            return
+        source = message.get('source')
+        if source is None:
+            return
+        if now is None:
+            now = time.time()
+        index = int(now // self.step)
+        if self.pane is None:
+            self.pane = index
+        elif index > self.pane:
+            self._advance(index)
+        else:
+            # late, counted in the current pane
+            index = self.pane
+
+        key = (message.topic, source)
+        series = self.series
+        panes = series.pop(key, None)
+        if panes is None:
+            if len(series) >= self.max_series:
+                series.popitem(last=False)
+                self.evicted += 1
+            panes = deque()
+        series[key] = panes
+        if not panes or panes[-1][0] != index:
+            panes.append([index, 0, [Aggregate() for f in fields]])
+        pane = panes[-1]
+        pane[1] += 1
+        for field, aggregate in zip(fields, pane[2]):
+            value = message.get(field)
+            if value is not None:
+                aggregate.add(value)
+
+    def tick(self, now=None):
+        """Close the windows ended by now."""
+        if self.pane is None:
+            return
+        index = int((time.time() if now is None else now) // self.step)
+        if index > self.pane:
+            self._advance(index)
+
+    def flush(self):
+        """Summarise every window still holding readings, and start afresh."""
+        if self.pane is not None:
+            self._advance(self.pane + self.panes)
+        self.series.clear()
+        self.pane = None
+
+    def _advance(self, index):
+        """Close the windows ending in panes before index."""
+        n = self.panes
+        # windows ending later than this hold no readings yet
+        for end in range(self.pane, min(index, self.pane + n)):
+            start = end - n + 1
+            for key, panes in list(self.series.items()):
+                window = [p for p in panes if p[0] >= start]
+                if window:
+                    self.on_summary(self._summary(key, window, start, end + 1))
+                while panes and panes[0][0] <= start:
+                    panes.popleft()
+                if not panes:
+                    del self.series[key]
+        self.pane = index
+
+    def _summary(self, key, panes, start, end):
+        topic, source = key
+        fields = self.fields[topic]
+        aggregates = [Aggregate() for f in fields]
+        count = 0
+        for index, readings, pane in panes:
+            count += readings
+            for total, aggregate in zip(aggregates, pane):
+                total.merge(aggregate)
+        summary = Message('%s.summary' % topic, source=source, count=count,
+                          start=start * self.step, end=end * self.step)
+        for field, aggregate in zip(fields, aggregates):
+            summary[field + '_min'] = aggregate.min
+            summary[field + '_max'] = aggregate.max
+            summary[field + '_mean'] = aggregate.mean
+        return summary
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
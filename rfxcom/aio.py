@@ -0,0 +1,243 @@
+"""asyncio receiver. Requires Python 3.7 or later."""
+
+import os
+import asyncio
+
+from rfxcom import RFXCom, RFXError, DeviceError
+from rfxcom.framing import FrameBuffer
+from rfxcom.metrics import clock
+
+class AsyncRFXCom(RFXCom):
+    """RFXCom driven by an asyncio event loop.
+
+    The serial file descriptor is watched with ``loop.add_reader``, so no
+    thread is needed per device. Framing, parsing and deduplication are
+    shared with RFXCom. Messages are passed to on_message if given, and are
+    otherwise available with ``async for``.
+
+    Any serial type providing ``fileno()`` can be used; here a pseudo-terminal
+    stands in for the device:
+
+    >>> import tty, threading, binascii
+    >>> master, slave = os.openpty()
+    >>> _ = tty.setraw(slave)
+    >>> class PtySerial(object):
+    ...     def __init__(self, device, baudrate):
+    ...         pass
+    ...     def fileno(self):
+    ...         return slave
+    ...     def close(self):
+    ...         closed.append(self)
+    >>> closed = []
+    >>> def device():
+    ...     for command in RFXCom.handshake:
+    ...         os.read(master, 2)
+    ...         os.write(master, b'\\x2c')
+    ...     os.write(master, binascii.unhexlify('20649b08f7' '20609f20df' '0c1230' '22c7e05de000'))
+    >>> threading.Thread(target=device).start()
+    >>> async def main():
+    ...     rfx = AsyncRFXCom(serial_type=PtySerial)
+    ...     await rfx.setup()
+    ...     async for message in rfx:
+    ...         print(repr(message))
+    ...         if message['source'] == '31F8177G':
+    ...             rfx.stop()
+    >>> asyncio.run(main())
+    Message('x10', command='on', device='11', group='a', source='a11')
+    Message('x10', command='off', device='01', group='a', source='a01')
+    Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G')
+    >>> len(closed)
+    1
+
+    Frames are recorded with record, as with RFXCom:
+
+    >>> import io
+    >>> from rfxcom.capture import CaptureReader
+    >>> f = io.BytesIO()
+    >>> threading.Thread(target=device).start()
+    >>> async def record():
+    ...     rfx = AsyncRFXCom(serial_type=PtySerial, record=f)
+    ...     await rfx.setup()
+    ...     async for message in rfx:
+    ...         if message['source'] == '31F8177G':
+    ...             rfx.stop()
+    >>> asyncio.run(record())
+    >>> [(length, len(data)) for offset, length, data in CaptureReader(io.BytesIO(f.getvalue()))]
+    [(32, 4), (32, 4), (12, 2), (34, 5)]
+
+    A device that does not answer the handshake raises DeviceError, which a
+    Supervisor takes for the device being lost:
+
+    >>> async def silent():
+    ...     rfx = AsyncRFXCom(serial_type=PtySerial)
+    ...     try:
+    ...         await rfx.setup(retries=2, timeout=0.1)
+    ...     except DeviceError:
+    ...         print('lost')
+    >>> asyncio.run(silent())
+    lost
+    >>> os.close(master); os.close(slave)
+    """
+
+    # give up on a partial frame after this long, as Pyserial's interCharTimeout
+    short_timeout = 0.030
+
+    def __init__(self, on_message=None, loop=None, **kwargs):
+        super(AsyncRFXCom, self).__init__(on_message, **kwargs)
+        self.loop = loop
+        self.reader = FrameBuffer()
+        self.queue = None
+        self._response = None
+        self._waiter = None
+        self._short_timer = None
+        self._capture = None
+
+    async def setup(self, retries=5, timeout=1.0):
+        """Connect and initialise the device, raising DeviceError on failure."""
+        self.logger.info('Connecting...')
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue()
+        if self.record and self._capture is None:
+            # kept open across reconnects, as RFXCom's recorder is
+            from rfxcom.capture import CaptureWriter
+            self._capture = CaptureWriter(self.record)
+        self._connect()
+        self.fd = self.fin.fileno()
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self._readable)
+
+        while True:
+            try:
+                await asyncio.wait_for(self._handshake(), timeout)
+                break
+            except (RFXError, asyncio.TimeoutError) as e:
+                self.metrics.handshake_retries += 1
+                retries -= 1
+                if retries <= 0:
+                    self.loop.remove_reader(self.fd)
+                    self.disconnect()
+                    raise DeviceError('Failed to initialise: %s' % e)
+                self.logger.info('Failed, retrying (%d more retries)', retries)
+
+        # anything received after the handshake responses is frame data
+        pending, self._response = self._response, None
+        self.reader.discard()
+        self._received(pending)
+        self.logger.info('Initialised successfully')
+
+    async def _handshake(self):
+        self._response = bytearray()
+        for command, response in self.handshake:
+            os.write(self.fd, command)
+            await self.expect(response)
+
+    async def expect(self, expected):
+        while len(self._response) < len(expected):
+            self._waiter = self.loop.create_future()
+            await self._waiter
+        r = bytes(self._response[:len(expected)])
+        del self._response[:len(expected)]
+        if r != expected:
+            raise RFXError('Expected %r got %r' % (expected, r))
+
+    def _readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._close(DeviceError('Read failed: %s' % e))
+            return
+        if not data:
+            self._close(DeviceError('Device closed'))
+            return
+
+        if self._response is not None:
+            self._response += data
+            if self._waiter and not self._waiter.done():
+                self._waiter.set_result(None)
+        else:
+            self._received(data)
+
+    def _received(self, data):
+        if self._short_timer:
+            self._short_timer.cancel()
+            self._short_timer = None
+
+        now = clock()
+        reader = self.reader
+        if not len(reader):
+            self._head = now
+        reader.feed(data)
+        capture = self._capture
+        for length, frame in reader:
+            if capture is not None:
+                capture.write(length, bytes(frame))
+            self.received, self._head = self._head, now
+            message = self.decode(length, frame)
+            if self._unhandled:
+                self._unhandled = False
+                if self.resync:
+                    self.check_framing(length, frame)
+            elif self._suspect is not None:
+                self._suspect = None
+            if message:
+                self._deliver(message)
+
+        if len(reader):
+            self._short_timer = self.loop.call_later(self.short_timeout, self._short_read)
+
+    def _short_read(self):
+        self._short_timer = None
+        self.short_read()
+
+    def _deliver(self, message):
+        self.metrics.latency.observe(clock() - self.received)
+        if self.on_message:
+            self.on_message(message)
+        else:
+            self.queue.put_nowait(message)
+
+    def _close(self, error=None):
+        if self.loop and not self.stopping:
+            self.loop.remove_reader(self.fd)
+            self.disconnect()
+            if self._capture is not None:
+                self._capture.flush()
+            if self._short_timer:
+                self._short_timer.cancel()
+            if self._waiter and not self._waiter.done():
+                self._waiter.set_exception(error or RFXError('Stopped'))
+        self.stopping = True
+        if self.queue:
+            self.queue.put_nowait(error)
+
+    def stop(self):
+        self._close()
+
+    def close(self):
+        super(AsyncRFXCom, self).close()
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
+
+    def run(self):
+        raise RFXError('AsyncRFXCom is driven by the event loop, use async for')
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.stopping and self.queue.empty():
+            raise StopAsyncIteration
+        message = await self.queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,301 @@
+"""Batch decoding of archived frames with NumPy.
+
+Requires NumPy. Frames are grouped by length and protocol and decoded as
+array operations over all frames of a group at once, rather than one
+Message per frame. The result is a table of columns per topic:
+
+>>> from rfxcom.generators import x10_frame, owl_frame, oregon_frame, wire
+>>> data = wire([x10_frame('a', 11, 'on'), owl_frame(0xa6, 6.6, 0, 1.2),
+...              (12, b'\\x12\\x30'), x10_frame('b', 2, 'off'),
+...              oregon_frame((0xea4c, 68), rolling=0x4d)])
+>>> columns = decode(data)
+>>> sorted(columns)
+['owl', 'temp', 'x10']
+>>> x10 = columns['x10']
+>>> x10['frame'].tolist(), ' '.join(x10['source']), ' '.join(x10['command'])
+([0, 3], 'a11 b02', 'on off')
+>>> columns['owl']['current3'].tolist()
+[1.2]
+>>> print(columns['temp']['source'][0])
+thn132n.4d
+
+A UV reading that is not BCD gives the highest risk, as the parser does:
+
+>>> import binascii
+>>> uv = decode(wire([x10_frame('a', 11, 'on'), (72, binascii.unhexlify('da78103b01f00f4a00'))]))['uv']
+>>> uv['frame'].tolist(), ' '.join(uv['risk'])
+([1], 'dangerous')
+
+Rows are in the order of their frames, which are counted from 0 and
+include frames that could not be decoded. Decoding agrees with the
+per-frame parsers:
+
+>>> from rfxcom.generators import frames
+>>> from rfxcom.parsers import registry
+>>> stream = list(frames(5000, invalid=0.1, seed=2))
+>>> columns = decode(wire(stream))
+>>> expected = {}
+>>> for i, (length, data) in enumerate(stream):
+...     m = registry.parse(length, bytearray(data))
+...     if m:
+...         expected.setdefault(m.topic, []).append((i, m))
+>>> def same(a, b):
+...     if b is None:
+...         return a != a or a in ('', None)
+...     if isinstance(a, float):
+...         return abs(a - b) < 1e-9
+...     return str(a) == str(b)
+>>> all(len(columns[topic]['frame']) == len(rows) and
+...     all(columns[topic]['frame'][n] == i and
+...         all(same(columns[topic][f][n], m.get(f)) for f in columns[topic] if f != 'frame')
+...         for n, (i, m) in enumerate(rows))
+...     for topic, rows in expected.items())
+True
+"""
+
+import numpy
+
+from rfxcom.framing import frame_size
+from rfxcom.message import TOPICS
+from rfxcom.capture import CaptureReader
+from rfxcom.parsers import oregon, X10Parser
+
+SIZES = [frame_size(length) for length in range(256)]
+
+def split(data):
+    """Offsets and lengths of the complete frames in wire data.
+
+    >>> offsets, lengths = split(b'\\x20\\x64\\x9b\\x08\\xf7\\x0c\\x12\\x30\\x20\\x64')
+    >>> offsets.tolist(), lengths.tolist()
+    ([0, 5], [32, 12])
+    """
+    data = bytearray(data)
+    offsets = []
+    lengths = []
+    i = 0
+    end = len(data)
+    while i < end:
+        length = data[i]
+        size = SIZES[length]
+        if i + size >= end:
+            break
+        offsets.append(i)
+        lengths.append(length)
+        i += size + 1
+    return numpy.array(offsets, dtype=numpy.intp), numpy.array(lengths, dtype=numpy.intp)
+
+def format_columns(format, *columns):
+    return numpy.array([format % row for row in zip(*[c.tolist() for c in columns])])
+
+def _strings(strings):
+    return numpy.array(list(strings))
+
+class OregonColumns(object):
+    """Decoder over columns of packets for an oregon.Sensor."""
+
+    namespace = {
+        'T': numpy.array(oregon.NIBBLE_SUM),
+        'WIND_DIRECTIONS': _strings(oregon.WIND_DIRECTIONS),
+        'FORECASTS': _strings(oregon.FORECASTS),
+        'UV_RISK': _strings(oregon.UV_RISK),
+        'DAYS': _strings(oregon.DAYS),
+        'where': numpy.where,
+        'minimum': numpy.minimum,
+        'full': numpy.full,
+        'format_columns': format_columns,
+    }
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.topic = sensor.topic
+        name = sensor.part.lower()
+        lines = ['def decode(p):',
+                 '    ok = %s' % sensor.checksum.expression(),
+                 '    p = p[:, ok]']
+        if sensor.source == 'rolling':
+            lines.append('    source = SOURCES[p[3]]')
+        else:
+            lines.append('    source = full(p.shape[1], %r)' % name)
+        items = ["'source': source", "'sensor': source"]
+        items += ['%r: %s' % (field, oregon.columns(expr)) for field, expr in sensor.fields]
+        lines.append('    return ok, {%s}' % ',\n        '.join(items))
+        self.code = '\n'.join(lines)
+
+        namespace = dict(self.namespace)
+        namespace['SOURCES'] = _strings('%s.%02x' % (name, b) for b in range(256))
+        exec(compile(self.code, '<oregon columns %s>' % sensor.part, 'exec'), namespace)
+        self.decode = namespace['decode']
+
+HEX = _strings('%02x' % b for b in range(256))
+HEX_DIGITS = _strings('0123456789abcdef')
+UNITS = _strings('%02d' % u for u in range(17))
+UNIT_SOURCES = _strings('%1X' % u for u in range(16))
+X10_GROUPS = _strings(X10Parser.bytes_to_groups)
+X10_UNITS = numpy.zeros(256, dtype=int)
+for b, unit in X10Parser.bytes_to_units.items():
+    X10_UNITS[b] = unit
+X10_COMMANDS = numpy.array([X10Parser.bytes_to_command.get(b, '') for b in range(256)])
+
+def x10(p):
+    ok = ((p[0] ^ p[1]) == 0xff) & ((p[2] ^ p[3]) == 0xff)
+    p = p[:, ok]
+    group = X10_GROUPS[p[0] >> 4]
+    has_unit = (p[2] & 0x80) == 0
+    unit = X10_UNITS[p[2] & 0x58] + numpy.where(p[0] & 0x4, 8, 0) + 1
+    device = numpy.where(has_unit, UNITS[numpy.where(has_unit, unit, 0)], '0')
+    command = X10_COMMANDS[p[2] & numpy.where(has_unit, 0x20, 0x98)]
+    return ok, {'group': group, 'device': device, 'command': command,
+                'source': numpy.char.add(group, device)}
+
+def homeeasy(p):
+    ok = numpy.ones(p.shape[1], dtype=bool)
+    address = (p[0] << 18) + (p[1] << 10) + (p[2] << 2) + (p[3] >> 6)
+    hex = HEX_DIGITS[address >> 24]
+    for shift in (20, 16, 12, 8, 4, 0):
+        hex = numpy.char.add(hex, HEX_DIGITS[(address >> shift) & 0xf])
+    group = (p[3] >> 5) & 0x1
+    device = numpy.where(group, 'group', UNITS[p[3] & 0xf])
+    source = numpy.char.add(numpy.char.upper(hex), numpy.where(group, 'G', UNIT_SOURCES[p[3] & 0xf]))
+    command = numpy.where((p[3] >> 4) & 0x1, 'on', 'off')
+    return ok, {'address': hex, 'device': device, 'command': command, 'source': source}
+
+def homeeasy_preset(p):
+    ok, columns = homeeasy(p)
+    columns['level'] = p[4] >> 4
+    columns['command'] = numpy.full(len(ok), 'preset')
+    return ok, columns
+
+def owl(p):
+    ok = (p[0] == 0xea) & (p[9] == 0xff) & (p[10] == 0x5f)
+    p = p[:, ok]
+    return ok, {
+        'current1': (p[3] + ((p[4] & 0x3) << 8)) / 10.0,
+        'current2': (((p[4] & 0xfc) >> 2) + ((p[5] & 0xf) << 6)) / 10.0,
+        'current3': (((p[5] & 0xf0) >> 4) + ((p[6] & 0x3f) << 4)) / 10.0,
+        'source': HEX[p[2]],
+    }
+
+# decoders by frame length, after any Oregon sensors of that length
+DECODERS = {
+    32: ('x10', x10),
+    34: ('homeeasy', homeeasy),
+    36: ('homeeasy', homeeasy_preset),
+    120: ('owl', owl),
+}
+
+# Oregon decoders by frame length, with the packet types they decode
+OREGON = {}
+for sensor in oregon.SENSORS:
+    OREGON.setdefault(sensor.length, []).append(
+        (OregonColumns(sensor), numpy.array([type for type, length in sensor.keys()])))
+
+class Table(object):
+    """Columns of one topic, gathered from groups of frames."""
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.chunks = []
+
+    def add(self, frames, columns):
+        self.chunks.append((frames, columns))
+
+    def columns(self, extra=()):
+        present = set()
+        for frames, columns in self.chunks:
+            present.update(columns)
+        fields = [f for f in TOPICS[self.topic].fields if f in present]
+        frames = numpy.concatenate([frames for frames, columns in self.chunks])
+        order = numpy.argsort(frames, kind='mergesort')
+        result = {'frame': frames[order]}
+        for field in fields:
+            result[field] = _concatenate([columns.get(field) for frames, columns in self.chunks],
+                                         [len(frames) for frames, columns in self.chunks])[order]
+        for name, values in extra:
+            result[name] = values[result['frame']]
+        return result
+
+def _concatenate(arrays, sizes):
+    strings = set(a.dtype.kind in 'SU' for a in arrays if a is not None)
+    if len(strings) > 1:
+        # strings mixed with numbers, as wind directions are
+        arrays = [a if a is None else a.astype(object) for a in arrays]
+        missing = None
+    elif True in strings:
+        missing = ''
+    else:
+        missing = numpy.nan
+    return numpy.concatenate([numpy.full(n, missing) if a is None else a
+                              for a, n in zip(arrays, sizes)])
+
+def decode(data, times=None):
+    """Decode wire data into {topic: {field: array}}.
+
+    Each topic has a frame column with the index of the frame each row
+    came from, and a time column if times of every frame are given. Fields
+    a row does not have are NaN or empty.
+    """
+    offsets, lengths = split(data)
+    buf = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+    tables = {}
+
+    def add(topic, frames, columns):
+        if len(frames):
+            if topic not in tables:
+                tables[topic] = Table(topic)
+            tables[topic].add(frames, columns)
+
+    for length in numpy.unique(lengths).tolist():
+        frames = numpy.flatnonzero(lengths == length)
+        size = SIZES[length]
+        rows = buf[offsets[frames, None] + 1 + numpy.arange(size)]
+        p = numpy.ascontiguousarray(rows.T, dtype=numpy.int32)
+
+        if length in OREGON and size >= 2:
+            types = (p[0] << 8) + p[1]
+            left = numpy.ones(len(frames), dtype=bool)
+            for decoder, sensor_types in OREGON[length]:
+                match = numpy.flatnonzero(numpy.isin(types, sensor_types))
+                if not len(match):
+                    continue
+                ok, columns = decoder.decode(p[:, match])
+                add(decoder.topic, frames[match[ok]], columns)
+                left[match[ok]] = False
+            frames = frames[left]
+            p = p[:, left]
+
+        if length in DECODERS and len(frames):
+            topic, decoder = DECODERS[length]
+            ok, columns = decoder(p)
+            add(topic, frames[ok], columns)
+
+    extra = []
+    if times is not None:
+        extra.append(('time', numpy.asarray(times)))
+    return dict((topic, table.columns(extra)) for topic, table in tables.items())
+
+def decode_capture(f):
+    """Decode a capture file, as written by rfxcom.capture, with a time column.
+
+    >>> import io
+    >>> from rfxcom.capture import CaptureWriter
+    >>> from rfxcom.generators import x10_frame
+    >>> f = io.BytesIO()
+    >>> w = CaptureWriter(f, start=1000.0)
+    >>> w.write(*x10_frame('a', 1, 'on'), offset=0.5)
+    >>> w.write(*x10_frame('a', 1, 'off'), offset=2.0)
+    >>> columns = decode_capture(io.BytesIO(f.getvalue()))
+    >>> columns['x10']['time'].tolist(), ' '.join(columns['x10']['command'])
+    ([1000.5, 1002.0], 'on off')
+    """
+    reader = CaptureReader(f)
+    data = bytearray()
+    times = []
+    for offset, length, payload in reader:
+        data.append(length)
+        data += payload
+        times.append(reader.start + offset)
+    return decode(data, times)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
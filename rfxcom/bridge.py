@@ -0,0 +1,602 @@
+"""Sharing receivers with other hosts over TCP and UDP.
+
+A BridgeServer streams records to its clients, each one::
+
+    record: size:uint16 kind:uint8 body          (size of the body)
+    frame body:   length:uint8 payload           (as on the wire)
+    message body: topic (name type value)...
+
+Strings are a uint8 length then UTF-8, so topic and field names are
+strings, and each type is one byte: ``i`` for a signed int32, ``q`` for
+an int64, ``f`` for a float64 and ``s`` for a string, all little endian.
+A client says which kinds of record it wants by sending a byte of them
+or'd together, over TCP once connected. UDP is off unless the server is
+made with udp=True. A UDP client subscribes with a datagram to the same
+port, renewed within ``udp_expiry`` seconds::
+
+    subscribe:    kinds:uint8 pad:2 cookie:8
+
+The cookie is one the server made for the client's address. Without it
+the server answers with a cookie record, no larger than the datagram,
+and sends nothing else: a forged source address gets the stream sent
+nowhere. Datagrams carry whole records.
+"""
+
+import os
+import hmac
+import time
+import errno
+import hashlib
+import select
+import socket
+import struct
+
+from rfxcom import RFXCom
+from rfxcom.hub import Hub, Receiver, EVENT_READ, EVENT_WRITE
+from rfxcom.message import build_message
+from rfxcom.serialize import SIZE, INTEGERS, _string, _text
+
+PORT = 6480
+MESSAGE = 1
+FRAME = 2
+KINDS = MESSAGE | FRAME
+# sent over UDP only, in answer to a subscription without a valid cookie
+COOKIE = 4
+
+HEADER = struct.Struct('<HB')
+FRAME_HEADER = struct.Struct('<HBB')
+INT = struct.Struct('<i')
+LONG = struct.Struct('<q')
+FLOAT = struct.Struct('<d')
+TYPES = {ord('i'): INT, ord('q'): LONG, ord('f'): FLOAT}
+# a UDP subscription, as long as the cookie record sent in answer
+SUBSCRIBE = struct.Struct('<B2x8s')
+NO_COOKIE = b'\0' * 8
+
+# records per datagram are kept within this, clear of any MTU
+DATAGRAM = 1400
+BLOCKING = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+def encode_frame(length, payload):
+    """A frame as a record.
+
+    >>> encode_frame(32, b'\\x64\\x9b\\x08\\xf7') == b'\\x05\\x00\\x02\\x20\\x64\\x9b\\x08\\xf7'
+    True
+    """
+    return FRAME_HEADER.pack(1 + len(payload), FRAME, length) + bytes(payload)
+
+def encode_message(message):
+    """A message as a record.
+
+    >>> from rfxcom.message import TempMessage
+    >>> record = encode_message(TempMessage(source='thgr810.62', temp=21.5, humidity=40))
+    >>> len(record)
+    55
+    >>> decode_message(split(record)[0][0][1])
+    Message('temp', humidity=40, source='thgr810.62', temp=21.5)
+    """
+    parts = [_string(message.topic)]
+    for name, value in message.values.items():
+        parts.append(_string(name))
+        if isinstance(value, float):
+            parts.append(b'f' + FLOAT.pack(value))
+        elif isinstance(value, INTEGERS):
+            if -0x80000000 <= value < 0x80000000:
+                parts.append(b'i' + INT.pack(value))
+            else:
+                parts.append(b'q' + LONG.pack(value))
+        elif isinstance(value, (bytes, type(u''))):
+            parts.append(b's' + _string(value))
+        else:
+            raise ValueError('Cannot encode %s: %r' % (name, value))
+    body = b''.join(parts)
+    return HEADER.pack(len(body), MESSAGE) + body
+
+def decode_message(body):
+    """The message in a message record's body.
+
+    Known topics are returned as their record type, see rfxcom.message.
+    """
+    data = bytearray(body)
+    end = len(data)
+    values = {}
+    size = data[0]
+    topic = _text(data[1:1 + size])
+    pos = 1 + size
+    while pos < end:
+        size = data[pos]
+        name = str(_text(data[pos + 1:pos + 1 + size]))
+        pos += 1 + size
+        kind = data[pos]
+        pos += 1
+        if kind == ord('s'):
+            size = data[pos]
+            value = _text(data[pos + 1:pos + 1 + size])
+            pos += 1 + size
+        else:
+            type = TYPES.get(kind)
+            if type is None:
+                raise ValueError('Unknown type %r in message' % chr(kind))
+            value = type.unpack_from(data, pos)[0]
+            pos += type.size
+        values[name] = value
+    return build_message(topic, values)
+
+def split(data):
+    """The (kind, body) records that data starts with, and the bytes they take.
+
+    >>> data = encode_frame(32, b'\\x64\\x9b\\x08\\xf7') + encode_frame(34, b'\\xc7\\xe0')
+    >>> records, used = split(data[:-1])
+    >>> [(kind, bytearray(body)[0]) for kind, body in records], used
+    ([(2, 32)], 8)
+    """
+    records = []
+    pos = 0
+    end = len(data)
+    while end - pos >= HEADER.size:
+        size, kind = HEADER.unpack_from(data, pos)
+        start = pos + HEADER.size
+        if start + size > end:
+            break
+        pos = start + size
+        records.append((kind, data[start:pos]))
+    return records, pos
+
+def datagrams(records, size=DATAGRAM):
+    """Records joined into packets of up to size bytes."""
+    packet = []
+    length = 0
+    for record in records:
+        if packet and length + len(record) > size:
+            yield b''.join(packet)
+            packet = []
+            length = 0
+        packet.append(record)
+        length += len(record)
+    if packet:
+        yield b''.join(packet)
+
+def address(device):
+    """(host, port) for a 'host:port' or 'host' device.
+
+    >>> address('pi.local:7000'), address('pi.local')
+    (('pi.local', 7000), ('pi.local', 6480))
+    """
+    if isinstance(device, tuple):
+        return device
+    host, sep, port = device.rpartition(':')
+    if not sep:
+        return device, PORT
+    return host, int(port)
+
+class Client(object):
+    """A TCP client of a BridgeServer, and the bytes waiting to be sent to it."""
+
+    __slots__ = ('sock', 'address', 'kinds', 'buffer', 'writing')
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.kinds = 0
+        self.buffer = bytearray()
+        self.writing = False
+
+    def __repr__(self):
+        return '%s:%d' % self.address[:2]
+
+class BridgeServer(Hub):
+    """A Hub that streams what its receivers hear to clients on the network.
+
+    Every message delivered, and every frame read, is encoded once as a
+    record and sent to each client that wants that kind, over TCP or UDP,
+    from the same selector loop that reads the receivers. Records are
+    batched per pass of the loop. Each TCP client has a send buffer, written
+    as its socket allows; a client falling more than max_buffer bytes
+    behind is disconnected rather than holding up the rest, or memory.
+    UDP clients are sent what fits in the socket, and otherwise miss out.
+
+    >>> from rfxcom import FakeRFXSerial
+    >>> server = BridgeServer(('127.0.0.1', 0), udp=True)
+    >>> tcp = BridgeClient(server.address)
+    >>> udp = BridgeClient(server.address, udp=True)
+    >>> raw = BridgeClient(server.address, kinds=FRAME)
+    >>> while len(server) < 3:
+    ...     server.run_once()
+    ...     records = udp.read(timeout=0) # the cookie, then subscribed
+    >>> hall = server.add('hall', serial_type=FakeRFXSerial)
+    >>> while hall.fin.in_waiting:
+    ...     server.run_once()
+    >>> for m in tcp.messages(timeout=0.2):
+    ...     print(m)
+    topic: x10, group: a, device: 11, command: on, source: a11
+    topic: x10, group: a, device: 01, command: off, source: a01
+    topic: homeeasy, address: 31f8177, device: group, command: off, source: 31F8177G
+    >>> [m['source'] for m in udp.messages(timeout=0.2)]
+    ['a11', 'a01', '31F8177G']
+    >>> [(kind, bytearray(body)[0], len(body)) for kind, body in raw.read(timeout=0.2)]
+    [(2, 32, 5), (2, 32, 5), (2, 34, 6), (2, 12, 3)]
+
+    A UDP subscription without the cookie for its address, which a forged
+    one cannot have read, is answered with the cookie only:
+
+    >>> forged = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    >>> forged.sendto(SUBSCRIBE.pack(KINDS, NO_COOKIE), server.address)
+    11
+    >>> while not select.select([forged], [], [], 0)[0]:
+    ...     server.run_once()
+    >>> [kind for kind, body in split(forged.recv(64))[0]], len(server)
+    ([4], 3)
+    >>> forged.close()
+
+    A client that stops reading is dropped once it is max_buffer behind:
+
+    >>> class Busy(FakeRFXSerial):
+    ...     packets = FakeRFXSerial.packets[:3] * 10000
+    >>> server.max_buffer = server.sndbuf = 4096
+    >>> raw.close()
+    >>> stalled = socket.socket()
+    >>> stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    >>> stalled.connect(server.address)
+    >>> stalled.sendall(SIZE.pack(FRAME))
+    >>> while len(server.clients) < 2 or len(server) < 3:
+    ...     server.run_once()
+    >>> busy = server.add('busy', serial_type=Busy)
+    >>> while busy.fin.in_waiting and not server.evicted:
+    ...     server.run_once()
+    >>> server.evicted, len(server.clients)
+    (1, 1)
+    >>> for client in (tcp, udp, stalled):
+    ...     client.close()
+    >>> server.close()
+    """
+
+    # TCP connections waiting to be accepted
+    backlog = 128
+    # seconds a UDP client stays subscribed without renewing
+    udp_expiry = 90.0
+    # SO_SNDBUF for TCP clients, if set: what the kernel holds for a client
+    # before max_buffer starts to fill
+    sndbuf = None
+
+    def __init__(self, address=('', PORT), udp=False, on_message=None, max_buffer=1 << 18,
+                 dedup=2.5, gather=0, log=True):
+        Hub.__init__(self, on_message, dedup=dedup, gather=gather, log=log, on_frame=self._frame)
+        self.max_buffer = max_buffer
+        # TCP clients by file descriptor, and UDP ones' (kinds, expiry) by address
+        self.clients = {}
+        self.datagram_clients = {}
+        self.evicted = 0
+        self.dropped = 0
+        # records encoded this pass of the loop, as (kind, record) pairs
+        self._out = []
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen(self.backlog)
+        self._listener.setblocking(False)
+        self.address = self._listener.getsockname()
+        self._selector.register(self._listener.fileno(), EVENT_READ, self._accept)
+
+        self._udp = None
+        self._secret = os.urandom(16)
+        if udp:
+            self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp.bind(self.address)
+            self._udp.setblocking(False)
+            self._selector.register(self._udp.fileno(), EVENT_READ, self._datagram)
+
+    def __len__(self):
+        """Clients subscribed to anything."""
+        return (sum(1 for c in self.clients.values() if c.kinds) +
+                len(self.datagram_clients))
+
+    def run(self):
+        Hub.run(self)
+        if self._out:
+            self._broadcast()
+
+    def run_once(self):
+        Hub.run_once(self)
+        if self._out:
+            self._broadcast()
+
+    def _ready(self, handler, events):
+        if isinstance(handler, Receiver):
+            self._readable(handler)
+        elif isinstance(handler, Client):
+            self._client(handler, events)
+        else:
+            handler(events)
+
+    def _frame(self, receiver, length, frame):
+        if self.clients or self.datagram_clients:
+            self._out.append((FRAME, encode_frame(length, frame)))
+
+    def _deliver(self, message, names):
+        if self.clients or self.datagram_clients:
+            self._out.append((MESSAGE, encode_message(message)))
+        if self.on_message is not None:
+            Hub._deliver(self, message, names)
+
+    def _accept(self, events):
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except socket.error as e:
+                if e.errno not in BLOCKING:
+                    self.logger.error('Bridge accept failed: %s', e)
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.sndbuf:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+            client = Client(sock, address)
+            self.clients[sock.fileno()] = client
+            self._selector.register(sock.fileno(), EVENT_READ, client)
+            self.logger.info('Bridge client %s connected', client)
+
+    def _client(self, client, events):
+        if events & EVENT_READ:
+            try:
+                data = client.sock.recv(64)
+            except socket.error as e:
+                if e.errno not in BLOCKING:
+                    self._drop(client, e)
+                    return
+            else:
+                if not data:
+                    self._drop(client, 'disconnected')
+                    return
+                client.kinds = bytearray(data)[-1] & KINDS
+        if events & EVENT_WRITE and client.buffer:
+            self._send(client)
+
+    def _datagram(self, events):
+        while True:
+            try:
+                data, address = self._udp.recvfrom(64)
+            except socket.error as e:
+                if e.errno not in BLOCKING:
+                    self.logger.warning('Bridge UDP receive failed: %s', e)
+                return
+            if len(data) != SUBSCRIBE.size:
+                continue
+            kinds, cookie = SUBSCRIBE.unpack(data)
+            expected = self._cookie(address)
+            if not hmac.compare_digest(cookie, expected):
+                try:
+                    self._udp.sendto(HEADER.pack(len(expected), COOKIE) + expected, address)
+                except socket.error:
+                    pass
+                continue
+            kinds &= KINDS
+            if kinds:
+                if address not in self.datagram_clients:
+                    self.logger.info('Bridge UDP client %s:%d subscribed', *address)
+                self.datagram_clients[address] = (kinds, time.time() + self.udp_expiry)
+            else:
+                self.datagram_clients.pop(address, None)
+
+    def _cookie(self, address):
+        return hmac.new(self._secret, ('%s:%d' % address[:2]).encode('ascii'),
+                        hashlib.sha256).digest()[:8]
+
+    def _broadcast(self):
+        out = self._out
+        self._out = []
+        # joined once for each combination of kinds wanted
+        joined = {}
+        for client in list(self.clients.values()):
+            kinds = client.kinds
+            if not kinds:
+                continue
+            data = joined.get(kinds)
+            if data is None:
+                data = joined[kinds] = b''.join([record for kind, record in out if kind & kinds])
+            if data:
+                self._queue(client, data)
+
+        if self.datagram_clients:
+            now = time.time()
+            packets = {}
+            for address, (kinds, expires) in list(self.datagram_clients.items()):
+                if expires <= now:
+                    del self.datagram_clients[address]
+                    self.logger.info('Bridge UDP client %s:%d expired', *address)
+                    continue
+                if kinds not in packets:
+                    packets[kinds] = list(datagrams(record for kind, record in out if kind & kinds))
+                for packet in packets[kinds]:
+                    try:
+                        self._udp.sendto(packet, address)
+                    except socket.error:
+                        self.dropped += 1
+
+    def _queue(self, client, data):
+        client.buffer += data
+        if not client.writing and not self._send(client):
+            return
+        if len(client.buffer) > self.max_buffer:
+            self.evicted += 1
+            self.logger.warning('Bridge client %s fell %d bytes behind', client, len(client.buffer))
+            self._drop(client, 'evicted')
+
+    def _send(self, client):
+        """Write what the socket will take, returning False if the client was dropped."""
+        try:
+            sent = client.sock.send(client.buffer)
+        except socket.error as e:
+            if e.errno not in BLOCKING:
+                self._drop(client, e)
+                return False
+            sent = 0
+        del client.buffer[:sent]
+        writing = bool(client.buffer)
+        if writing != client.writing:
+            client.writing = writing
+            events = EVENT_READ | EVENT_WRITE if writing else EVENT_READ
+            self._selector.modify(client.sock.fileno(), events, client)
+        return True
+
+    def _drop(self, client, reason):
+        fd = client.sock.fileno()
+        self._selector.unregister(fd)
+        del self.clients[fd]
+        client.sock.close()
+        self.logger.info('Bridge client %s dropped: %s', client, reason)
+
+    def close(self):
+        for client in list(self.clients.values()):
+            self._drop(client, 'closing')
+        for sock in (self._listener, self._udp):
+            if sock is not None:
+                self._selector.unregister(sock.fileno())
+                sock.close()
+        Hub.close(self)
+
+class BridgeClient(object):
+    """Receives records from a BridgeServer, over TCP or with udp=True UDP.
+
+    kinds is MESSAGE, FRAME or both or'd together. Over UDP the subscription
+    is made once the server's cookie has been read, and renewed every
+    keepalive seconds as records are read; records lost on the way are not
+    sent again.
+    """
+
+    keepalive = 30.0
+
+    def __init__(self, address, kinds=MESSAGE, udp=False, timeout=5.0):
+        self.kinds = kinds
+        self.udp = udp
+        if udp:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address, timeout)
+            self.sock.settimeout(None)
+        self._buffer = bytearray()
+        self._cookie = NO_COOKIE
+        self._subscribe()
+
+    def _subscribe(self):
+        if self.udp:
+            self.sock.send(SUBSCRIBE.pack(self.kinds, self._cookie))
+        else:
+            self.sock.send(SIZE.pack(self.kinds))
+        self._renew = time.time() + self.keepalive
+
+    def read(self, timeout=None):
+        """The (kind, body) records received, waiting up to timeout for some.
+
+        Raises IOError once the server has closed the connection.
+        """
+        if self.udp and time.time() >= self._renew:
+            self._subscribe()
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return []
+        data = self.sock.recv(65536)
+        if self.udp:
+            records = split(data)[0]
+            if records and records[0][0] == COOKIE:
+                self._cookie = bytes(records[0][1])
+                self._subscribe()
+                return self.read(timeout)
+            return records
+        if not data:
+            raise IOError('Bridge closed the connection')
+        buffer = self._buffer
+        buffer += data
+        records, used = split(buffer)
+        del buffer[:used]
+        return records
+
+    def messages(self, timeout=None):
+        """Yields the messages received, until timeout passes without any."""
+        while True:
+            records = self.read(timeout)
+            if not records:
+                return
+            for kind, body in records:
+                if kind == MESSAGE:
+                    yield decode_message(body)
+
+    def close(self):
+        self.sock.close()
+
+class BridgeRFXSerial(object):
+    """Serial type reading the raw frames a BridgeServer streams.
+
+    device is the server as 'host:port'. The handshake is answered here, so
+    an RFXCom on another host reads the receiver as if it were plugged in,
+    and does its own parsing, deduplication and recording. Transmitting is
+    not supported.
+
+    >>> server = BridgeServer(('127.0.0.1', 0), udp=False)
+    >>> from rfxcom import FakeRFXSerial
+    >>> def on_message(m):
+    ...     print(m)
+    ...     if m['source'] == '31F8177G':
+    ...         rfx.stop()
+    >>> rfx = RFXCom(on_message, device='127.0.0.1:%d' % server.address[1], serial_type=BridgeRFXSerial)
+    >>> rfx.setup()
+    >>> while not len(server):
+    ...     server.run_once()
+    >>> hall = server.add('hall', serial_type=FakeRFXSerial)
+    >>> while hall.fin.in_waiting:
+    ...     server.run_once()
+    >>> rfx.run()
+    topic: x10, group: a, device: 11, command: on, source: a11
+    topic: x10, group: a, device: 01, command: off, source: a01
+    topic: homeeasy, address: 31f8177, device: group, command: off, source: 31F8177G
+    >>> rfx.close()
+    >>> server.close()
+    """
+
+    responses = dict(RFXCom.handshake)
+
+    def __init__(self, device, baudrate=4800, timeout=0.5):
+        self.client = BridgeClient(address(device), FRAME)
+        self.timeout = timeout
+        self.buffer = bytearray()
+
+    def _receive(self, timeout):
+        for kind, body in self.client.read(timeout):
+            if kind == FRAME:
+                self.buffer += body
+
+    @property
+    def in_waiting(self):
+        self._receive(0)
+        return len(self.buffer)
+
+    def read(self, size=1):
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        while len(self.buffer) < size:
+            left = None
+            if self.timeout is not None:
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+            self._receive(left)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def write(self, data):
+        response = self.responses.get(bytes(data))
+        if response is None:
+            raise ValueError('Cannot transmit through a bridge: %r' % data)
+        # ahead of any frames already received
+        self.buffer[0:0] = response
+
+    def flush(self):
+        del self.buffer[:]
+
+    def close(self):
+        self.client.close()
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
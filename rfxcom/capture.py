@@ -0,0 +1,252 @@
+"""Binary capture of received frames, and replay of captures.
+
+A capture is a header followed by one record per frame::
+
+    header: b'RFXC' version:uint8 start:float64   (wall clock time)
+    record: offset:float64 length:uint8 payload
+
+offset is monotonic seconds since the start of the capture, length the bit
+length header as received and payload the ``frame_size(length)`` bytes that
+followed it, so a capture is the wire stream with timestamps added.
+"""
+from __future__ import print_function
+
+import time
+import struct
+
+from rfxcom import RFXCom, FakeRFXSerial, RFXError
+from rfxcom.framing import FrameBuffer, frame_size
+
+MAGIC = b'RFXC'
+VERSION = 1
+HEADER = struct.Struct('<4sBd')
+RECORD = struct.Struct('<dB')
+
+clock = getattr(time, 'monotonic', time.time)
+
+def _open(f, mode):
+    if hasattr(f, 'read') or hasattr(f, 'write'):
+        return f
+    return open(f, mode)
+
+class CaptureWriter(object):
+    """Writes frames to a capture file (path or binary file object).
+
+    >>> import io
+    >>> f = io.BytesIO()
+    >>> w = CaptureWriter(f, start=1000.0)
+    >>> w.write(32, b'\\x64\\x9b\\x08\\xf7', offset=0.5)
+    >>> w.write(34, b'\\xc7\\xe0\\x5d\\xe0\\x00', offset=1.25)
+    >>> len(f.getvalue())
+    40
+    >>> r = CaptureReader(io.BytesIO(f.getvalue()))
+    >>> r.start
+    1000.0
+    >>> [(offset, length, len(data)) for offset, length, data in r]
+    [(0.5, 32, 4), (1.25, 34, 5)]
+    """
+
+    def __init__(self, f, start=None):
+        self.f = _open(f, 'wb')
+        self.start = time.time() if start is None else start
+        self._base = clock()
+        self.f.write(HEADER.pack(MAGIC, VERSION, self.start))
+
+    def write(self, length, data, offset=None):
+        if offset is None:
+            offset = clock() - self._base
+        self.f.write(RECORD.pack(offset, length) + data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+class CaptureReader(object):
+    """Iterates (offset, length, payload) records from a capture file.
+
+    Records are read incrementally, so captures need not fit in memory.
+    """
+
+    def __init__(self, f):
+        self.f = _open(f, 'rb')
+        header = self.f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise RFXError('Truncated capture header')
+        magic, version, self.start = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise RFXError('Not a version %d capture: %r' % (VERSION, header[:5]))
+
+    def __iter__(self):
+        read = self.f.read
+        while True:
+            header = read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            offset, length = RECORD.unpack(header)
+            size = frame_size(length)
+            data = read(size)
+            if len(data) < size:
+                return
+            yield offset, length, data
+
+    def close(self):
+        self.f.close()
+
+class RecordingRFXSerial(object):
+    """Wraps a serial type, recording the frames read through it.
+
+    Bytes read in reply to a handshake command are passed through
+    unrecorded. Enabled with ``RFXCom(..., record=path)``.
+
+    >>> import io
+    >>> f = io.BytesIO()
+    >>> def on_message(m):
+    ...     if m['source'] == '31F8177G':
+    ...         rfx.stop()
+    >>> rfx = RFXCom(on_message, serial_type=FakeRFXSerial, log=False, record=f)
+    >>> rfx.setup()
+    >>> rfx.run()
+    >>> [(length, len(data)) for offset, length, data in CaptureReader(io.BytesIO(f.getvalue()))]
+    [(32, 4), (32, 4), (34, 5)]
+    """
+
+    responses = dict(RFXCom.handshake)
+
+    def __init__(self, base, f):
+        self._base = base
+        self._capture = CaptureWriter(f)
+        self._frames = FrameBuffer()
+        self._skip = 0
+
+    def read(self, size=1):
+        ret = self._base.read(size)
+        if ret:
+            data = ret
+            if self._skip:
+                skipped = min(self._skip, len(data))
+                self._skip -= skipped
+                data = data[skipped:]
+            frames = self._frames
+            frames.feed(data)
+            for length, frame in frames:
+                self._capture.write(length, frame)
+        return ret
+
+    def write(self, w):
+        self._skip = len(self.responses.get(bytes(w), b''))
+        self._frames.discard()
+        return self._base.write(w)
+
+    def close(self):
+        self._capture.close()
+        close = getattr(self._base, 'close', None)
+        if close:
+            close()
+
+    def __setattr__(self, k, v):
+        if k.startswith('_'):
+            super(RecordingRFXSerial, self).__setattr__(k, v)
+        else:
+            setattr(self.__dict__['_base'], k, v)
+
+    def __getattr__(self, k):
+        if k.startswith('_'):
+            raise AttributeError(k)
+        return getattr(self.__dict__['_base'], k)
+
+class ReplayRFXSerial(FakeRFXSerial):
+    """Serial type replaying a capture file given as the device.
+
+    By default frames are delivered as fast as RFXCom will read them, a
+    record at a time. With realtime=True they are paced by their original
+    offsets, scaled by speed. Either way duplicates are judged by when
+    frames were captured, not replayed, so a sensor's readings 40 seconds
+    apart are not taken for repeats of each other. At the end of the
+    capture reads raise EOFError, which ends RFXCom.run().
+
+    >>> import io, functools
+    >>> f = io.BytesIO()
+    >>> w = CaptureWriter(f)
+    >>> w.write(32, b'\\x64\\x9b\\x08\\xf7', offset=0.0)
+    >>> w.write(32, b'\\x64\\x9b\\x08\\xf7', offset=0.1)
+    >>> w.write(34, b'\\xc7\\xe0\\x5d\\xe0\\x00', offset=0.2)
+    >>> for realtime in (False, True):
+    ...     rfx = RFXCom(lambda m: print(repr(m)), log=False, device=io.BytesIO(f.getvalue()),
+    ...                  serial_type=functools.partial(ReplayRFXSerial, realtime=realtime, speed=10))
+    ...     rfx.setup()
+    ...     rfx.run()
+    Message('x10', command='on', device='11', group='a', source='a11')
+    Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G')
+    Message('x10', command='on', device='11', group='a', source='a11')
+    Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G')
+
+    The same reading captured 40 seconds apart is not a repeat, however
+    fast it is replayed:
+
+    >>> f = io.BytesIO()
+    >>> w = CaptureWriter(f)
+    >>> for offset in (0.0, 1.0, 40.0, 80.0):
+    ...     w.write(32, b'\\x64\\x9b\\x08\\xf7', offset=offset)
+    >>> rfx = RFXCom(lambda m: None, log=False, device=io.BytesIO(f.getvalue()),
+    ...              serial_type=ReplayRFXSerial)
+    >>> rfx.setup()
+    >>> rfx.run()
+    >>> rfx.metrics.messages, rfx.metrics.duplicates
+    (3, 1)
+    """
+
+    packets = []
+    # when the frame being read was captured, for RFXCom's deduplication
+    frame_time = None
+
+    def __init__(self, device, baudrate=4800, realtime=False, speed=1.0):
+        super(ReplayRFXSerial, self).__init__()
+        self.capture = CaptureReader(device)
+        self.records = iter(self.capture)
+        self.realtime = realtime
+        self.speed = speed
+        self._started = None
+        self._ended = False
+
+    def _next(self):
+        record = next(self.records, None)
+        if record is None:
+            self._ended = True
+        return record
+
+    def _load(self):
+        if self.buffer or self._ended:
+            return
+        record = self._next()
+        if record is None:
+            return
+        offset, length, data = record
+        if self.realtime:
+            if self._started is None:
+                self._started = clock() - offset / self.speed
+            delay = self._started + offset / self.speed - clock()
+            if delay > 0:
+                time.sleep(delay)
+        self.frame_time = self.capture.start + offset
+        self.buffer = struct.pack('B', length) + data
+
+    @property
+    def in_waiting(self):
+        if not self.realtime:
+            self._load()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self._load()
+        if not self.buffer and self._ended:
+            raise EOFError('End of capture')
+        return super(ReplayRFXSerial, self).read(size) or b''
+
+    def close(self):
+        self.capture.close()
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
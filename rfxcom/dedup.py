@@ -0,0 +1,105 @@
+import time
+from collections import deque
+
+from rfxcom.message import Record
+
+class Deduplicator(object):
+    """Suppresses repeated messages seen within a time window.
+
+    Messages are indexed by a hashable key, so lookups are O(1). Each
+    distinct TTL gets its own window: a dict of last-seen times plus a queue
+    of (timestamp, key) in arrival order. Refreshed keys leave stale entries
+    in the queue which are skipped when they reach the front, so expiry is
+    amortized O(1).
+
+    >>> from rfxcom.message import Message
+    >>> d = Deduplicator(2.5)
+    >>> d.seen(Message('x10', source='a11', command='on'), now=0)
+    False
+    >>> d.seen(Message('x10', source='a11', command='on'), now=1)
+    True
+    >>> d.seen(Message('x10', source='a11', command='off'), now=1)
+    False
+
+    Duplicates refresh the timestamp, so continuous transmissions are treated
+    as one (I'm looking at you HomeEasy 403 PIR):
+
+    >>> d.seen(Message('x10', source='a11', command='on'), now=3)
+    True
+    >>> d.seen(Message('x10', source='a11', command='on'), now=6)
+    False
+    >>> len(d)
+    1
+
+    TTLs may be configured per source or per topic, source taking precedence:
+
+    >>> d = Deduplicator(2.5, ttls={'owl': 30, 'a11': 0.5})
+    >>> d.ttl_for(Message('owl', source='a6'))
+    30
+    >>> d.ttl_for(Message('x10', source='a11'))
+    0.5
+    >>> d.ttl_for(Message('x10', source='a12'))
+    2.5
+    """
+
+    def __init__(self, ttl=2.5, ttls=None):
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self._windows = {}
+
+    @staticmethod
+    def key(message):
+        """Hashable key identifying a message's content.
+
+        >>> from rfxcom.message import Message
+        >>> Deduplicator.key(Message('a', b=1)) == Deduplicator.key(Message('a', b=1))
+        True
+        >>> Deduplicator.key(Message('a', b=1)) == Deduplicator.key(Message('a', b=2))
+        False
+        """
+        if isinstance(message, Record):
+            return message
+        return (message.topic, frozenset(message.values.items()))
+
+    def ttl_for(self, message):
+        ttls = self.ttls
+        if ttls:
+            ttl = ttls.get(message.get('source'))
+            if ttl is None:
+                ttl = ttls.get(message.topic)
+            if ttl is not None:
+                return ttl
+        return self.ttl
+
+    def expire(self, now):
+        """Drop all entries older than their TTL."""
+        for ttl, (last_seen, queue) in self._windows.items():
+            expire_before = now - ttl
+            while queue and queue[0][0] < expire_before:
+                timestamp, key = queue.popleft()
+                if last_seen.get(key) == timestamp:
+                    del last_seen[key]
+
+    def seen(self, message, now=None):
+        """Record message, returning True if it is a duplicate."""
+        if now is None:
+            now = time.time()
+        self.expire(now)
+
+        ttl = self.ttl_for(message)
+        window = self._windows.get(ttl)
+        if window is None:
+            window = self._windows[ttl] = ({}, deque())
+        last_seen, queue = window
+
+        key = self.key(message)
+        duplicate = key in last_seen
+        last_seen[key] = now
+        queue.append((now, key))
+        return duplicate
+
+    def clear(self):
+        self._windows.clear()
+
+    def __len__(self):
+        return sum(len(last_seen) for last_seen, queue in self._windows.values())
@@ -0,0 +1,422 @@
+"""An RFXCOM receiver emulated on a pseudo-terminal, for testing without one.
+
+The Emulator owns the master side of a pty and answers the handshake on
+the slave side as the device does, then sends frames from a load profile
+down it a byte at a time, at the pace of the serial line. Anything that
+opens a serial port by name can read from ``emulator.device``: Pyserial,
+with its read and inter-character timeouts, or TTYSerial where pyserial
+is not installed.
+
+Profiles are iterables of (seconds, bytes) in time order: when each
+transmission is heard, from the first enable command, and what the device
+writes for it. Ten Oregon sensors sending every 40 seconds, their 80
+seconds played forty times faster:
+
+>>> import threading, time
+>>> from rfxcom import RFXCom, Pyserial
+>>> try:
+...     import serial
+...     serial_type = Pyserial
+... except ImportError:
+...     serial_type = TTYSerial
+>>> emulator = Emulator(sensors(10, interval=40, duration=80, seed=1), speed=40)
+>>> heard = []
+>>> rfx = RFXCom(heard.append, device=emulator.device, serial_type=serial_type)
+>>> rfx.setup()
+>>> def stop():
+...     emulator.wait(10)
+...     deadline = time.time() + 5
+...     while rfx.metrics.frames < emulator.frames and time.time() < deadline:
+...         time.sleep(0.01)
+...     rfx.stop()
+>>> threading.Thread(target=stop).start()
+>>> rfx.run()
+>>> stats = rfx.stats()
+>>> stats['frames'] == emulator.frames == 2 * len(heard), stats['short_reads']
+(True, 0)
+>>> emulator.stats()['overruns'], emulator.stats()['delay']['count'] == emulator.frames
+(0, True)
+
+The version request is answered too, and frames written to the device
+are kept:
+
+>>> rfx.write(b'\\xf0\\x20')
+>>> rfx.fin.read(4) == b'\\x4d\\x18\\x53\\x30'
+True
+>>> from rfxcom.message import X10Message
+>>> from rfxcom.transmit import frame
+>>> rfx.write(frame(X10Message('a', '01', 'on')))
+>>> time.sleep(0.2)
+>>> emulator.sent == [frame(X10Message('a', '01', 'on'))]
+True
+>>> rfx.close()
+>>> emulator.close()
+"""
+
+import os
+import tty
+import time
+import errno
+import fcntl
+import heapq
+import random
+import select
+import struct
+import logging
+import termios
+import threading
+from collections import deque
+
+from rfxcom.capture import CaptureReader
+from rfxcom.framing import frame_size
+from rfxcom.generators import OREGON_KEYS, oregon_frame, x10_frame, wire
+from rfxcom.metrics import Histogram, clock, _histogram
+
+# answer to the version request, as FakeRFXSerial gives
+VERSION = b'\x4d\x18\x53\x30'
+
+def sensors(count, interval=40.0, duration=None, repeats=2, seed=None):
+    """Oregon sensors, each sending random readings every interval seconds or so.
+
+    Each sensor is a random type with its own channel and rolling code, and
+    a period within 10% of interval, so they drift against each other as
+    real ones do. Every reading is sent repeats times back to back, as
+    version 2.1 sensors do.
+
+    >>> profile = list(sensors(500, duration=60, seed=1))
+    >>> len(set(data for t, data in profile)) * 2 == len(profile) > 1000
+    True
+    >>> profile == sorted(profile), profile[-1][0] < 60
+    (True, True)
+    """
+    rng = random.Random(seed)
+    heap = []
+    for i in range(count):
+        period = interval * rng.uniform(0.9, 1.1)
+        heap.append((rng.uniform(0, period), i, rng.choice(OREGON_KEYS),
+                     rng.randrange(0x10, 0x40), rng.randrange(256), period))
+    heapq.heapify(heap)
+    while heap:
+        t, i, key, channel, rolling, period = heapq.heappop(heap)
+        if duration is not None and t >= duration:
+            return
+        data = wire([oregon_frame(key, rng, channel, rolling)])
+        for repeat in range(repeats):
+            yield t, data
+        heapq.heappush(heap, (t + period, i, key, channel, rolling, period))
+
+def pir(count, rate=0.05, burst=5, duration=None, seed=None):
+    """X10 motion sensors, each going off rate times a second on average.
+
+    Triggers are random (a Poisson process per sensor), each sending an on
+    command burst times, as the sensors repeat it.
+
+    >>> profile = list(pir(16, rate=1, duration=10, seed=1))
+    >>> len(profile) % 5, len(set(data for t, data in profile))
+    (0, 16)
+    """
+    rng = random.Random(seed)
+    heap = [(rng.expovariate(rate), i) for i in range(count)]
+    heapq.heapify(heap)
+    while heap:
+        t, i = heapq.heappop(heap)
+        if duration is not None and t >= duration:
+            return
+        data = wire([x10_frame('abcdefghijklmnop'[i // 16 % 16], i % 16 + 1, 'on')])
+        for repeat in range(burst):
+            yield t, data
+        heapq.heappush(heap, (t + rng.expovariate(rate), i))
+
+def corrupted(profile, rate=0.01, seed=None):
+    """A profile with a fraction rate of its transmissions damaged on the line.
+
+    A damaged transmission has a payload bit flipped, fails its check and
+    is dropped, or loses or gains a byte, which misframes what follows.
+
+    >>> clean = list(pir(4, rate=1, duration=10, seed=1))
+    >>> damaged = list(corrupted(clean, rate=1, seed=1))
+    >>> len(damaged) == len(clean), any(a == b for a, b in zip(clean, damaged))
+    (True, False)
+    """
+    rng = random.Random(seed)
+    for t, data in profile:
+        if rng.random() < rate:
+            p = bytearray(data)
+            damage = rng.randrange(3)
+            if damage == 0:
+                bit = rng.randrange(8, len(p) * 8)
+                p[bit // 8] ^= 1 << (bit % 8)
+            elif damage == 1:
+                del p[rng.randrange(len(p))]
+            else:
+                p.insert(rng.randrange(len(p) + 1), rng.randrange(256))
+            data = bytes(p)
+        yield t, data
+
+def mixed(*profiles):
+    """Profiles heard together, in time order."""
+    return heapq.merge(*profiles)
+
+def replay(f):
+    """A capture (path or binary file object) as a profile."""
+    for offset, length, data in CaptureReader(f):
+        yield offset, struct.pack('B', length) + data
+
+class Emulator(object):
+    """An RFXCOM receiver on a pty, sending frames from a profile once enabled.
+
+    The device answers f0 2c (variable length mode, which also resets it)
+    and f0 2a (enable receiving) with 2c, and f0 20 with its version.
+    Frames written to it are kept in sent. Transmissions are sent from
+    when receiving is first enabled, speed times faster than the profile
+    says, each byte at the pace of the serial line; those due while reset
+    are missed. Bytes a reader is too slow to take are dropped, as a
+    device's buffer overruns.
+
+    The delay from a transmission being due to its last byte being sent
+    is recorded in a histogram: it grows when the line cannot keep up.
+    """
+
+    # seconds from a transmission being due to its last byte sent
+    delay_bounds = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    # longest wait for commands while sending is idle, so stop() is noticed
+    idle_wait = 0.1
+
+    def __init__(self, profile=(), baudrate=4800, speed=1.0, thread=True):
+        self.master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        fcntl.fcntl(self.master, fcntl.F_SETFL, fcntl.fcntl(self.master, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.device = os.ttyname(self._slave)
+        self.profile = iter(profile)
+        self.speed = speed
+        # seconds per byte down the serial line, 10 bits with start and stop
+        self.byte_time = 10.0 / baudrate
+        self.enabled = False
+        self.sent = []
+        self.frames = 0
+        self.bytes = 0
+        self.missed = 0
+        self.overruns = 0
+        self.delay = Histogram(self.delay_bounds)
+        self.logger = logging.getLogger('rfxcom')
+        self._commands = bytearray()
+        self._next = next(self.profile, None)
+        # when the profile started, and when the next byte on the line is due
+        self._started = None
+        self._line_time = 0.0
+        self._line = bytearray()
+        # (bytes sent once its last byte is, when it was due) for frames on the line
+        self._ends = deque()
+        self._queued = self._written = 0
+        self._lock = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        if thread:
+            self._thread = threading.Thread(target=self._run, name='rfxcom-emulator')
+            self._thread.daemon = True
+            self._thread.start()
+
+    @property
+    def idle(self):
+        """Whether the profile has been sent in full."""
+        return self._next is None and not self._line
+
+    def poll(self, now=None):
+        """Answer commands and send what is due, returning seconds until the next byte, or None."""
+        with self._lock:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EIO):
+                    raise
+            else:
+                self._received(data)
+            delay = self._send(clock() if now is None else now)
+            if self.idle:
+                self._lock.notify_all()
+            return delay
+
+    def _received(self, data):
+        commands = self._commands
+        commands += data
+        while commands:
+            if commands[0] == 0xf0:
+                if len(commands) < 2:
+                    break
+                self._command(commands[1])
+                del commands[:2]
+            else:
+                size = 1 + frame_size(commands[0])
+                if len(commands) < size:
+                    break
+                self.sent.append(bytes(commands[:size]))
+                del commands[:size]
+
+    def _command(self, command):
+        if command == 0x2c:
+            self.enabled = False
+            del self._line[:]
+            self._ends.clear()
+            self._queued = self._written
+            self._write(b'\x2c')
+        elif command == 0x2a:
+            self.enabled = True
+            if self._started is None:
+                self._started = clock()
+            self._write(b'\x2c')
+        elif command == 0x20:
+            self._write(VERSION)
+        else:
+            self.logger.warning('Emulator: unknown command f0 %02x', command)
+
+    def _write(self, data):
+        try:
+            written = os.write(self.master, data)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            written = 0
+        self.overruns += len(data) - written
+
+    def _send(self, now):
+        if self._started is None:
+            return None
+        # queue transmissions due, or miss them while reset
+        while self._next is not None:
+            due = self._started + self._next[0] / self.speed
+            if due > now:
+                break
+            data = self._next[1]
+            if not self.enabled:
+                self.missed += 1
+            else:
+                if not self._line:
+                    self._line_time = max(self._line_time, due)
+                self._line += data
+                self._queued += len(data)
+                self._ends.append((self._queued, due))
+            self._next = next(self.profile, None)
+
+        if self._line:
+            count = min(int((now - self._line_time) / self.byte_time), len(self._line))
+            if count > 0:
+                self._write(bytes(self._line[:count]))
+                del self._line[:count]
+                self._line_time += count * self.byte_time
+                self._written += count
+                self.bytes += count
+                ends = self._ends
+                while ends and ends[0][0] <= self._written:
+                    self.delay.observe(now - ends.popleft()[1])
+                    self.frames += 1
+            if self._line:
+                return max(self._line_time + self.byte_time - now, 0.0)
+        if self._next is not None and self.enabled:
+            return max(self._started + self._next[0] / self.speed - now, 0.0)
+        return None
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                delay = self.poll()
+            except Exception:
+                self.logger.exception('Emulator error')
+                delay = 1.0
+            if delay is None or delay > self.idle_wait:
+                delay = self.idle_wait
+            try:
+                select.select([self.master], [], [], delay)
+            except (OSError, select.error):
+                if not self._stopping:
+                    raise
+
+    def wait(self, timeout=None):
+        """Wait until the profile has been sent, or timeout passes; returns whether it has."""
+        deadline = None if timeout is None else clock() + timeout
+        with self._lock:
+            while not self.idle:
+                if deadline is None:
+                    delay = self.idle_wait
+                else:
+                    delay = deadline - clock()
+                    if delay <= 0:
+                        return False
+                if self._thread is None:
+                    time.sleep(min(self.poll() or self.idle_wait, delay))
+                else:
+                    self._lock.wait(min(delay, self.idle_wait))
+        return True
+
+    def stop(self):
+        """Stop sending, leaving the pty open."""
+        self._stopping = True
+        if self._thread:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self._slave)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'missed': self.missed,
+            'overruns': self.overruns,
+            'sent': len(self.sent),
+            'delay': _histogram(self.delay),
+        }
+
+class TTYSerial(object):
+    """A serial port opened with the os module, for POSIX hosts without pyserial.
+
+    Reads time out as Pyserial's do: after timeout seconds with nothing
+    read, or inter_char_timeout seconds after the last byte.
+    """
+
+    def __init__(self, device, baudrate=4800):
+        self.fd = os.open(device, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        speed = getattr(termios, 'B%d' % baudrate)
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        self.timeout = 0.500
+        self.inter_char_timeout = 0.030
+
+    def flush(self):
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+    def write(self, data):
+        data = memoryview(data)
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def read(self, size=1):
+        data = bytearray()
+        deadline = None if self.timeout is None else clock() + self.timeout
+        while len(data) < size:
+            wait = None if deadline is None else deadline - clock()
+            if data:
+                wait = self.inter_char_timeout if wait is None else min(wait, self.inter_char_timeout)
+            if wait is not None and wait <= 0:
+                break
+            if not select.select([self.fd], [], [], wait)[0]:
+                break
+            data += os.read(self.fd, size - len(data))
+        return bytes(data)
+
+    @property
+    def in_waiting(self):
+        return struct.unpack('I', fcntl.ioctl(self.fd, termios.FIONREAD, b'\0\0\0\0'))[0]
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        os.close(self.fd)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
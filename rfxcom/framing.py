@@ -0,0 +1,202 @@
+def frame_size(length):
+    """Number of payload bytes following a variable length mode header.
+
+    >>> frame_size(32), frame_size(34), frame_size(0x80 | 32), frame_size(0)
+    (4, 5, 4, 0)
+    """
+    return ((length & 0x7F) + 7) // 8
+
+if isinstance(memoryview(b'\x00')[0], int):
+    view = memoryview
+    # types parsers can't index as ints
+    TEXT = ()
+else:
+    # Python 2 views index as strings, so frames are sliced from the bytearray
+    def view(buffer):
+        return buffer
+    TEXT = (bytes, memoryview)
+
+class FrameBuffer(object):
+    """Slices complete frames out of a stream of bytes.
+
+    Each frame is a one byte header giving the number of bits to follow,
+    then the payload. Bytes are appended to a single buffer which is only
+    compacted once fully consumed (or once the dead space grows large).
+
+    Payloads are memoryviews of the buffer, so no bytes are copied per
+    frame, and index as ints as parsers expect (on Python 2, where views
+    index as strings, they are bytearray copies). A buffer frames have been
+    taken from is never resized, but replaced, so a frame stays valid for
+    as long as it is held.
+
+    >>> b = FrameBuffer()
+    >>> b.feed(b'\\x20\\x64\\x9b\\x08\\xf7\\x22\\xc7\\xe0')
+    >>> length, data = b.next_frame()
+    >>> length, data == b'\\x64\\x9b\\x08\\xf7', data[1]
+    (32, True, 155)
+    >>> b.next_frame()
+    >>> b.missing(), b.partial()
+    (3, (5, 2))
+    >>> b.feed(b'\\x5d\\xe0\\x00')
+    >>> [n for n, payload in b]
+    [34]
+    >>> len(b), data == b'\\x64\\x9b\\x08\\xf7'
+    (0, True)
+    """
+
+    compact_after = 4096
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.pos = 0
+        # view of the buffer frames are sliced from, once any have been
+        self._view = None
+
+    def _replace(self, buffer):
+        self.buffer = buffer
+        self.pos = 0
+        self._view = None
+
+    def feed(self, data):
+        if self._view is None:
+            self.buffer += data
+        else:
+            self._replace(self.buffer[self.pos:] + data)
+
+    def __len__(self):
+        return len(self.buffer) - self.pos
+
+    def _frame(self, start, end):
+        if self._view is None:
+            self._view = view(self.buffer)
+        return self._view[start:end]
+
+    def peek(self):
+        """Return the next complete (length, data) frame without consuming it, or None."""
+        buf = self.buffer
+        pos = self.pos
+        if pos >= len(buf):
+            return None
+        end = pos + 1 + frame_size(buf[pos])
+        if end > len(buf):
+            return None
+        return buf[pos], self._frame(pos+1, end)
+
+    def next_frame(self):
+        """Return the next complete (length, data) frame, or None."""
+        buf = self.buffer
+        pos = self.pos
+        if pos >= len(buf):
+            return None
+        length = buf[pos]
+        end = pos + 1 + frame_size(length)
+        if end > len(buf):
+            return None
+        data = self._frame(pos+1, end)
+        if end == len(buf):
+            self._replace(bytearray())
+        elif end > self.compact_after:
+            self._replace(buf[end:])
+        else:
+            self.pos = end
+        return length, data
+    def __iter__(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def missing(self):
+        """Bytes still needed to complete the frame at the head of the buffer."""
+        available = len(self)
+        if not available:
+            return 0
+        return max(0, 1 + frame_size(self.buffer[self.pos]) - available)
+
+    def partial(self):
+        """(expected, received) payload sizes for an incomplete head frame."""
+        expected = frame_size(self.buffer[self.pos])
+        return expected, len(self) - 1
+
+    def discard(self):
+        self._replace(bytearray())
+
+    def skip(self, n):
+        """Drop n bytes from the head of the buffer."""
+        self.pos = min(self.pos + n, len(self.buffer))
+        if self.pos == len(self.buffer):
+            self.discard()
+
+    def resync(self, anchored, data=b'', strict=False):
+        """Realign on the next frame that anchored(length, payload) accepts.
+
+        data, the payload of a frame found to be misframed, is put back at
+        the head to be scanned too: the true start of a frame may be in it.
+        Each offset is tried in turn as a header, up to the first holding a
+        frame anchored accepts. Without one, the buffer is kept from the
+        first offset whose frame is not yet complete, to be tried when more
+        bytes arrive; or if strict, left as it was and None returned. At
+        most a frame's worth of bytes is examined per offset. Returns the
+        number of bytes skipped.
+
+        A byte dropped from the first frame misframes the rest:
+
+        >>> from rfxcom.parsers import X10Parser
+        >>> b = FrameBuffer()
+        >>> b.feed(b'\\x20\\x64\\x08\\xf7' + b'\\x20\\x60\\x9f\\x20\\xdf' + b'\\x20\\x64\\x9b\\x08\\xf7')
+        >>> length, data = b.next_frame()
+        >>> X10Parser.valid(length, bytearray(data))
+        False
+        >>> b.resync(X10Parser.valid, data)
+        3
+        >>> [(length, X10Parser.valid(length, bytearray(data))) for length, data in b]
+        [(32, True), (32, True)]
+        """
+        buf = bytearray(data) + self.buffer[self.pos:]
+        pos = 0
+        end = len(buf)
+        incomplete = None
+        while pos < end:
+            length = buf[pos]
+            stop = pos + 1 + frame_size(length)
+            if stop > end:
+                if incomplete is None:
+                    incomplete = pos
+            elif anchored(length, buf[pos+1:stop]):
+                break
+            pos += 1
+        else:
+            if strict:
+                return None
+            if incomplete is not None:
+                pos = incomplete
+        self._replace(buf)
+        self.skip(pos)
+        return pos
+
+class FrameReader(FrameBuffer):
+    """FrameBuffer filled from a serial type.
+
+    Each fill reads everything the device already has waiting (when the
+    serial type reports ``in_waiting``), or else just enough to complete the
+    current frame, so a backlog of frames is drained with a single read.
+    """
+
+    def __init__(self, fin):
+        super(FrameReader, self).__init__()
+        self.fin = fin
+
+    def fill(self):
+        """Read from the device, returning False on timeout."""
+        need = self.missing() or 1
+        waiting = getattr(self.fin, 'in_waiting', 0)
+        data = self.fin.read(max(need, waiting))
+        if not data:
+            return False
+        self.feed(data)
+        return True
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,119 @@
+"""Synthetic frames for every supported protocol.
+
+Frames are (length, payload) pairs as produced by FrameBuffer, with the
+payload as bytes. Used by benchmarks and for testing without a device.
+
+>>> from rfxcom.parsers import registry
+>>> def parse(frame):
+...     return registry.parse(frame[0], bytearray(frame[1]))
+>>> parse(x10_frame('a', 11, 'on'))
+Message('x10', command='on', device='11', group='a', source='a11')
+>>> parse(homeeasy_frame(0x31f8177, 'group', 'off'))
+Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G')
+>>> parse(homeeasy_frame(0x31f8177, 10, 'preset', level=7))
+Message('homeeasy', address='31f8177', command='preset', device='10', level=7, source='31F8177A')
+>>> parse(owl_frame(0xa6, 6.6, 0, 1.2))
+Message('owl', current1=6.6, current2=0, current3=1.2, source='a6')
+>>> from rfxcom.parsers import OregonParser
+>>> rng = random.Random(1)
+>>> all(OregonParser.valid(length, bytearray(data))
+...     for length, data in (oregon_frame(key, rng) for key in OregonParser.messages))
+True
+>>> stream = list(frames(1000, invalid=0.1, seed=1))
+>>> len(stream), sum(1 for f in stream if parse(f)) > 850
+(1000, True)
+"""
+
+import random
+import struct
+
+from rfxcom.framing import frame_size
+from rfxcom.message import X10Message, HomeEasyMessage
+from rfxcom.parsers import X10Parser, HomeEasyParser, OregonParser
+
+def _bytes(p):
+    return bytes(bytearray(p))
+
+def x10_frame(group, device, command):
+    """X10 frame; command is on or off, or a device-less dim/bright/all_lights_*."""
+    return X10Parser.encode(X10Message(group, device, command))
+
+def homeeasy_frame(address, device, command, level=0):
+    """HomeEasy frame; device is a unit number or 'group'."""
+    return HomeEasyParser.encode(HomeEasyMessage(address, device, level, command))
+
+def owl_frame(device, current1, current2, current3, counter=0):
+    """Owl CM113 frame, currents in amps (0.1A resolution)."""
+    c1, c2, c3 = [int(round(c * 10)) for c in (current1, current2, current3)]
+    p = [0xea, counter & 0xff, device,
+         c1 & 0xff,
+         ((c1 >> 8) & 0x3) | ((c2 & 0x3f) << 2),
+         ((c2 >> 6) & 0xf) | ((c3 & 0xf) << 4),
+         (c3 >> 4) & 0x3f,
+         0, 0, 0xff, 0x5f, 0, 0, 0, 0]
+    return 120, _bytes(p)
+
+def oregon_frame(key, rng=random, channel=None, rolling=None):
+    """Oregon frame for a (type, length) key of OregonParser.messages.
+
+    Readings are random BCD digits, with a valid checksum.
+    """
+    type, length = key
+    p = [type >> 8, type & 0xff,
+         channel if channel is not None else rng.randrange(0x10, 0x40),
+         rolling if rolling is not None else rng.randrange(256)]
+    p += [rng.randrange(10) << 4 | rng.randrange(10) for i in range(frame_size(length) - 4)]
+    OregonParser.messages[key].checksum.seal(p)
+    return length, _bytes(p)
+
+def corrupt(frame, rng=random):
+    """Flip one bit of a frame's payload."""
+    length, data = frame
+    p = bytearray(data)
+    bit = rng.randrange(len(p) * 8)
+    p[bit // 8] ^= 1 << (bit % 8)
+    return length, bytes(p)
+
+def garbage(rng=random):
+    """Random frame of a random length."""
+    length = rng.randrange(8, 128)
+    return length, _bytes(rng.randrange(256) for i in range(frame_size(length)))
+
+PROTOCOLS = ('x10', 'homeeasy', 'oregon', 'owl')
+OREGON_KEYS = sorted(OregonParser.messages)
+
+def frame(protocol, rng=random):
+    """Random valid frame for protocol."""
+    if protocol == 'x10':
+        if rng.random() < 0.1:
+            return x10_frame(rng.choice('abcdefghijklmnop'), 0,
+                             rng.choice(['dim', 'bright', 'all_lights_on', 'all_lights_off']))
+        return x10_frame(rng.choice('abcdefghijklmnop'), rng.randint(1, 16), rng.choice(['on', 'off']))
+    elif protocol == 'homeeasy':
+        command = rng.choice(['on', 'off', 'preset'])
+        device = rng.choice(['group', rng.randrange(16)])
+        return homeeasy_frame(rng.randrange(1 << 26), device, command, level=rng.randrange(16))
+    elif protocol == 'oregon':
+        return oregon_frame(rng.choice(OREGON_KEYS), rng)
+    elif protocol == 'owl':
+        return owl_frame(rng.randrange(256), rng.randrange(1024) / 10.0,
+                         rng.randrange(1024) / 10.0, rng.randrange(1024) / 10.0,
+                         counter=rng.randrange(256))
+    raise ValueError('unknown protocol: %r' % protocol)
+
+def frames(n, protocols=PROTOCOLS, invalid=0.0, seed=None):
+    """Generate n frames, a fraction of them corrupted or garbage."""
+    rng = random.Random(seed)
+    for i in range(n):
+        f = frame(rng.choice(protocols), rng)
+        if rng.random() < invalid:
+            f = corrupt(f, rng) if rng.random() < 0.5 else garbage(rng)
+        yield f
+
+def wire(frames):
+    """Frames as the byte stream the device sends."""
+    return b''.join(struct.pack('B', length) + data for length, data in frames)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,365 @@
+"""Several receivers driven by one selector loop."""
+
+import time
+import select
+import logging
+from collections import deque, namedtuple, OrderedDict
+
+from rfxcom import RFXCom
+from rfxcom.dedup import Deduplicator
+
+try:
+    import selectors
+except ImportError: # Python 2
+    selectors = None
+
+EVENT_READ = 1
+EVENT_WRITE = 2
+SelectorKey = namedtuple('SelectorKey', 'fileobj data')
+
+class PollSelector(object):
+    """The part of selectors.DefaultSelector used by Hub, for Python 2."""
+
+    def __init__(self):
+        self._poll = select.poll()
+        self._keys = {}
+
+    def register(self, fd, events, data=None):
+        self._poll.register(fd, self._mask(events))
+        self._keys[fd] = SelectorKey(fd, data)
+
+    def modify(self, fd, events, data=None):
+        self._poll.modify(fd, self._mask(events))
+        self._keys[fd] = SelectorKey(fd, data)
+
+    @staticmethod
+    def _mask(events):
+        mask = 0
+        if events & EVENT_READ:
+            mask |= select.POLLIN
+        if events & EVENT_WRITE:
+            mask |= select.POLLOUT
+        return mask
+
+    def unregister(self, fd):
+        self._poll.unregister(fd)
+        del self._keys[fd]
+
+    def select(self, timeout=None):
+        if timeout is not None:
+            timeout = max(0, timeout * 1000)
+        ready = []
+        for fd, event in self._poll.poll(timeout):
+            # as selectors does, errors and hangups wake readers and writers
+            events = 0
+            if event & ~select.POLLIN:
+                events |= EVENT_WRITE
+            if event & ~select.POLLOUT:
+                events |= EVENT_READ
+            ready.append((self._keys[fd], events))
+        return ready
+
+    def close(self):
+        self._keys.clear()
+
+class Receiver(object):
+    """A receiver attached to a Hub."""
+
+    def __init__(self, name, rfx):
+        self.name = name
+        self.rfx = rfx
+        self.fin = rfx.fin
+        self.reader = rfx.reader
+        self.polled = not hasattr(self.fin, 'fileno')
+        self.frames = 0
+        self.messages = 0
+
+    def read(self):
+        """Read what the device has waiting, returning None if it has closed."""
+        fin = self.fin
+        try:
+            data = fin.read(max(1, getattr(fin, 'in_waiting', 0)))
+        except (EOFError, IOError, OSError):
+            return None
+        if not data and not self.polled:
+            # readable but empty is end of file
+            return None
+        return data
+
+class Hub(object):
+    """Runs several receivers in one thread, deduplicating across them.
+
+    Each receiver is an RFXCom set up as usual. The hub then waits on all of
+    their file descriptors with one selector and reads whatever each has
+    waiting, so there is no thread per device. Serial types without a
+    ``fileno()``, such as FakeRFXSerial, are polled instead. on_frame, if
+    given, is called with the receiver, length and frame of every frame
+    read, before it is parsed.
+
+    One dedup window is shared by every receiver. A new message is held for
+    ``gather`` seconds while other receivers report hearing it, then passed to
+    on_message(message, receivers) with the names of every receiver that did:
+
+    >>> from rfxcom import FakeRFXSerial
+    >>> heard = []
+    >>> def on_message(message, receivers):
+    ...     heard.append((message['source'], receivers))
+    ...     if len(heard) == 3:
+    ...         hub.stop()
+    >>> hub = Hub(on_message, gather=0.05)
+    >>> hall = hub.add('hall', serial_type=FakeRFXSerial)
+    >>> garage = hub.add('garage', serial_type=FakeRFXSerial)
+    >>> hub.run()
+    >>> heard
+    [('a11', ('hall', 'garage')), ('a01', ('hall', 'garage')), ('31F8177G', ('hall', 'garage'))]
+    >>> [(r.name, r.frames, r.messages) for r in hub]
+    [('hall', 4, 3), ('garage', 4, 3)]
+
+    A receiver that loses a byte finds its frames again, as RFXCom does:
+
+    >>> import binascii
+    >>> from rfxcom.generators import wire, x10_frame
+    >>> data = wire([x10_frame(g, 1, 'on') for g in 'abcd'])
+    >>> class Dropped(FakeRFXSerial):
+    ...     packets = [(ord(data[:1]), binascii.hexlify(data[1:3] + data[4:]))]
+    >>> heard = []
+    >>> hub = Hub(on_message, gather=0)
+    >>> attic = hub.add('attic', serial_type=Dropped)
+    >>> hub.run()
+    >>> [source for source, receivers in heard], attic.rfx.metrics.resyncs
+    (['b01', 'c01', 'd01'], 1)
+
+    With pseudo-terminals standing in for devices, each receiver is watched
+    by the selector:
+
+    >>> import os, tty, threading, binascii
+    >>> class PtySerial(object):
+    ...     def __init__(self, device, baudrate):
+    ...         self.fd = device
+    ...     def read(self, size):
+    ...         return os.read(self.fd, size)
+    ...     def write(self, data):
+    ...         os.write(self.fd, data)
+    ...     def flush(self):
+    ...         pass
+    ...     def fileno(self):
+    ...         return self.fd
+    >>> def device(master, frames):
+    ...     for command in RFXCom.handshake:
+    ...         os.read(master, 2)
+    ...         os.write(master, b'\\x2c')
+    ...     os.write(master, binascii.unhexlify(frames))
+    >>> heard = []
+    >>> hub = Hub(on_message, gather=0.05)
+    >>> ptys = []
+    >>> for name, frames in (('hall', '20649b08f7' '22c7e05de000'), ('garage', '20649b08f7' '20609f20df')):
+    ...     master, slave = os.openpty()
+    ...     _ = tty.setraw(slave)
+    ...     ptys += [master, slave]
+    ...     threading.Thread(target=device, args=(master, frames)).start()
+    ...     receiver = hub.add(name, device=slave, serial_type=PtySerial)
+    >>> hub.run()
+    >>> sorted((source, sorted(receivers)) for source, receivers in heard)
+    [('31F8177G', ['hall']), ('a01', ['garage']), ('a11', ['garage', 'hall'])]
+    >>> for fd in ptys:
+    ...     os.close(fd)
+
+    Frames arriving at 4800 baud are read whole, however long they take:
+    an Owl frame takes 33ms, longer than short_timeout, but its bytes are
+    never more than 2ms apart:
+
+    >>> from rfxcom.emulator import Emulator, TTYSerial
+    >>> from rfxcom.generators import owl_frame
+    >>> emulator = Emulator([(i * 0.05, wire([owl_frame(0xa6, i, 0, 0)])) for i in range(20)])
+    >>> heard = []
+    >>> def on_message(message, receivers):
+    ...     heard.append((message['source'], receivers))
+    ...     if len(heard) == 20:
+    ...         hub.stop()
+    >>> hub = Hub(on_message, gather=0)
+    >>> owl = hub.add('owl', device=emulator.device, serial_type=TTYSerial)
+    >>> timer = threading.Timer(10, hub.stop)
+    >>> timer.start()
+    >>> hub.run()
+    >>> timer.cancel()
+    >>> len(heard), owl.rfx.metrics.short_reads
+    (20, 0)
+    >>> owl.rfx.close()
+    >>> emulator.close()
+    """
+
+    # give up on a partial frame after this long, as Pyserial's interCharTimeout
+    short_timeout = 0.030
+    # how often receivers without a file descriptor are polled when idle
+    poll_interval = 0.010
+
+    def __init__(self, on_message, dedup=2.5, gather=0.1, log=True, on_frame=None):
+        self.on_message = on_message
+        self.on_frame = on_frame
+        if not isinstance(dedup, Deduplicator):
+            dedup = Deduplicator(dedup)
+        self.dedup = dedup
+        self.gather = gather
+        self.log = log
+        self.logger = logging.getLogger('rfxcom')
+        self.stopping = False
+
+        self.receivers = OrderedDict()
+        self._polled = []
+        self._selector = selectors.DefaultSelector() if selectors else PollSelector()
+        # messages being gathered, by dedup key, and their deadlines in order
+        self._pending = {}
+        self._deadlines = deque()
+        # receivers part way through a frame, and when to give up on them
+        self._partial = {}
+
+    def add(self, name, **kwargs):
+        """Set up and attach a receiver, with arguments as for RFXCom."""
+        kwargs.setdefault('log', self.log)
+        rfx = RFXCom(None, **kwargs)
+        rfx.setup()
+        receiver = Receiver(name, rfx)
+        if receiver.polled:
+            self._polled.append(receiver)
+        else:
+            self._selector.register(rfx.fin.fileno(), EVENT_READ, receiver)
+        self.receivers[name] = receiver
+        return receiver
+
+    def remove(self, name):
+        """Detach and close a receiver."""
+        receiver = self.receivers.pop(name)
+        self._partial.pop(receiver, None)
+        if receiver.polled:
+            self._polled.remove(receiver)
+        else:
+            self._selector.unregister(receiver.fin.fileno())
+        receiver.rfx.close()
+
+    def __iter__(self):
+        return iter(list(self.receivers.values()))
+
+    def run(self):
+        while not self.stopping and self.receivers:
+            self.run_once()
+        self._flush()
+
+    def run_once(self):
+        """Wait for and handle data from any receiver."""
+        busy = False
+        for receiver in self._polled:
+            if getattr(receiver.fin, 'in_waiting', 1):
+                busy = self._readable(receiver) or busy
+
+        for key, events in self._selector.select(0 if busy else self._timeout()):
+            self._ready(key.data, events)
+
+        now = time.time()
+        if self._deadlines:
+            self._flush(now)
+        if self._partial:
+            self._expire_partial(now)
+
+    def _timeout(self):
+        deadlines = [1.0]
+        now = time.time()
+        if self._deadlines:
+            deadlines.append(self._deadlines[0][0] - now)
+        if self._partial:
+            deadlines.append(min(self._partial.values()) - now)
+        if self._polled:
+            deadlines.append(self.poll_interval)
+        return max(0, min(deadlines))
+
+    def _ready(self, receiver, events):
+        self._readable(receiver)
+
+    def _readable(self, receiver):
+        data = receiver.read()
+        if data is None:
+            self.logger.error('Receiver %s closed', receiver.name)
+            self.remove(receiver.name)
+            return False
+        if not data:
+            return False
+
+        reader = receiver.reader
+        reader.feed(data)
+        on_frame = self.on_frame
+        rfx = receiver.rfx
+        for length, frame in reader:
+            receiver.frames += 1
+            if on_frame is not None:
+                on_frame(receiver, length, frame)
+            message = rfx.parse(length, frame)
+            if rfx._unhandled:
+                rfx._unhandled = False
+                if rfx.resync:
+                    rfx.check_framing(length, frame)
+            elif rfx._suspect is not None:
+                rfx._suspect = None
+            if message:
+                receiver.messages += 1
+                self._heard(message, receiver.name)
+
+        if len(reader):
+            # a pause between bytes ends the frame, however long it takes to arrive
+            self._partial[receiver] = time.time() + self.short_timeout
+        else:
+            self._partial.pop(receiver, None)
+        return True
+
+    def _heard(self, message, name):
+        now = time.time()
+        duplicate = self.dedup.seen(message, now)
+        key = self.dedup.key(message)
+        pending = self._pending.get(key)
+        metrics = self.receivers[name].rfx.metrics
+        if pending is not None or duplicate:
+            metrics.duplicates += 1
+        else:
+            metrics.messages += 1
+        if pending is not None:
+            if name not in pending[1]:
+                pending[1].append(name)
+        elif duplicate:
+            self.logger.debug('Suppressed duplicate message %s', message)
+        elif self.gather:
+            self._pending[key] = (message, [name])
+            self._deadlines.append((now + self.gather, key))
+        else:
+            self._deliver(message, [name])
+
+    def _flush(self, now=None):
+        """Deliver messages gathered until now, or all of them."""
+        deadlines = self._deadlines
+        while deadlines and (now is None or deadlines[0][0] <= now):
+            deadline, key = deadlines.popleft()
+            message, names = self._pending.pop(key)
+            self._deliver(message, names)
+
+    def _expire_partial(self, now):
+        for receiver, deadline in list(self._partial.items()):
+            if deadline <= now:
+                del self._partial[receiver]
+                receiver.rfx.short_read(name=receiver.name)
+
+    def _deliver(self, message, names):
+        self.logger.info('Message: %s (%s)', message, ', '.join(names))
+        self.on_message(message, tuple(names))
+
+    def stats(self):
+        """Stats of each receiver by name, see rfxcom.metrics."""
+        return dict((name, r.rfx.stats()) for name, r in self.receivers.items())
+
+    def stop(self):
+        self.stopping = True
+
+    def close(self):
+        for name in list(self.receivers):
+            self.remove(name)
+        self._selector.close()
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,3 +1,17 @@
+from operator import attrgetter
+
+def _repr(topic, values):
+    if values:
+        def fmt(x):
+            if isinstance(x, float):
+                return '%.4g' % x
+            else:
+                return '%r' % x
+        vs = ['%s=%s' % (k, fmt(v)) for k, v in sorted(values.items())]
+        return 'Message(%r, %s)' % (topic, (', '.join(vs)))
+    else:
+        return 'Message(%r)' % topic
+
 class Message(object):
     def __init__(self, topic, **values):
         self.topic = topic
@@ -8,7 +22,7 @@ class Message(object):
         >>> str(Message('a', b=1))
         'topic: a, b: 1'
         """
-        return 'topic: %s, %s' % (self.topic, ', '.join('%s: %s' % m for m in self.values.iteritems()))
+        return 'topic: %s, %s' % (self.topic, ', '.join('%s: %s' % m for m in self.values.items()))
 
     def __repr__(self):
         """
@@ -17,16 +31,7 @@ class Message(object):
         >>> repr(Message('a', b=1))
         \"Message('a', b=1)\"
         """
-        if self.values:
-            def fmt(x):
-                if isinstance(x, float):
-                    return '%.4g' % x
-                else:
-                    return '%r' % x
-            vs = ['%s=%s' % (k, fmt(v)) for k, v in sorted(self.values.iteritems())]
-            return 'Message(%r, %s)' % (self.topic, (', '.join(vs)))
-        else:
-            return 'Message(%r)' % self.topic
+        return _repr(self.topic, self.values)
 
     def __eq__(self, m):
         """
@@ -47,6 +52,8 @@ class Message(object):
         True
         """
         self.values[k] = v
+        # encodings cached by rfxcom.serialize are stale now
+        self.__dict__.pop('_encoded', None)
 
     def __getitem__(self, k):
         """
@@ -55,6 +62,156 @@ class Message(object):
         """
         return self.values[k]
 
+    def get(self, k, default=None):
+        return self.values.get(k, default)
+
+_setattr = object.__setattr__
+
+class Record(object):
+    """Immutable message with a fixed set of fields.
+
+    Fields are held in __slots__, so records are compact, and equality and
+    hashing work on a tuple of the field values fetched in C. Fields left
+    as None are absent, as if they had never been set on a Message.
+
+    >>> m = X10Message(group='a', device='11', command='on', source='a11')
+    >>> m
+    Message('x10', command='on', device='11', group='a', source='a11')
+    >>> str(m)
+    'topic: x10, group: a, device: 11, command: on, source: a11'
+    >>> 'Message: %s' % m
+    'Message: topic: x10, group: a, device: 11, command: on, source: a11'
+    >>> m.topic, m['source'], m.get('level')
+    ('x10', 'a11', None)
+    >>> m == X10Message('a', '11', 'on', 'a11'), m == Message('x10', group='a', device='11', command='on', source='a11')
+    (True, True)
+    >>> m != X10Message('a', '11', 'off', 'a11')
+    True
+    >>> len(set([m, X10Message('a', '11', 'on', 'a11')]))
+    1
+    >>> m = TempMessage(source='thn132n.4d', sensor='thn132n.4d', temp=0.4, battery=90)
+    >>> str(m)
+    'topic: temp, source: thn132n.4d, sensor: thn132n.4d, temp: 0.4, battery: 90'
+    >>> m['humidity']
+    Traceback (most recent call last):
+    ...
+    KeyError: 'humidity'
+    >>> m['temp'] = 1
+    Traceback (most recent call last):
+    ...
+    TypeError: TempMessage is immutable
+    >>> m.temp = 1
+    Traceback (most recent call last):
+    ...
+    TypeError: TempMessage is immutable
+    """
+
+    # encodings cached by rfxcom.serialize, set on first use
+    __slots__ = ('_encoded',)
+    topic = None
+    fields = ()
+
+    @property
+    def values(self):
+        return dict((f, v) for f, v in zip(self.fields, self._astuple(self)) if v is not None)
+
+    def __getitem__(self, k):
+        if k in self._fieldset:
+            v = getattr(self, k)
+            if v is not None:
+                return v
+        raise KeyError(k)
+
+    def get(self, k, default=None):
+        if k in self._fieldset:
+            v = getattr(self, k)
+            if v is not None:
+                return v
+        return default
+
+    def __setitem__(self, k, v):
+        raise TypeError('%s is immutable' % type(self).__name__)
+
+    __setattr__ = __setitem__
+
+    def __eq__(self, other):
+        if other.__class__ is self.__class__:
+            return self._astuple(self) == other._astuple(other)
+        if isinstance(other, (Record, Message)):
+            return self.topic == other.topic and self.values == other.values
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    def __hash__(self):
+        return hash(self._key(self))
+
+    def __str__(self):
+        values = self._astuple(self)
+        if None in values:
+            return 'topic: %s, %s' % (self.topic, ', '.join(
+                '%s: %s' % (f, v) for f, v in zip(self.fields, values) if v is not None))
+        return self._format % values
+
+    def __repr__(self):
+        return _repr(self.topic, self.values)
+
+    def __reduce__(self):
+        return (self.__class__, self._astuple(self))
+
+def record(name, topic, fields):
+    """Define a Record type for topic with the given field order."""
+    fields = tuple(fields)
+    # generated so construction is one C call per field, as namedtuple does
+    source = 'def __init__(self, %s):\n' % ', '.join('%s=None' % f for f in fields)
+    source += ''.join('    _setattr(self, %r, %s)\n' % (f, f) for f in fields)
+    namespace = {'_setattr': _setattr}
+    exec(source, namespace)
+    astuple = attrgetter(*fields)
+    if len(fields) == 1:
+        astuple = lambda self, get=astuple: (get(self),)
+    return type(name, (Record,), {
+        '__slots__': fields,
+        '__init__': namespace['__init__'],
+        'topic': topic,
+        'fields': fields,
+        '_fieldset': frozenset(fields),
+        '_astuple': staticmethod(astuple),
+        '_key': attrgetter('topic', *fields),
+        '_format': 'topic: %s, ' % topic + ', '.join('%s: %%s' % f for f in fields),
+    })
+
+X10Message = record('X10Message', 'x10', ['group', 'device', 'command', 'source'])
+HomeEasyMessage = record('HomeEasyMessage', 'homeeasy', ['address', 'device', 'level', 'command', 'source'])
+TempMessage = record('TempMessage', 'temp', ['source', 'sensor', 'temp', 'humidity', 'baro', 'forecast', 'battery'])
+WindMessage = record('WindMessage', 'wind', ['source', 'sensor', 'dir', 'speed', 'avgspeed', 'battery'])
+RainMessage = record('RainMessage', 'rain', ['source', 'sensor', 'speed', 'total', 'battery'])
+UVMessage = record('UVMessage', 'uv', ['source', 'sensor', 'uv', 'risk', 'battery'])
+DateTimeMessage = record('DateTimeMessage', 'datetime', ['source', 'sensor', 'date', 'time', 'day'])
+OwlMessage = record('OwlMessage', 'owl', ['current1', 'current2', 'current3', 'source'])
+
+# record type by topic
+TOPICS = dict((cls.topic, cls) for cls in
+              (X10Message, HomeEasyMessage, TempMessage, WindMessage, RainMessage,
+               UVMessage, DateTimeMessage, OwlMessage))
+
+def build_message(topic, values):
+    """A message of topic's record type, or a Message if it has fields that type lacks.
+
+    >>> build_message('x10', {'group': 'a', 'device': '11', 'command': 'on'}).__class__.__name__
+    'X10Message'
+    >>> build_message('x10', {'group': 'a', 'channel': 2})
+    Message('x10', channel=2, group='a')
+    """
+    cls = TOPICS.get(topic)
+    if cls is not None and cls._fieldset.issuperset(values):
+        return cls(**values)
+    return Message(topic, **values)
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
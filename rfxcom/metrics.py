@@ -0,0 +1,259 @@
+"""Counters for the receive path, and a Prometheus text exporter."""
+
+import time
+import bisect
+import threading
+from collections import defaultdict
+
+from rfxcom.parsers import OregonParser
+
+clock = getattr(time, 'monotonic', time.time)
+
+class Histogram(object):
+    """Counts of observations at or under each bucket bound.
+
+    >>> h = Histogram([0.001, 0.01])
+    >>> for v in (0.0005, 0.001, 0.002, 0.5):
+    ...     h.observe(v)
+    >>> h.cumulative(), h.count
+    ([(0.001, 2), (0.01, 3), ('+Inf', 4)], 4)
+    """
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value, bisect=bisect.bisect_left):
+        self.counts[bisect(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class Metrics(object):
+    """Receive path counters kept by RFXCom.
+
+    Counters are plain attributes, bumped inline. Frames are counted per
+    parser object and Oregon frames per packet type and length, and both are named
+    only when stats are taken; the total is the sum of those parsed and
+    unhandled.
+
+    >>> from rfxcom import RFXCom, FakeRFXSerial
+    >>> def on_message(message):
+    ...     if message['source'] == '31F8177G':
+    ...         rfx.stop()
+    >>> rfx = RFXCom(on_message, serial_type=FakeRFXSerial)
+    >>> rfx.setup()
+    >>> rfx.run()
+    >>> rfx.stopping = False
+    >>> rfx.run_once()
+    >>> stats = rfx.stats()
+    >>> stats['frames'], stats['messages'], stats['unhandled'], stats['short_reads']
+    (4, 3, 1, 0)
+    >>> sorted(stats['parsers'].items())
+    [('HomeEasyParser', 1), ('X10Parser', 2)]
+    >>> stats['latency']['count']
+    3
+    """
+
+    # seconds from the first byte of a frame being read to on_message
+    latency_bounds = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+    # seconds from the device being lost to it being initialised again
+    reconnect_bounds = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.messages = 0
+        self.unhandled = 0
+        self.short_reads = 0
+        self.duplicates = 0
+        self.handshake_retries = 0
+        self.reconnects = 0
+        self.resyncs = 0
+        self.parsers = defaultdict(int)
+        self.oregon = defaultdict(int)
+        self.latency = Histogram(self.latency_bounds)
+        self.reconnect = Histogram(self.reconnect_bounds)
+
+    @property
+    def frames(self):
+        return sum(self.parsers.values()) + self.unhandled
+
+    def parsed(self, parser, length, packet):
+        self.parsers[parser] += 1
+        if parser.__class__ is OregonParser:
+            self.oregon[(packet[0] << 16) + (packet[1] << 8) + length] += 1
+
+    def sensors(self):
+        """Oregon frames by sensor part."""
+        counts = {}
+        for key, count in self.oregon.items():
+            part = OregonParser.messages[key >> 8, key & 0xff].part
+            counts[part] = counts.get(part, 0) + count
+        return counts
+
+    def stats(self):
+        parsers = {}
+        for parser, count in self.parsers.items():
+            name = type(parser).__name__
+            parsers[name] = parsers.get(name, 0) + count
+        return {
+            'frames': self.frames,
+            'messages': self.messages,
+            'unhandled': self.unhandled,
+            'short_reads': self.short_reads,
+            'duplicates': self.duplicates,
+            'handshake_retries': self.handshake_retries,
+            'reconnects': self.reconnects,
+            'resyncs': self.resyncs,
+            'downtime': self.reconnect.sum,
+            'parsers': parsers,
+            'sensors': self.sensors(),
+            'latency': _histogram(self.latency),
+            'reconnect': _histogram(self.reconnect),
+        }
+
+def _histogram(histogram):
+    return {
+        'count': histogram.count,
+        'sum': histogram.sum,
+        'buckets': histogram.cumulative(),
+    }
+
+# (name, help, stats key) of each exported counter
+COUNTERS = [
+    ('rfxcom_frames_total', 'Frames read from the device.', 'frames'),
+    ('rfxcom_messages_total', 'Messages passed on after deduplication.', 'messages'),
+    ('rfxcom_unhandled_frames_total', 'Frames no parser accepted.', 'unhandled'),
+    ('rfxcom_short_reads_total', 'Frames cut short by a read timeout.', 'short_reads'),
+    ('rfxcom_duplicates_total', 'Duplicate messages suppressed.', 'duplicates'),
+    ('rfxcom_handshake_retries_total', 'Failed attempts to initialise the device.', 'handshake_retries'),
+    ('rfxcom_reconnects_total', 'Times the device was lost and reconnected.', 'reconnects'),
+    ('rfxcom_resyncs_total', 'Times the stream was realigned after a framing error.', 'resyncs'),
+]
+
+# (name, help, stats key) of each exported histogram
+HISTOGRAMS = [
+    ('rfxcom_latency_seconds', 'Time from the first byte of a frame being read to on_message.', 'latency'),
+    ('rfxcom_reconnect_seconds', 'Time from the device being lost to it being initialised again.', 'reconnect'),
+]
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in sorted(labels.items()))
+
+def _sources(source):
+    """[(labels, Metrics)] from a Metrics, an RFXCom, a dict of them by receiver, or a callable."""
+    if callable(source):
+        source = source()
+    if isinstance(source, dict):
+        return [({'receiver': name}, getattr(s, 'metrics', s)) for name, s in sorted(source.items())]
+    return [({}, getattr(source, 'metrics', source))]
+
+def prometheus(source):
+    """Prometheus text exposition of the metrics of source.
+
+    >>> m = Metrics()
+    >>> m.unhandled = 3
+    >>> m.latency.observe(0.002)
+    >>> print(prometheus({'hall': m}).rstrip())  # doctest: +ELLIPSIS
+    # HELP rfxcom_frames_total Frames read from the device.
+    # TYPE rfxcom_frames_total counter
+    rfxcom_frames_total{receiver="hall"} 3
+    ...
+    # TYPE rfxcom_latency_seconds histogram
+    rfxcom_latency_seconds_bucket{le="0.0005",receiver="hall"} 0
+    ...
+    rfxcom_latency_seconds_bucket{le="+Inf",receiver="hall"} 1
+    rfxcom_latency_seconds_sum{receiver="hall"} 0.002
+    rfxcom_latency_seconds_count{receiver="hall"} 1
+    # HELP rfxcom_reconnect_seconds ...
+    """
+    sources = [(labels, metrics.stats()) for labels, metrics in _sources(source)]
+    lines = []
+    def family(name, type, help):
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s %s' % (name, type))
+
+    for name, help, key in COUNTERS:
+        family(name, 'counter', help)
+        for labels, stats in sources:
+            lines.append('%s%s %d' % (name, _labels(labels), stats[key]))
+    for name, label, key, help in (
+            ('rfxcom_parsed_frames_total', 'parser', 'parsers', 'Frames parsed, by parser.'),
+            ('rfxcom_oregon_frames_total', 'sensor', 'sensors', 'Oregon frames parsed, by sensor.')):
+        family(name, 'counter', help)
+        for labels, stats in sources:
+            for value, count in sorted(stats[key].items()):
+                lines.append('%s%s %d' % (name, _labels(dict(labels, **{label: value})), count))
+
+    for name, help, key in HISTOGRAMS:
+        family(name, 'histogram', help)
+        for labels, stats in sources:
+            histogram = stats[key]
+            for bound, count in histogram['buckets']:
+                lines.append('%s_bucket%s %d' % (name, _labels(dict(labels, le=bound)), count))
+            lines.append('%s_sum%s %r' % (name, _labels(labels), histogram['sum']))
+            lines.append('%s_count%s %d' % (name, _labels(labels), histogram['count']))
+    return '\n'.join(lines) + '\n'
+
+def serve(source, port=9108, host='127.0.0.1'):
+    """Serve source's metrics at http://host:port/metrics from a background thread.
+
+    source is as for prometheus(). Returns the server; call its shutdown()
+    to stop.
+
+    >>> from contextlib import closing
+    >>> try:
+    ...     from urllib.request import urlopen
+    ... except ImportError:
+    ...     from urllib2 import urlopen
+    >>> m = Metrics()
+    >>> m.unhandled = 7
+    >>> server = serve(m, port=0)
+    >>> url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+    >>> with closing(urlopen(url)) as response:
+    ...     print([l for l in response.read().decode().splitlines() if l.startswith('rfxcom_frames')][0])
+    rfxcom_frames_total 7
+    >>> server.shutdown()
+    """
+    try:
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+    except ImportError: # Python 2
+        from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = prometheus(source).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), MetricsHandler)
+    t = threading.Thread(target=server.serve_forever, name='rfxcom-metrics')
+    t.daemon = True
+    t.start()
+    return server
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -2,5 +2,12 @@ from rfxcom.parsers.x10 import X10Parser
 from rfxcom.parsers.homeeasy import HomeEasyParser
 from rfxcom.parsers.oregon import OregonParser
 from rfxcom.parsers.owl import OwlParser
+from rfxcom.parsers.dispatch import ParserRegistry
 
-__all__ = [ 'X10Parser', 'HomeEasyParser', 'OregonParser', 'OwlParser' ]
+__all__ = [ 'X10Parser', 'HomeEasyParser', 'OregonParser', 'OwlParser',
+            'ParserRegistry', 'registry', 'register', 'unregister' ]
+
+# default parsers used by RFXCom
+registry = ParserRegistry([ X10Parser(), HomeEasyParser(), OregonParser(), OwlParser() ])
+register = registry.register
+unregister = registry.unregister
@@ -0,0 +1,106 @@
+class ParserRegistry(object):
+    """Dispatch table from frame bit length to candidate parsers.
+
+    Parsers declare what they accept with class attributes:
+
+    - ``types``: (type, length) pairs, where type is the 16-bit value of the
+      first two packet bytes (as Oregon sensors use)
+    - ``lengths``: bit lengths accepted regardless of content
+    - ``checked``: true if parse() verifies a check on the frame (complement
+      bytes, a checksum), so a frame it accepts is very unlikely to have
+      been misframed. Such frames anchor resynchronisation.
+
+    Parsers declaring neither are tried for every frame, after the indexed
+    candidates. Within a table entry parsers keep their registration order.
+
+    >>> from rfxcom.parsers import X10Parser, HomeEasyParser, OregonParser
+    >>> from rfxcom.parsers.util import _h
+    >>> r = ParserRegistry([X10Parser(), HomeEasyParser(), OregonParser()])
+    >>> [type(p).__name__ for p in r.candidates(34, _h('c7e05dda00'))]
+    ['HomeEasyParser']
+    >>> [type(p).__name__ for p in r.candidates(0x44, _h('ea4c204d4200706319'))]
+    ['OregonParser']
+    >>> r.candidates(0x44, _h('ffff204d4200706319'))
+    ()
+    >>> r.parse(32, _h('649b08f7'))
+    Message('x10', command='on', device='11', group='a', source='a11')
+    >>> r.parse(12, _h('1230'))
+
+    Third party parsers can be registered and removed at runtime:
+
+    >>> class Catchall(object):
+    ...     def parse(self, length, packet):
+    ...         return 'catchall %d' % length
+    >>> c = Catchall()
+    >>> r.register(c)
+    >>> r.parse(12, _h('1230'))
+    'catchall 12'
+    >>> r.unregister(c)
+    >>> r.parse(12, _h('1230'))
+    """
+
+    def __init__(self, parsers=()):
+        self._parsers = []
+        for parser in parsers:
+            self._parsers.append(parser)
+        self._rebuild()
+
+    def register(self, parser):
+        self._parsers.append(parser)
+        self._rebuild()
+
+    def unregister(self, parser):
+        self._parsers.remove(parser)
+        self._rebuild()
+
+    def __iter__(self):
+        return iter(self._parsers)
+
+    def __len__(self):
+        return len(self._parsers)
+
+    def _rebuild(self):
+        by_type = {}
+        by_length = {}
+        fallback = []
+        for order, parser in enumerate(self._parsers):
+            types = getattr(parser, 'types', None)
+            lengths = getattr(parser, 'lengths', None)
+            if types:
+                for type, length in types:
+                    by_type.setdefault((length, type), []).append((order, parser))
+            elif lengths:
+                for length in lengths:
+                    by_length.setdefault(length, []).append((order, parser))
+            else:
+                fallback.append((order, parser))
+
+        def merge(*entries):
+            return tuple(parser for order, parser in sorted(sum(entries, [])))
+
+        self._fallback = merge(fallback)
+        self._by_length = dict((length, merge(entries, fallback))
+                               for length, entries in by_length.items())
+        self._by_type = dict((key, merge(entries, by_length.get(key[0], []), fallback))
+                             for key, entries in by_type.items())
+        self._typed_lengths = frozenset(length for length, type in by_type)
+
+    def candidates(self, length, packet):
+        """Parsers that may accept a frame, in the order to try them."""
+        if length in self._typed_lengths and len(packet) >= 2:
+            parsers = self._by_type.get((length, (packet[0] << 8) + packet[1]))
+            if parsers is not None:
+                return parsers
+        return self._by_length.get(length, self._fallback)
+
+    def parse(self, length, packet):
+        """Parse a frame with the first candidate that accepts it."""
+        for parser in self.candidates(length, packet):
+            message = parser.parse(length, packet)
+            if message:
+                return message
+        return None
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
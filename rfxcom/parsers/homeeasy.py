@@ -1,6 +1,8 @@
-from rfxcom.message import Message
+from rfxcom.message import HomeEasyMessage
 
 class HomeEasyParser(object):
+    lengths = (34, 36)
+
     @staticmethod
     def parse(length, packet):
         """
@@ -25,10 +27,10 @@ class HomeEasyParser(object):
         source = '%s%s' % (address.upper(), (command & 0x2) and 'G' or ('%1X' % (packet[3] & 0xf)))
         if length == 36:
             level = packet[4] >> 4
-            return Message('homeeasy', address=address, device=device, level=level, command='preset', source=source)
+            return HomeEasyMessage(address, device, level, 'preset', source)
         else:
             command = (command & 0x1) and 'on' or 'off'
-            return Message('homeeasy', address=address, device=device, command=command, source=source)
+            return HomeEasyMessage(address, device, None, command, source)
     
     @staticmethod
     def valid(length, packet):
@@ -43,7 +45,55 @@ class HomeEasyParser(object):
         >>> HomeEasyParser.valid(36, _h('c7e05dca70'))
         True
         """
-        return length in (34, 36)
+        return length in HomeEasyParser.lengths
+
+    @staticmethod
+    def encode(message):
+        """(length, packet) of a HomeEasy message, the inverse of parse.
+
+        address is hex, as parse gives it, or an int; device a unit number
+        or 'group'. A preset sets level, 0 to 15.
+
+        >>> from rfxcom.parsers.util import _h
+        >>> from rfxcom.message import HomeEasyMessage
+        >>> HomeEasyParser.encode(HomeEasyMessage('31f8177', '10', command='on')) == (34, bytes(bytearray(_h('c7e05dda00'))))
+        True
+        >>> length, packet = HomeEasyParser.encode(HomeEasyMessage('31f8177', 'group', command='off'))
+        >>> HomeEasyParser.parse(length, bytearray(packet))
+        Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G')
+        >>> length, packet = HomeEasyParser.encode(HomeEasyMessage(0x31f8177, 10, 7, 'preset'))
+        >>> HomeEasyParser.parse(length, bytearray(packet))
+        Message('homeeasy', address='31f8177', command='preset', device='10', level=7, source='31F8177A')
+        >>> HomeEasyParser.encode(HomeEasyMessage('31f8177', '10', 16, 'preset'))
+        Traceback (most recent call last):
+        ...
+        ValueError: HomeEasy level out of range: 16
+        """
+        address = message['address']
+        if isinstance(address, str):
+            address = int(address, 16)
+        if not 0 <= address < 1 << 26:
+            raise ValueError('HomeEasy address out of range: %r' % address)
+        device = message['device']
+        if device == 'group':
+            bits, unit = 0x2, 0
+        else:
+            bits, unit = 0, int(device)
+            if not 0 <= unit < 16:
+                raise ValueError('HomeEasy device out of range: %r' % device)
+        command = message['command']
+        if command == 'on':
+            bits |= 0x1
+        elif command not in ('off', 'preset'):
+            raise ValueError('Unknown HomeEasy command: %r' % command)
+        p = [(address >> 18) & 0xff, (address >> 10) & 0xff, (address >> 2) & 0xff,
+             ((address & 0x3) << 6) | (bits << 4) | unit]
+        if command == 'preset':
+            level = message['level']
+            if not 0 <= level < 16:
+                raise ValueError('HomeEasy level out of range: %r' % level)
+            return 36, bytes(bytearray(p + [level << 4]))
+        return 34, bytes(bytearray(p + [0]))
 
 if __name__ == "__main__":
     import doctest
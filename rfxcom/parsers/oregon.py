@@ -1,189 +1,312 @@
-from rfxcom.message import Message
-from rfxcom.parsers.util import hi_nibble, lo_nibble, nibble_sum, \
-    dec_byte
-
-def checksum1(p):
-    c = hi_nibble(p[6]) + (lo_nibble(p[7])<<4)
-    s = ( ( nibble_sum(6, p) + lo_nibble(p[6]) - 0xa) & 0xff)
-    return s == c
-
-def checksum2(p):
-    return p[8] == ((nibble_sum(8, p) - 0xa) & 0xff)
-    
-def checksum3(p):
-    return p[11] == ((nibble_sum(11, p) - 0xa) & 0xff)
-    
-def checksum4(p):
-    return p[9] == ((nibble_sum(9, p) - 0xa) & 0xff)
-    
-def checksum5(p):
-    return p[10] == ((nibble_sum(10, p) - 0xa) & 0xff)
-    
-def checksum6(p):
-    return (hi_nibble(p[8])+(lo_nibble(p[9])<<4) ==
-      ((nibble_sum(8, p) - 0xa) & 0xff))
-      
-def checksum7(p):
-    return p[7] == ((nibble_sum(7, p) - 0xa) & 0xff)
-    
-def checksum8(p):
-    c = hi_nibble(p[9]) + (lo_nibble(p[10])<<4)
-    s = ( ( nibble_sum(9, p) - 0xa) & 0xff)
-    return s == c
-
-def temperature(p, message):
-    temp = (((p[6]&0x8) and -1 or 1) *
-        (hi_nibble(p[5])*10.0 + lo_nibble(p[5]) +
-         hi_nibble(p[4])/10.0))
-    message['temp'] = temp
-    
-def humidity(p, message):
-    hum = lo_nibble(p[7])*10 + hi_nibble(p[6])
-    message['humidity'] = hum
-    
-def simple_battery(p, message):
-    battery_low = p[4]&0x4
-    bat = battery_low and 10 or 90
-    message['battery'] = bat
-    
-def percentage_battery(p, message):
-    message['battery'] = 100 - 10*lo_nibble(p[4])
-
-def common_temp(part, message, p):
-    message['source'] = message['sensor'] = '%s.%02x' % (part, p[3])
-    temperature(p, message)
-    simple_battery(p, message)
-    
-def common_temphydro(part, message, p):
-    message['source'] = message['sensor'] = '%s.%02x' % (part, p[3])
-    temperature(p, message)
-    humidity(p, message)
-    simple_battery(p, message)
-
-def alt_temphydro(part, message, p):
-    message['source'] = message['sensor'] = '%s.%02x' % (part, p[3])
-    temperature(p, message)
-    humidity(p, message)
-    percentage_battery(p, message)
-
-WIND_DIRECTIONS = [ "N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NWN" ]
-def wtgr800_anemometer(part, message, p):
-    dirno = hi_nibble(p[4])
-    speed = lo_nibble(p[7]) * 10 + hi_nibble(p[6]) + lo_nibble(p[6]) / 10.0
-    avgspeed = hi_nibble(p[8]) * 10 + lo_nibble(p[8]) + hi_nibble(p[7]) / 10.0
-    message['source'] = message['sensor'] = part
-    message['dir'] = dirno
-    message['speed'] = speed
-    message['avgspeed'] = avgspeed
-
-def pcr800_rain(part, message, p):
-    message['source'] = message['sensor'] = '%s.%02x' % (part, p[3])
-    rain = (lo_nibble(p[6])*10 +
-        hi_nibble(p[5]) + lo_nibble(p[5])/10.0 +
-        hi_nibble(p[4])/100.0)
-    rain *= 25.4 # convert from inch/hr to mm/hr
-    
-    train = (lo_nibble(p[9])*100 +
-      dec_byte(p, 8) + dec_byte(p, 7)/100.0 +
-        hi_nibble(p[6])/1000.0)
-    train *= 25.4 # convert from inch/hr to mm/hr
-    
-    message['speed'] = rain
-    message['total'] = train
-    simple_battery(p, message)
-  
+"""Oregon Scientific sensors.
+
+Each sensor is declared by where its fields and checksum lie, in nibble
+positions: byte n holds nibbles 2n (low) and 2n+1 (high), in the order
+they are transmitted. At import each declaration is compiled into a
+straight-line decoder for that sensor, with checksums summed through a
+lookup table of per-byte nibble sums. rfxcom.batch compiles the same
+declarations into decoders over columns of many packets.
+"""
+
+from rfxcom.message import TOPICS
+
+# sum of both nibbles of each byte value
+NIBBLE_SUM = tuple((b >> 4) + (b & 0xf) for b in range(256))
+
+WIND_DIRECTIONS = [ "N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW" ]
+FORECASTS = ['unknown'] * 16
+FORECASTS[0xc] = 'sunny'
+FORECASTS[0x6] = 'partly'
+FORECASTS[0x2] = 'cloudy'
+FORECASTS[0x3] = 'rain'
+UV_RISK = ['low'] * 3 + ['medium'] * 3 + ['high'] * 2 + ['very high'] * 3 + ['dangerous'] * 89
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+class Expr(str):
+    """Field expression, with a form that works on columns of packets.
+
+    In the column form p[n] is an array of byte n of every packet, so
+    conditionals are written with where().
+    """
+
+    def __new__(cls, expr, columns=None):
+        self = str.__new__(cls, expr)
+        self.columns = expr if columns is None else columns
+        return self
+
+def columns(expr):
+    """Column form of an expression."""
+    return getattr(expr, 'columns', expr)
+
+def nibble(i):
+    """Expression for the nibble at position i of packet p.
+
+    >>> nibble(8), nibble(9)
+    ('(p[4] & 0xf)', '(p[4] >> 4)')
+    """
+    if i % 2:
+        return '(p[%d] >> 4)' % (i // 2)
+    return '(p[%d] & 0xf)' % (i // 2)
+
+def bcd(digits, places=0, sign=None, scale=None):
+    """Decimal value of the nibbles at digits, most significant first.
+
+    places moves the decimal point left, sign is a (nibble, mask) that makes
+    the value negative when set, and scale multiplies the result.
+
+    >>> e = bcd((11, 10, 9), places=1, sign=(12, 0x8))
+    >>> e
+    '(-1 if (p[6] & 0xf) & 0x8 else 1) * ((p[5] >> 4) * 100 + (p[5] & 0xf) * 10 + (p[4] >> 4)) / 10.0'
+    >>> columns(e)
+    'where((p[6] & 0xf) & 0x8, -1, 1) * ((p[5] >> 4) * 100 + (p[5] & 0xf) * 10 + (p[4] >> 4)) / 10.0'
+    """
+    terms = ['%s * %d' % (nibble(d), 10 ** k) for k, d in enumerate(reversed(digits)) if k]
+    terms.reverse()
+    terms.append(nibble(digits[-1]))
+    expr = ' + '.join(terms)
+    if len(digits) > 1:
+        expr = '(%s)' % expr
+    if places:
+        expr = '%s / %r' % (expr, 10.0 ** places)
+    if scale:
+        expr = '%s * %r' % (expr, scale)
+    if sign:
+        test = '%s & 0x%x' % (nibble(sign[0]), sign[1])
+        return Expr('(-1 if %s else 1) * %s' % (test, expr),
+                    'where(%s, -1, 1) * %s' % (test, expr))
+    return expr
+
+def flag(i, mask, set, clear):
+    test = '%s & 0x%x' % (nibble(i), mask)
+    return Expr('(%r if %s else %r)' % (set, test, clear),
+                'where(%s, %r, %r)' % (test, set, clear))
+
+def table(name, expr, size=None):
+    """Entry of table name at expr; with size, indexes past the end give the last entry."""
+    if size is None:
+        return Expr('%s[%s]' % (name, expr), '%s[%s]' % (name, columns(expr)))
+    return Expr('%s[min(%s, %d)]' % (name, expr, size - 1),
+                '%s[minimum(%s, %d)]' % (name, columns(expr), size - 1))
+
+def text(format, digits):
+    """String of the nibbles at digits, formatted."""
+    nibbles = ', '.join(nibble(d) for d in digits)
+    return Expr('%r %% (%s)' % (format, nibbles),
+                'format_columns(%r, %s)' % (format, nibbles))
+
+def byte(n, offset=0):
+    return '(p[%d] + %d)' % (n, offset)
+
+def percent_battery(i):
+    return '100 - 10 * %s' % nibble(i)
+
+def simple_battery(i):
+    return flag(i, 0x4, 10, 90)
+
+# common field layouts
+TEMP = [('temp', bcd((11, 10, 9), places=1, sign=(12, 0x8)))]
+HUMIDITY = [('humidity', bcd((14, 13)))]
+BATTERY = [('battery', simple_battery(8))]
+PERCENT_BATTERY = [('battery', percent_battery(8))]
+DATETIME = [
+    ('time', text('%d%d%d%d%d%d', (14, 13, 12, 11, 10, 9))), # hhmmss
+    ('date', text('20%d%d%02d%d%d', (20, 19, 17, 16, 15))), # yyyymmdd
+    ('day', table('DAYS', '(p[9] & 0x7) - 1')),
+]
+
+class Checksum(object):
+    """Checksum over the nibbles before end, stored at nibble pos.
+
+    The sum of nibbles [0, end), less 0xa, is held in the two nibbles from
+    pos, low nibble first.
+
+    >>> from rfxcom.parsers.util import _h
+    >>> Checksum(16, 16).expression()
+    '((T[p[0]] + T[p[1]] + T[p[2]] + T[p[3]] + T[p[4]] + T[p[5]] + T[p[6]] + T[p[7]] - 0xa) & 0xff) == p[8]'
+    >>> p = _h('ea4c204d4200706319')
+    >>> c = Checksum(13, 13)
+    >>> c.check(p)
+    True
+    >>> p[6] ^= 0x10; c.check(p)
+    False
+    >>> c.seal(p); c.check(p)
+    True
+    """
+
+    def __init__(self, end, pos):
+        self.end = end
+        self.pos = pos
+
+    def expression(self):
+        total = ' + '.join('T[p[%d]]' % n for n in range(self.end // 2))
+        if self.end % 2:
+            total += ' + %s' % nibble(self.end - 1)
+        if self.pos % 2:
+            stored = '(%s + (%s << 4))' % (nibble(self.pos), nibble(self.pos + 1))
+        else:
+            stored = 'p[%d]' % (self.pos // 2)
+        return '((%s - 0xa) & 0xff) == %s' % (total, stored)
+
+    def _sum(self, p):
+        s = sum(NIBBLE_SUM[b] for b in p[:self.end // 2])
+        if self.end % 2:
+            s += p[self.end // 2] & 0xf
+        return (s - 0xa) & 0xff
+
+    def check(self, p):
+        n = self.pos // 2
+        if self.pos % 2:
+            stored = (p[n] >> 4) + ((p[n+1] & 0xf) << 4)
+        else:
+            stored = p[n]
+        return self._sum(p) == stored
+
+    def seal(self, p):
+        """Set the checksum of a mutable packet."""
+        n = self.pos // 2
+        s = self._sum(p)
+        if self.pos % 2:
+            p[n] = (p[n] & 0xf) | ((s & 0xf) << 4)
+            p[n+1] = (p[n+1] & 0xf0) | (s >> 4)
+        else:
+            p[n] = s
+
+class Sensor(object):
+    """Declaration of an Oregon sensor, compiled to a decoder.
+
+    source is 'rolling' for sources named by part and rolling code (byte 3),
+    or 'part' for the part alone.
+
+    >>> from rfxcom.parsers.util import _h
+    >>> s = Sensor(0xfa28, 80, 'THGR810', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY)
+    >>> s.decode(_h('fa282462320290053c64'))
+    Message('temp', battery=90, humidity=59, sensor='thgr810.62', source='thgr810.62', temp=2.3)
+    >>> s.decode(_h('fa282462320290053d64'))
+    False
+    >>> print(s.code)
+    def decode(p):
+        if not (((T[p[0]] + T[p[1]] + T[p[2]] + T[p[3]] + T[p[4]] + T[p[5]] + T[p[6]] + T[p[7]] - 0xa) & 0xff) == p[8]):
+            return False
+        source = SOURCES[p[3]]
+        return Record(source=source, sensor=source,
+            temp=(-1 if (p[6] & 0xf) & 0x8 else 1) * ((p[5] >> 4) * 100 + (p[5] & 0xf) * 10 + (p[4] >> 4)) / 10.0,
+            humidity=((p[7] & 0xf) * 10 + (p[6] >> 4)),
+            battery=(10 if (p[4] & 0xf) & 0x4 else 90))
+    """
+
+    def __init__(self, type, length, part, topic, checksum, fields, source='rolling', mask=0xffff):
+        self.type = type
+        self.length = length
+        self.part = part
+        self.topic = topic
+        self.checksum = checksum
+        self.fields = fields
+        self.source = source
+        self.mask = mask
+        self.decode = self._compile()
+
+    def keys(self):
+        """(type, length) keys this sensor is sent with."""
+        free = 0xffff & ~self.mask
+        keys = []
+        v = free
+        while True:
+            # every combination of the bits outside the mask
+            keys.append((self.type | v, self.length))
+            if not v:
+                return keys
+            v = (v - 1) & free
+
+    def _compile(self):
+        name = self.part.lower()
+        lines = ['def decode(p):',
+                 '    if not (%s):' % self.checksum.expression(),
+                 '        return False']
+        if self.source == 'rolling':
+            lines.append('    source = SOURCES[p[3]]')
+        else:
+            lines.append('    source = %r' % name)
+        args = ['source=source, sensor=source']
+        args += ['%s=%s' % (field, expr) for field, expr in self.fields]
+        lines.append('    return Record(%s)' % ',\n        '.join(args))
+        self.code = '\n'.join(lines)
+
+        namespace = {
+            'T': NIBBLE_SUM,
+            'Record': TOPICS[self.topic],
+            'SOURCES': tuple('%s.%02x' % (name, b) for b in range(256)),
+            'WIND_DIRECTIONS': WIND_DIRECTIONS,
+            'FORECASTS': FORECASTS,
+            'UV_RISK': UV_RISK,
+            'DAYS': DAYS,
+        }
+        exec(compile(self.code, '<oregon %s>' % self.part, 'exec'), namespace)
+        return namespace['decode']
+
+SENSORS = [
+    Sensor(0xfa28, 80, 'THGR810', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY),
+    Sensor(0xfab8, 80, 'WTGR800', 'temp', Checksum(16, 16), TEMP + HUMIDITY + PERCENT_BATTERY),
+    Sensor(0x1a99, 88, 'WTGR800', 'wind', Checksum(18, 18), [
+        ('dir', table('WIND_DIRECTIONS', nibble(9))),
+        ('speed', bcd((14, 13, 12), places=1)),
+        ('avgspeed', bcd((17, 16, 15), places=1)),
+    ], source='part'),
+    Sensor(0x1a89, 88, 'WGR800', 'wind', Checksum(18, 18), [
+        ('dir', table('WIND_DIRECTIONS', nibble(9))),
+        ('speed', bcd((14, 13, 12), places=1)),
+        ('avgspeed', bcd((17, 16, 15), places=1)),
+    ], source='part'),
+    Sensor(0xda78, 72, 'UVN800', 'uv', Checksum(14, 14), [
+        ('uv', bcd((12, 11))),
+        ('risk', table('UV_RISK', bcd((12, 11)), len(UV_RISK))),
+    ] + PERCENT_BATTERY),
+    Sensor(0xea7c, 120, 'UV138', 'uv', Checksum(13, 13), [
+        ('uv', bcd((10, 9))),
+        ('risk', table('UV_RISK', bcd((10, 9)), len(UV_RISK))),
+    ] + BATTERY),
+    Sensor(0xea4c, 80, 'THWR288A', 'temp', Checksum(13, 13), TEMP + BATTERY),
+    Sensor(0xea4c, 68, 'THN132N', 'temp', Checksum(13, 13), TEMP + BATTERY),
+    Sensor(0x9aec, 104, 'RTGR328N', 'datetime', Checksum(22, 22), DATETIME),
+    Sensor(0x9aea, 104, 'RTGR328N', 'datetime', Checksum(22, 22), DATETIME),
+    Sensor(0x1a2d, 80, 'THGR228N', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY),
+    Sensor(0x1a3d, 80, 'THGR918', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY),
+    Sensor(0x5a5d, 88, 'BTHR918', 'temp', Checksum(20, 20), TEMP + HUMIDITY + [
+        ('baro', byte(8, 856)),
+        ('forecast', table('FORECASTS', nibble(19))),
+    ] + BATTERY),
+    Sensor(0x5a6d, 96, 'BTHR918N', 'temp', Checksum(20, 20), TEMP + HUMIDITY + [
+        ('baro', byte(8, 795)),
+        ('forecast', table('FORECASTS', nibble(19))),
+    ] + PERCENT_BATTERY),
+    Sensor(0x3a0d, 80, 'WGR918', 'wind', Checksum(18, 18), [
+        ('dir', bcd((11, 10, 9))),
+        ('speed', bcd((14, 13, 12), places=1)),
+        ('avgspeed', bcd((17, 16, 15), places=1)),
+    ] + PERCENT_BATTERY),
+    Sensor(0x3a0d, 88, 'WGR918', 'wind', Checksum(18, 18), [
+        ('dir', bcd((11, 10, 9))),
+        ('speed', bcd((14, 13, 12), places=1)),
+        ('avgspeed', bcd((17, 16, 15), places=1)),
+    ] + PERCENT_BATTERY),
+    Sensor(0x2a1d, 84, 'RGR918', 'rain', Checksum(16, 17), [
+        ('speed', bcd((11, 10, 9))),
+        ('total', bcd((16, 15, 14, 13))),
+    ] + BATTERY),
+    Sensor(0x0a4d, 80, 'THR128', 'temp', Checksum(16, 16), TEMP + BATTERY),
+    Sensor(0xca2c, 80, 'THGR328N', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY),
+    Sensor(0xca2c, 120, 'THGR328N', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY),
+    # channel in the top nibble of the type
+    Sensor(0x0acc, 80, 'RTGR328N', 'temp', Checksum(16, 16), TEMP + HUMIDITY + BATTERY, mask=0x0fff),
+    Sensor(0x2a19, 92, 'PCR800', 'rain', Checksum(18, 19), [
+        ('speed', bcd((12, 11, 10, 9), places=2, scale=25.4)), # inch/hr to mm/hr
+        ('total', bcd((18, 17, 16, 15, 14, 13), places=3, scale=25.4)), # inch to mm
+    ] + BATTERY),
+]
+
 class OregonParser(object):
-    messages = {
-        (0xfa28, 80):
-        {
-            'part': 'THGR810', 'topic': 'temp', 'checksum': checksum2, 'method': common_temphydro,
-        },
-        (0xfab8, 80):
-        {
-            'part': 'WTGR800', 'topic': 'temp', 'checksum': checksum2, 'method': alt_temphydro,
-        },
-        (0x1a99, 88):
-        {
-            'part': 'WTGR800', 'topic': 'wind', 'checksum': checksum4, 'method': wtgr800_anemometer,
-        },
-        #(0x1a89, 88):
-        #{
-        #    'part': 'WGR800', 'checksum': checksum4, 'method': wtgr800_anemometer,
-        #},
-        #(0xda78, 72):
-        #{
-        #    'part': 'UVN800', 'checksum': checksum7, 'method': uvn800,
-        #},
-        #(0xea7c, 120):
-        #{
-        #    'part': 'UV138', 'checksum': checksum1, 'method': uv138,
-        #},
-        (0xea4c, 80):
-        {
-            'part': 'THWR288A', 'topic': 'temp', 'checksum': checksum1, 'method': common_temp,
-        },
-        (0xea4c, 68):
-        {
-            'part': 'THN132N', 'topic': 'temp', 'checksum': checksum1, 'method': common_temp,
-        },
-        #(0x9aec, 104):
-        #{
-        #    'part': 'RTGR328N', 'checksum': checksum3, 'method': rtgr328n_datetime,
-        #},
-        #(0x9aea, 104):
-        #{
-        #    'part': 'RTGR328N', 'checksum': checksum3, 'method': rtgr328n_datetime,
-        #},
-        #(0x1a2d, 80):
-        #{
-        #    'part': 'THGR228N', 'checksum': checksum2, 'method': common_temphydro,
-        #},
-        #(0x1a3d, 80):
-        #{
-        #    'part': 'THGR918', 'checksum': checksum2, 'method': common_temphydro,
-        #},
-        #(0x5a5d, 88):
-        #{
-        #    'part': 'BTHR918', 'checksum': checksum5, 'method': common_temphydrobaro,
-        #},
-        #(0x5a6d, 96):
-        #{
-        #    'part': 'BTHR918N', 'checksum': checksum5, 'method': alt_temphydrobaro,
-        #},
-        #(0x3a0d, 80):
-        #{
-        #    'part': 'WGR918', 'checksum': checksum4, 'method': wgr918_anemometer,
-        #},
-        #(0x3a0d, 88):
-        #{
-        #    'part': 'WGR918', 'checksum': checksum4, 'method': wgr918_anemometer,
-        #},
-        #(0x2a1d, 84):
-        #{
-        #    'part': 'RGR918', 'checksum': checksum6, 'method': common_rain,
-        #},
-        #(0x0a4d, 80):
-        #{
-        #    'part': 'THR128', 'checksum': checksum2, 'method': common_temp,
-        #},
-        #(0xca2c, 80):
-        #{
-        #    'part': 'THGR328N', 'checksum': checksum2, 'method': common_temphydro,
-        #},
-        #(0xca2c, 120):
-        #{
-        #    'part': 'THGR328N', 'checksum': checksum2, 'method': common_temphydro,
-        #},
-        ## masked
-        #(0x0acc, 80):
-        #{
-        #    'part': 'RTGR328N', 'checksum': checksum2, 'method': common_temphydro,
-        #},
-        (0x2a19, 92):
-        {
-            'part': 'PCR800', 'topic': 'rain', 'checksum': checksum8, 'method': pcr800_rain,
-        },
-    }
+    messages = dict((key, sensor) for sensor in SENSORS for key in sensor.keys())
+    types = frozenset(messages)
+    checked = True
 
     @staticmethod
     def parse(length, packet):
@@ -205,17 +328,29 @@ class OregonParser(object):
         Message('rain', battery=90, sensor='pcr800.6f', source='pcr800.6f', speed=0, total=1088)
         >>> OregonParser.parse(0x5c, _h('2a19043f300080220120230a'))
         Message('rain', battery=90, sensor='pcr800.3f', source='pcr800.3f', speed=0.762, total=31.19)
+        >>> OregonParser.parse(0x60, _h('5a6d103b50215004dfc06000'))
+        Message('temp', baro=1018, battery=100, forecast='sunny', humidity=45, sensor='bthr918n.3b', source='bthr918n.3b', temp=21.5)
+        >>> OregonParser.parse(0x48, _h('da78103b0170003300'))
+        Message('uv', battery=90, risk='high', sensor='uvn800.3b', source='uvn800.3b', uv=7)
+        >>> OregonParser.parse(0x48, _h('da78103b01f00f4a00'))['risk'] # not BCD
+        'dangerous'
+        >>> OregonParser.parse(0x68, _h('9aec103b90503481a167026a00'))
+        Message('datetime', date='20261018', day='Sunday', sensor='rtgr328n.3b', source='rtgr328n.3b', time='134509')
+        >>> OregonParser.parse(0x58, _h('3a0d103b50223410023200'))
+        Message('wind', avgspeed=2.1, battery=100, dir=225, sensor='wgr918.3b', source='wgr918.3b', speed=3.4)
+
+        RTGR328N sends its channel in the top nibble of the type:
+
+        >>> OregonParser.parse(0x50, _h('3acc103b502158044300'))
+        Message('temp', battery=90, humidity=45, sensor='rtgr328n.3b', source='rtgr328n.3b', temp=-21.5)
         """
-        if not OregonParser.valid(length, packet):
+        if length < 2:
+            return False
+        sensor = OregonParser.messages.get(((packet[0] << 8) + packet[1], length))
+        if not sensor:
             return False
+        return sensor.decode(packet)
 
-        type = (packet[0] << 8) + packet[1]
-        m = OregonParser.messages[(type, length)]
-        msg = Message(m['topic'])
-        m['method'](m['part'].lower(), msg, packet)
-        
-        return msg
-    
     @staticmethod
     def valid(length, packet):
         """
@@ -235,11 +370,10 @@ class OregonParser(object):
         """
         if length < 2:
             return False
-        type = (packet[0] << 8) + packet[1]
-        rec = OregonParser.messages.get((type, length))
-        if not rec:
+        sensor = OregonParser.messages.get(((packet[0] << 8) + packet[1], length))
+        if not sensor:
             return False
-        return rec['checksum'](packet)
+        return sensor.checksum.check(packet)
 
 if __name__ == "__main__":
     import doctest
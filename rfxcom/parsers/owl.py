@@ -1,7 +1,9 @@
-from rfxcom.message import Message
+from rfxcom.message import OwlMessage
 from rfxcom.parsers.util import *
 
 class OwlParser(object):
+    lengths = (120,)
+    checked = True
     bytes_to_groups = 'mnopcdabefghklij'
     units_to_bytes = '\x00\x10\x08\x18\x40\x50\x48\x58'
     bytes_to_units = dict( (ord(n), i) for i, n in enumerate(units_to_bytes) )
@@ -33,7 +35,7 @@ class OwlParser(object):
         current2 = (((p[4]&0xfc)>>2) + ((p[5]&0xf)<<6))/10.0
         current3 = (((p[5]&0xf0)>>4) + ((p[6]&0x3f)<<4))/10.0
         
-        return Message('owl', current1=current1, current2=current2, current3=current3, source=device)
+        return OwlMessage(current1, current2, current3, device)
     
     @staticmethod
     def valid(length, packet):
@@ -1,5 +1,7 @@
+import binascii
+
 def _h(x):
-    return [ ord(y) for y in x.decode('hex') ]
+    return list(bytearray(binascii.unhexlify(x)))
 
 def hi_nibble(x):
     return x >> 4
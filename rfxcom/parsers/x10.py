@@ -1,6 +1,8 @@
-from rfxcom.message import Message
+from rfxcom.message import X10Message
 
 class X10Parser(object):
+    lengths = (32,)
+    checked = True
     bytes_to_groups = 'mnopcdabefghklij'
     units_to_bytes = '\x00\x10\x08\x18\x40\x50\x48\x58'
     bytes_to_units = dict( (ord(n), i) for i, n in enumerate(units_to_bytes) )
@@ -10,6 +12,8 @@ class X10Parser(object):
                         0x80: 'all_lights_off',
                         0x00: 'on',
                         0x20: 'off'}
+    units_to_bytes_int = [ord(n) for n in units_to_bytes]
+    command_to_bytes = dict((v, k) for k, v in bytes_to_command.items())
     
     @staticmethod
     def parse(length, packet):
@@ -44,7 +48,7 @@ class X10Parser(object):
         command = X10Parser.bytes_to_command[ packet[2] & mask ]
         source = '%s%s' % (group, device)
 
-        return Message('x10', group=group, device=device, command=command, source=source)
+        return X10Message(group, device, command, source)
     
     @staticmethod
     def valid(length, packet):
@@ -61,6 +65,46 @@ class X10Parser(object):
         """
         return (length == 32 and packet[0]^packet[1] == 0xff and packet[2]^packet[3] == 0xff)
 
+    @staticmethod
+    def encode(message):
+        """(length, packet) of an X10 message, the inverse of parse.
+
+        >>> from rfxcom.parsers.util import _h
+        >>> from rfxcom.message import X10Message
+        >>> X10Parser.encode(X10Message('a', '11', 'on')) == (32, bytes(bytearray(_h('649b08f7'))))
+        True
+        >>> length, packet = X10Parser.encode(X10Message('i', '05', 'off'))
+        >>> X10Parser.parse(length, bytearray(packet))
+        Message('x10', command='off', device='05', group='i', source='i05')
+        >>> length, packet = X10Parser.encode(X10Message('c', 0, 'dim'))
+        >>> X10Parser.parse(length, bytearray(packet))
+        Message('x10', command='dim', device=0, group='c', source='c0')
+        >>> X10Parser.encode(X10Message('a', '17', 'on'))
+        Traceback (most recent call last):
+        ...
+        ValueError: X10 device out of range: '17'
+        """
+        group = message['group']
+        command = message['command']
+        if len(group) != 1 or group not in X10Parser.bytes_to_groups:
+            raise ValueError('Unknown X10 group: %r' % group)
+        p0 = X10Parser.bytes_to_groups.index(group) << 4
+        if command in ('on', 'off'):
+            device = message['device']
+            unit = int(device) - 1
+            if not 0 <= unit < 16:
+                raise ValueError('X10 device out of range: %r' % device)
+            if unit >= 8:
+                p0 |= 0x4
+            p2 = X10Parser.units_to_bytes_int[unit % 8]
+            if command == 'off':
+                p2 |= 0x20
+        else:
+            p2 = X10Parser.command_to_bytes.get(command)
+            if p2 is None:
+                raise ValueError('Unknown X10 command: %r' % command)
+        return 32, bytes(bytearray([p0, p0 ^ 0xff, p2, p2 ^ 0xff]))
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -0,0 +1,246 @@
+"""Decoding archives of captures again, in parallel.
+
+Captures (see rfxcom.capture) are split into chunks of whole records,
+decoded across a pool of processes with the registered parsers, merged
+back into time order and deduplicated as RFXCom.decode does, with the
+time each frame was received. Output is written as it is decoded, in CSV,
+InfluxDB line protocol or JSON lines (see rfxcom.sinks), so archives of
+any size can be reprocessed. Run with::
+
+    python -m rfxcom.reprocess traffic-*.rfx -o messages.csv
+"""
+
+import sys
+import time
+import heapq
+import logging
+import argparse
+from itertools import chain
+from collections import deque
+
+from rfxcom.capture import CaptureReader, HEADER, RECORD
+from rfxcom.dedup import Deduplicator
+from rfxcom.framing import frame_size, view
+from rfxcom.parsers import registry
+from rfxcom.sinks import CSVSink, LineProtocolSink, JSONSink
+
+FORMATS = {
+    'csv': CSVSink.format,
+    'line': LineProtocolSink.format,
+    'json': JSONSink.format,
+}
+
+# bytes of records per chunk, and read at a time while splitting
+CHUNK = 1 << 20
+BLOCK = 1 << 16
+
+def split(path, size=CHUNK):
+    """Split a capture into (path, start, begin, end) chunks of whole records.
+
+    begin and end are file offsets, and start the capture's start time.
+    Chunks hold at least size bytes, bar the last; a truncated record at
+    the end is left out, as CaptureReader does.
+
+    >>> import os, tempfile
+    >>> from rfxcom.capture import CaptureWriter
+    >>> from rfxcom.generators import frames
+    >>> path = os.path.join(tempfile.mkdtemp(), 'traffic.rfx')
+    >>> w = CaptureWriter(path, start=1000.0)
+    >>> for i, frame in enumerate(frames(100, seed=1)):
+    ...     w.write(*frame, offset=i)
+    >>> w.close()
+    >>> chunks = list(split(path, 500))
+    >>> len(chunks), chunks[0][1:3], chunks[-1][3] == os.path.getsize(path)
+    (4, (1000.0, 13), True)
+    >>> all(a[3] == b[2] for a, b in zip(chunks, chunks[1:]))
+    True
+    """
+    with open(path, 'rb') as f:
+        start = CaptureReader(f).start
+        # buf holds the file from base; end is the first record not walked past
+        base = begin = end = HEADER.size
+        buf = bytearray()
+        while True:
+            data = f.read(BLOCK)
+            if not data:
+                break
+            buf = buf[end - base:] + data
+            base = end
+            i = 0
+            n = len(buf)
+            while i + RECORD.size <= n:
+                following = i + RECORD.size + frame_size(buf[i + RECORD.size - 1])
+                if following > n:
+                    break
+                i = following
+                if base + i - begin >= size:
+                    yield path, start, begin, base + i
+                    begin = base + i
+            end = base + i
+    if end > begin:
+        yield path, start, begin, end
+
+def decode(chunk, format='csv', index=0):
+    """Decode a chunk, returning its number of frames and a row per message.
+
+    Rows are (time, index, message, line), index telling captures apart
+    where times tie when merging. Run in the worker processes, so lines
+    are formatted there too.
+    """
+    path, start, begin, end = chunk
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        data = bytearray(f.read(end - begin))
+    frames = view(data)
+    fmt = FORMATS[format]
+    parse = registry.parse
+    unpack = RECORD.unpack_from
+    rows = []
+    count = pos = 0
+    n = len(data)
+    while pos < n:
+        count += 1
+        offset, length = unpack(data, pos)
+        pos += RECORD.size
+        following = pos + frame_size(length)
+        message = parse(length, frames[pos:following])
+        pos = following
+        if message:
+            t = start + offset
+            rows.append((t, index, message, fmt(t, message)))
+    return count, rows
+
+def _decode(args):
+    return decode(*args)
+
+class Reprocessor(object):
+    """Decodes captures in parallel into a stream of lines.
+
+    jobs processes decode chunks (jobs=1 decodes in this process). At most
+    ahead chunks per capture are decoded ahead of the output, bounding
+    memory. Captures are merged by time: each must be in time order, as
+    recorded, but they may overlap, such as captures from several
+    receivers. A message is dropped as a duplicate if seen within dedup
+    seconds, as RFXCom does; dedup=0 keeps them all.
+
+    >>> import io, os, tempfile
+    >>> from rfxcom.capture import CaptureWriter
+    >>> from rfxcom.generators import x10_frame
+    >>> d = tempfile.mkdtemp()
+    >>> def capture(name, start, frames):
+    ...     w = CaptureWriter(os.path.join(d, name), start=start)
+    ...     for offset, frame in frames:
+    ...         w.write(*frame, offset=offset)
+    ...     w.close()
+    ...     return os.path.join(d, name)
+    >>> hall = capture('hall.rfx', 1000.0, [(0.5, x10_frame('a', 1, 'on')),
+    ...                                     (5.0, x10_frame('a', 1, 'off'))])
+    >>> garage = capture('garage.rfx', 1001.0, [(0.0, x10_frame('b', 2, 'on')),
+    ...                                         (0.1, (12, b'\\x12\\x30'))])
+    >>> out = io.BytesIO()
+    >>> r = Reprocessor(jobs=2, chunk=16)
+    >>> r.run([hall, garage, hall], out)
+    >>> print(out.getvalue().decode('utf-8').strip())
+    1000.5,x10,command=on,device=01,group=a,source=a01
+    1001.0,x10,command=on,device=02,group=b,source=b02
+    1005.0,x10,command=off,device=01,group=a,source=a01
+    >>> r.frames, r.messages, r.duplicates
+    (6, 3, 2)
+    """
+
+    def __init__(self, format='csv', jobs=None, chunk=CHUNK, dedup=2.5, ahead=4):
+        if format not in FORMATS:
+            raise ValueError('Unknown format: %r' % format)
+        self.format = format
+        self.jobs = jobs
+        self.chunk = chunk
+        self.dedup = Deduplicator(dedup) if dedup else None
+        self.ahead = ahead
+        self.frames = 0
+        self.messages = 0
+        self.duplicates = 0
+        self.logger = logging.getLogger('rfxcom')
+
+    def _decoded(self, pool, index, path):
+        """Lists of rows from a capture, in order (see decode)."""
+        pending = deque()
+        chunks = split(path, self.chunk)
+        while True:
+            while len(pending) < self.ahead:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                args = (chunk, self.format, index)
+                if pool is None:
+                    pending.append(_decode(args))
+                else:
+                    pending.append(pool.apply_async(_decode, (args,)))
+            if not pending:
+                return
+            result = pending.popleft()
+            if pool is not None:
+                result = result.get()
+            frames, rows = result
+            self.frames += frames
+            yield rows
+
+    def run(self, paths, out):
+        """Decode captures, writing lines to the binary file out."""
+        pool = None
+        if self.jobs != 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(self.jobs)
+        try:
+            streams = [chain.from_iterable(self._decoded(pool, i, path))
+                       for i, path in enumerate(paths)]
+            if len(streams) == 1:
+                self._write(streams[0], out)
+            else:
+                self._write(heapq.merge(*streams), out)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def _write(self, decoded, out):
+        dedup = self.dedup
+        lines = []
+        for t, index, message, line in decoded:
+            if dedup is not None and dedup.seen(message, t):
+                self.duplicates += 1
+                continue
+            self.messages += 1
+            lines.append(line)
+            if len(lines) >= 1000:
+                out.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                lines = []
+        if lines:
+            out.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m rfxcom.reprocess',
+        description='Decode captures again, in parallel, into one time ordered stream.')
+    parser.add_argument('captures', nargs='+', help='capture files, each in time order')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: stdout)')
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='decoding processes (default: one per core)')
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='bytes per chunk')
+    parser.add_argument('--dedup', type=float, default=2.5,
+                        help='seconds a repeat is suppressed for, 0 for none (default: 2.5)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    r = Reprocessor(args.format, jobs=args.jobs, chunk=args.chunk, dedup=args.dedup)
+    started = time.time()
+    if args.output == '-':
+        r.run(args.captures, getattr(sys.stdout, 'buffer', sys.stdout))
+    else:
+        with open(args.output, 'wb') as out:
+            r.run(args.captures, out)
+    r.logger.info('Decoded %d frames into %d messages (%d duplicates) in %.1fs',
+                  r.frames, r.messages, r.duplicates, time.time() - started)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Delivering messages to subscribers by topic and source."""
+
+import re
+import fnmatch
+import logging
+import threading
+
+# characters special to fnmatch
+GLOB = re.compile(r'[*?[]')
+
+class Subscription(object):
+    """A callback, and the topic and source pattern it was subscribed for."""
+
+    __slots__ = ('callback', 'topic', 'source', 'order')
+
+    def __init__(self, callback, topic, source, order):
+        self.callback = callback
+        self.topic = topic
+        self.source = source
+        self.order = order
+
+    def __repr__(self):
+        return 'Subscription(%r, topic=%r, source=%r)' % (self.callback, self.topic, self.source)
+
+class _Node(object):
+    """Trie node: subscriptions for the prefix spelled out to it, and
+    globs with that literal prefix, checked against the whole source."""
+
+    __slots__ = ('children', 'prefixes', 'globs')
+
+    def __init__(self):
+        self.children = {}
+        self.prefixes = []
+        self.globs = []
+
+class _Index(object):
+    """Subscriptions for one topic: to any source, by exact source, and a
+    trie of source prefixes."""
+
+    __slots__ = ('any', 'exact', 'trie')
+
+    def __init__(self):
+        self.any = []
+        self.exact = {}
+        self.trie = _Node()
+
+    def add(self, subscription):
+        pattern = subscription.source
+        if pattern is None:
+            self.any.append(subscription)
+            return
+        literal = GLOB.split(pattern, 1)[0]
+        if literal == pattern:
+            self.exact.setdefault(pattern, []).append(subscription)
+            return
+        node = self.trie
+        for c in literal:
+            node = node.children.setdefault(c, _Node())
+        if pattern == literal + '*':
+            node.prefixes.append(subscription)
+        else:
+            node.globs.append((re.compile(fnmatch.translate(pattern)).match, subscription))
+
+    def match(self, source, found):
+        found.extend(self.any)
+        if source is None:
+            return
+        found.extend(self.exact.get(source, ()))
+        node = self.trie
+        i = 0
+        while True:
+            found.extend(node.prefixes)
+            for match, subscription in node.globs:
+                if match(source):
+                    found.append(subscription)
+            if i == len(source):
+                return
+            node = node.children.get(source[i])
+            if node is None:
+                return
+            i += 1
+
+class Router(object):
+    """Calls the subscribers to each message's topic and source.
+
+    A Router is an on_message callable, like WorkerPool. Subscribers give
+    a topic, or None for any, and a source: exact, a prefix ending in '*'
+    ('thgr810.*', 'a1*'), or any other fnmatch pattern ('*.4d'), or None
+    for any. Subscriptions are kept in indexes per topic, a dict of exact
+    sources and a trie of prefixes, with globs hung from the trie at their
+    literal prefix. The subscribers found for a topic and source are
+    cached, so dispatch costs a dict lookup and a call per subscriber
+    however many there are. Subscribers are called in the order they
+    subscribed, and may subscribe and unsubscribe at any time, taking
+    effect from the next message. A subscriber raising is logged, and the
+    rest still called.
+
+    >>> from rfxcom.message import X10Message, TempMessage, Message
+    >>> router = Router()
+    >>> def printer(name):
+    ...     def on_message(message):
+    ...         print('%s %s %s' % (name, message.topic, message['source']))
+    ...     return on_message
+    >>> temps = router.subscribe(printer('temps'), topic='temp')
+    >>> lounge = router.subscribe(printer('lounge'), source='thgr810.62')
+    >>> thgr810 = router.subscribe(printer('thgr810'), source='thgr810.*')
+    >>> a1 = router.subscribe(printer('a1'), topic='x10', source='a1*')
+    >>> ch4d = router.subscribe(printer('4d'), source='*.4d')
+    >>> router(TempMessage(source='thgr810.62', temp=21.5))
+    temps temp thgr810.62
+    lounge temp thgr810.62
+    thgr810 temp thgr810.62
+    >>> router(X10Message('a', '12', 'on', 'a12'))
+    a1 x10 a12
+    >>> router(Message('temp.summary', source='thn132n.4d'))
+    4d temp.summary thn132n.4d
+    >>> router.unsubscribe(thgr810)
+    >>> router(TempMessage(source='thgr810.62', temp=21.6))
+    temps temp thgr810.62
+    lounge temp thgr810.62
+    >>> len(router)
+    4
+    """
+
+    # (topic, source) pairs whose subscribers are cached
+    cache_size = 10000
+
+    def __init__(self):
+        self.subscriptions = []
+        self._order = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('rfxcom')
+        self._rebuild()
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def subscribe(self, callback, topic=None, source=None):
+        """Call callback(message, *args) for messages matching topic and source."""
+        with self._lock:
+            self._order += 1
+            subscription = Subscription(callback, topic, source, self._order)
+            self.subscriptions.append(subscription)
+            self._rebuild()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.remove(subscription)
+            self._rebuild()
+
+    def _rebuild(self):
+        # built aside and swapped in whole, so dispatch needs no lock
+        indexes = {}
+        for subscription in self.subscriptions:
+            index = indexes.get(subscription.topic)
+            if index is None:
+                index = indexes[subscription.topic] = _Index()
+            index.add(subscription)
+        self._tables = (indexes, {})
+
+    def match(self, topic, source):
+        """Subscriptions matching a topic and source, in subscription order.
+
+        >>> router = Router()
+        >>> s = router.subscribe(None, source='wtgr800*')
+        >>> router.match('wind', 'wtgr800'), router.match('wind', 'wgr800')
+        ((Subscription(None, topic=None, source='wtgr800*'),), ())
+        """
+        indexes, cache = self._tables
+        key = (topic, source)
+        found = cache.get(key)
+        if found is None:
+            found = []
+            index = indexes.get(topic)
+            if index is not None:
+                index.match(source, found)
+            index = indexes.get(None)
+            if index is not None and topic is not None:
+                index.match(source, found)
+            found.sort(key=lambda s: s.order)
+            found = tuple(found)
+            if len(cache) >= self.cache_size:
+                cache.clear()
+            cache[key] = found
+        return found
+
+    def __call__(self, message, *args):
+        for subscription in self.match(message.topic, message.get('source')):
+            try:
+                subscription.callback(message, *args)
+            except Exception:
+                self.logger.exception('Error in subscriber %r', subscription)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
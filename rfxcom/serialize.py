@@ -0,0 +1,384 @@
+"""Encoding messages as JSON, as compact binary, and in batches.
+
+JSON is an object of the topic and fields, in record field order, or
+sorted for a Message:
+
+>>> from rfxcom.message import TempMessage, X10Message
+>>> m = TempMessage(source='thgr810.62', sensor='thgr810.62', temp=21.5, humidity=40, battery=90)
+>>> print(to_json(m))
+{"topic":"temp","source":"thgr810.62","sensor":"thgr810.62","temp":21.5,"humidity":40,"battery":90}
+>>> from_json(to_json(m)) == m
+True
+
+Binary encodings have a fixed layout per topic, LAYOUTS, so carry no
+field names::
+
+    message: topic:uint8 present:uint8 ints:uint8 numbers strings
+
+present has a bit set for each field that is there, in field order, and
+ints one for each number or string field that held an int. numbers are
+those present of the layout's int32 and float64 fields, little endian;
+strings a uint8 length then UTF-8 for each of its string fields present.
+
+>>> data = to_binary(m)
+>>> len(data), from_binary(data) == m
+(41, True)
+
+A batch starts with the layouts of the topics in it, so it can be read
+without knowing them::
+
+    batch:   b'RFXB' version:uint8 layouts:uint8 (layout)... count:uint32 (message)...
+    layout:  topic:uint8 name fields:uint8 (name type:char)...
+
+>>> batch = to_batch([m, X10Message('a', '11', 'on', 'a11'), m])
+>>> len(batch), from_batch(batch) == [m, X10Message('a', '11', 'on', 'a11'), m]
+(209, True)
+
+Messages keep the encodings made of them with encoded(), so a message
+passed to several consumers is encoded once in each format:
+
+>>> encoded(m, 'binary') is encoded(m, 'binary')
+True
+
+Every message decoded from a stream of frames survives each encoding:
+
+>>> from rfxcom.generators import frames
+>>> from rfxcom.parsers import registry
+>>> stream = [registry.parse(length, bytearray(data)) for length, data in frames(5000, seed=2)]
+>>> messages = [m for m in stream if m]
+>>> all(from_json(to_json(m)) == m and from_binary(to_binary(m)) == m for m in messages)
+True
+>>> from_batch(to_batch(messages)) == messages
+True
+>>> [str(a) for a in from_batch(to_batch(messages))] == [str(m) for m in messages]
+True
+"""
+
+import json
+import struct
+
+from rfxcom.message import TOPICS, build_message, _setattr
+
+SIZE = struct.Struct('B')
+
+try:
+    INTEGERS = (int, long)
+except NameError: # Python 3
+    INTEGERS = (int,)
+
+if bytes is str: # Python 2
+    _text = str
+
+    def _native(values):
+        # as parsers give them, str not unicode
+        return dict((str(k), v.encode('utf-8') if isinstance(v, unicode) else v)
+                    for k, v in values.items())
+else:
+    def _text(data):
+        return data.decode('utf-8')
+
+    def _native(values):
+        return values
+
+def _string(s):
+    """A string as a uint8 length then UTF-8."""
+    if not isinstance(s, bytes):
+        s = s.encode('utf-8')
+    if len(s) > 255:
+        raise ValueError('String too long to encode: %r' % s)
+    return SIZE.pack(len(s)) + s
+
+def _read_string(data, pos):
+    end = pos + 1 + data[pos]
+    return _text(data[pos + 1:end]), end
+
+# JSON
+
+_quote = json.encoder.encode_basestring_ascii
+
+def _float(v):
+    if v - v == 0:
+        return repr(v)
+    # NaN and infinities, as json writes them
+    return json.dumps(v)
+
+JSON_VALUES = {
+    str: _quote,
+    int: repr,
+    float: _float,
+    bool: lambda v: v and 'true' or 'false',
+}
+try:
+    JSON_VALUES[unicode] = _quote
+    JSON_VALUES[long] = str
+except NameError: # Python 3
+    pass
+
+def _json_value(v):
+    return JSON_VALUES.get(v.__class__, json.dumps)(v)
+
+def _json_items(topic, items):
+    return '{"topic":%s%s}' % (_quote(topic), ''.join(
+        [',%s:%s' % (_quote(k), _json_value(v)) for k, v in items]))
+
+def _json_encoder(cls):
+    """JSON encoder for a record type, formatting all its fields at once."""
+    topic = cls.topic
+    fields = cls.fields
+    astuple = cls._astuple
+    template = ('{"topic":%s%s}' % (_quote(topic), ''.join(
+        ',%s:\0' % _quote(f) for f in fields))).replace('%', '%%').replace('\0', '%s')
+    get = JSON_VALUES.get
+
+    def encode(message):
+        values = astuple(message)
+        if None in values:
+            return _json_items(topic, [(f, v) for f, v in zip(fields, values) if v is not None])
+        return template % tuple([get(v.__class__, _json_value)(v) for v in values])
+    return encode
+
+JSON_ENCODERS = dict((cls, _json_encoder(cls)) for cls in TOPICS.values())
+
+def to_json(message):
+    """A message as a JSON object, as text."""
+    encoder = JSON_ENCODERS.get(message.__class__)
+    if encoder is not None:
+        return encoder(message)
+    return _json_items(message.topic, sorted(message.values.items()))
+
+def from_json(text):
+    """The message in a JSON object, as to_json() writes.
+
+    >>> from_json('{"topic":"owl","source":"a6","current1":6.6}')
+    Message('owl', current1=6.6, source='a6')
+    """
+    values = json.loads(text)
+    topic = values.pop('topic')
+    return build_message(str(topic), _native(values))
+
+# binary
+
+# field types in binary layouts: s a string, i an int32, n a number, as a
+# float64 flagged if an int, and v a string or an int, flagged if an int
+LAYOUTS = [
+    # in the order of their ids, so only ever appended to
+    ('x10', 'svss'),
+    ('homeeasy', 'sviss'),
+    ('temp', 'ssniisi'),
+    ('wind', 'ssvnni'),
+    ('rain', 'ssnni'),
+    ('uv', 'ssisi'),
+    ('datetime', 'sssss'),
+    ('owl', 'nnns'),
+]
+NUMBERS = {'i': 'i', 'n': 'd'}
+
+class Layout(object):
+    """How a topic's messages are laid out in binary."""
+
+    def __init__(self, id, topic, fields, types):
+        if len(fields) != len(types) or len(fields) > 8:
+            raise ValueError('Bad layout for %s: %r %r' % (topic, fields, types))
+        self.id = id
+        self.topic = topic
+        self.fields = tuple(fields)
+        self.types = types
+        cls = TOPICS.get(topic)
+        # the record type, when its fields are these, to construct in order
+        self.cls = cls if cls is not None and cls.fields == self.fields else None
+        self._fieldset = frozenset(fields)
+        # structs of the header and numbers, by present fields
+        self._structs = {}
+        self._pack = self._packer()
+
+    def _struct(self, present):
+        s = self._structs.get(present)
+        if s is None:
+            s = self._structs[present] = struct.Struct('<BBB' + ''.join(
+                NUMBERS[t] for i, t in enumerate(self.types) if present >> i & 1 and t in NUMBERS))
+        return s
+
+    def _packer(self):
+        """Function sorting field values into present and ints bits, numbers and strings.
+
+        Generated, as record types' __init__ is, with a test per field.
+        """
+        names = ['v%d' % i for i in range(len(self.fields))]
+        lines = ['def pack(values):',
+                 '    %s, = values' % ', '.join(names),
+                 '    present = ints = 0',
+                 '    numbers = []',
+                 '    strings = []']
+        for i, (name, kind) in enumerate(zip(names, self.types)):
+            bit = 1 << i
+            lines += ['    if %s is not None:' % name,
+                      '        present |= %d' % bit]
+            if kind in 'nv':
+                lines += ['        if %s.__class__ in INTEGERS:' % name,
+                          '            ints |= %d' % bit]
+                if kind == 'v':
+                    lines.append('            %s = str(%s)' % (name, name))
+            if kind in NUMBERS:
+                lines.append('        numbers.append(%s)' % name)
+            else:
+                lines.append('        strings.append(_string(%s))' % name)
+        lines.append('    return present, ints, numbers, strings')
+        namespace = {'INTEGERS': INTEGERS, '_string': _string}
+        exec('\n'.join(lines), namespace)
+        return namespace['pack']
+
+    def schema(self):
+        """The layout as written in a batch."""
+        return (SIZE.pack(self.id) + _string(self.topic) + SIZE.pack(len(self.fields)) +
+                b''.join(_string(f) + t.encode('ascii') for f, t in zip(self.fields, self.types)))
+
+    def encode(self, message):
+        if message.__class__ is self.cls:
+            values = self.cls._astuple(message)
+        else:
+            extra = set(message.values) - self._fieldset
+            if extra:
+                raise ValueError('No binary layout for %s with %s' % (self.topic, ', '.join(sorted(extra))))
+            values = [message.get(f) for f in self.fields]
+        present, ints, numbers, strings = self._pack(values)
+        try:
+            return self._struct(present).pack(self.id, present, ints, *numbers) + b''.join(strings)
+        except struct.error as e:
+            raise ValueError('Cannot encode %r: %s' % (message, e))
+
+    def decode(self, data, pos):
+        """The message at pos in data, a bytearray, and the position after it."""
+        present, ints = data[pos + 1], data[pos + 2]
+        s = self._struct(present)
+        numbers = iter(s.unpack_from(data, pos)[3:])
+        pos += s.size
+        values = []
+        bit = 1
+        for kind in self.types:
+            if not present & bit:
+                values.append(None)
+            else:
+                if kind in NUMBERS:
+                    value = next(numbers)
+                else:
+                    value, pos = _read_string(data, pos)
+                if ints & bit:
+                    value = int(value)
+                values.append(value)
+            bit <<= 1
+        if self.cls is not None:
+            return self.cls(*values), pos
+        return build_message(self.topic, dict(
+            (f, v) for f, v in zip(self.fields, values) if v is not None)), pos
+
+def _layout(id, topic, types):
+    return Layout(id, topic, TOPICS[topic].fields, types)
+
+BY_ID = [_layout(id, topic, types) for id, (topic, types) in enumerate(LAYOUTS)]
+BY_TOPIC = dict((layout.topic, layout) for layout in BY_ID)
+
+def to_binary(message):
+    """A message in its topic's binary layout.
+
+    >>> from rfxcom.message import Message
+    >>> to_binary(Message('rfxsensor', source='0a'))
+    Traceback (most recent call last):
+    ...
+    ValueError: No binary layout for rfxsensor messages
+    """
+    layout = BY_TOPIC.get(message.topic)
+    if layout is None:
+        raise ValueError('No binary layout for %s messages' % message.topic)
+    return layout.encode(message)
+
+def from_binary(data):
+    data = bytearray(data)
+    return BY_ID[data[0]].decode(data, 0)[0]
+
+# batches
+
+MAGIC = b'RFXB'
+VERSION = 1
+BATCH = struct.Struct('<4sBB')
+COUNT = struct.Struct('<I')
+
+def to_batch(messages):
+    """Messages in their binary layouts, after the layouts used."""
+    layouts = {}
+    body = []
+    for message in messages:
+        layout = BY_TOPIC.get(message.topic)
+        if layout is None:
+            raise ValueError('No binary layout for %s messages' % message.topic)
+        layouts[layout.id] = layout
+        body.append(encoded(message, 'binary'))
+    header = [BATCH.pack(MAGIC, VERSION, len(layouts))]
+    header.extend(layouts[id].schema() for id in sorted(layouts))
+    header.append(COUNT.pack(len(body)))
+    return b''.join(header + body)
+
+def from_batch(data):
+    """The messages in a batch, decoded with the layouts it gives."""
+    data = bytearray(data)
+    magic, version, count = BATCH.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a version %d batch: %r' % (VERSION, bytes(data[:5])))
+    pos = BATCH.size
+    layouts = {}
+    for i in range(count):
+        id = data[pos]
+        topic, pos = _read_string(data, pos + 1)
+        fields = []
+        types = []
+        n = data[pos]
+        pos += 1
+        for j in range(n):
+            name, pos = _read_string(data, pos)
+            fields.append(str(name))
+            types.append(chr(data[pos]))
+            pos += 1
+        layouts[id] = Layout(id, topic, fields, ''.join(types))
+    count, = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    messages = []
+    for i in range(count):
+        layout = layouts.get(data[pos])
+        if layout is None:
+            raise ValueError('Batch message with no layout: %d' % data[pos])
+        message, pos = layout.decode(data, pos)
+        messages.append(message)
+    return messages
+
+# cached
+
+FORMATS = {
+    'json': to_json,
+    'binary': to_binary,
+}
+
+def encoded(message, format='json'):
+    """A message in a format of FORMATS, encoded once and kept with it.
+
+    Messages are immutable once made, or a Message item set drops what
+    was kept.
+
+    >>> from rfxcom.message import Message
+    >>> m = Message('owl', source='a6', current1=6.6)
+    >>> print(encoded(m))
+    {"topic":"owl","current1":6.6,"source":"a6"}
+    >>> m['current1'] = 7.2
+    >>> print(encoded(m))
+    {"topic":"owl","current1":7.2,"source":"a6"}
+    """
+    cache = getattr(message, '_encoded', None)
+    if cache is None:
+        cache = {}
+        _setattr(message, '_encoded', cache)
+    data = cache.get(format)
+    if data is None:
+        data = cache[format] = FORMATS[format](message)
+    return data
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,316 @@
+"""Writing messages to SQLite or append-only files, in batches."""
+
+import os
+import time
+import logging
+import threading
+
+from rfxcom.serialize import encoded
+
+class Sink(object):
+    """Buffers messages, writing them out in batches.
+
+    A Sink is an on_message callable, like WorkerPool. Messages are
+    buffered with the time they arrived, and written together once batch
+    of them are waiting, or every interval seconds from a background
+    thread. stop() writes anything still buffered and closes the sink;
+    call it when RFXCom.run() returns.
+
+    Subclasses implement write(rows), given a list of (time, message).
+
+    >>> class Printer(Sink):
+    ...     def write(self, rows):
+    ...         print([m for t, m in rows])
+    >>> sink = Printer(batch=3, interval=None)
+    >>> for m in 'abcd':
+    ...     sink(m)
+    ['a', 'b', 'c']
+    >>> sink.stop()
+    ['d']
+    >>> sink.written, sink.flushes
+    (4, 2)
+    """
+
+    def __init__(self, batch=500, interval=1.0):
+        self.batch = batch
+        self.interval = interval
+        self.buffer = []
+        self.written = 0
+        self.flushes = 0
+        self.logger = logging.getLogger('rfxcom')
+        # guards the buffer; writes are serialised, so batches land in order
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        if interval:
+            self._thread = threading.Thread(target=self._flush_every, name='rfxcom-sink')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __call__(self, message, *args):
+        with self._lock:
+            self.buffer.append((time.time(), message))
+            full = len(self.buffer) >= self.batch
+        if full:
+            self.flush()
+
+    def _flush_every(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception('Error writing to %s', self)
+
+    def flush(self):
+        """Write out everything buffered.
+
+        If writing fails the rows are put back, to be retried on the next
+        flush, and the error raised.
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self.buffer = self.buffer, []
+            if not rows:
+                return
+            try:
+                self.write(rows)
+            except Exception:
+                with self._lock:
+                    self.buffer[:0] = rows
+                raise
+            self.written += len(rows)
+            self.flushes += 1
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def stop(self):
+        """Write out everything buffered, durably, and close."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        self.close()
+
+    def close(self):
+        pass
+
+class SQLiteSink(Sink):
+    """Writes messages to a table per topic in an SQLite database.
+
+    Each flush is one transaction. Tables are named after the topic and
+    created as messages arrive, with a time column and one for each field,
+    added to as new fields turn up.
+
+    >>> from rfxcom.message import TempMessage, X10Message
+    >>> sink = SQLiteSink(':memory:', batch=2, interval=None)
+    >>> sink(TempMessage(source='thn132n.4d', temp=21.3, battery=90))
+    >>> sink(X10Message('a', '11', 'on', 'a11'))
+    >>> sink(TempMessage(source='thn132n.4d', temp=21.4, humidity=50))
+    >>> sink.flush()
+    >>> def show(query):
+    ...     for row in sink.db.execute(query):
+    ...         print(' '.join(str(v) for v in row))
+    >>> show('SELECT source, temp, humidity, battery FROM temp')
+    thn132n.4d 21.3 None 90
+    thn132n.4d 21.4 50 None
+    >>> show('SELECT "group", device, command FROM x10')
+    a 11 on
+    >>> sink.stop()
+
+    A batch that fails is rolled back, with any table or column it added,
+    and written by a later flush:
+
+    >>> from rfxcom.message import HomeEasyMessage
+    >>> sink = SQLiteSink(':memory:', batch=10, interval=None)
+    >>> _ = sink.db.executescript('''
+    ...     CREATE TABLE homeeasy (time REAL);
+    ...     CREATE TABLE disk (full INTEGER);
+    ...     INSERT INTO disk VALUES (1);
+    ...     CREATE TRIGGER quota BEFORE INSERT ON homeeasy WHEN (SELECT full FROM disk)
+    ...     BEGIN SELECT RAISE(ABORT, 'database or disk is full'); END;
+    ... ''')
+    >>> sink(X10Message('a', '11', 'on', 'a11'))
+    >>> sink(TempMessage(source='thn132n.4d', temp=21.3))
+    >>> sink(HomeEasyMessage('31f8177', 'group', command='off', source='31F8177G'))
+    >>> try:
+    ...     sink.flush()
+    ... except Exception as e:
+    ...     print(e)
+    database or disk is full
+    >>> _ = sink.db.execute('UPDATE disk SET full = 0')
+    >>> sink.flush()
+    >>> show('SELECT source, temp FROM temp')
+    thn132n.4d 21.3
+    >>> sink.stop()
+    """
+
+    def __init__(self, path, batch=500, interval=1.0):
+        import sqlite3
+        self.path = path
+        # written to from the flushing thread too, one at a time
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.columns = {}
+        super(SQLiteSink, self).__init__(batch, interval)
+
+    def __repr__(self):
+        return 'SQLiteSink(%r)' % self.path
+
+    def _table(self, topic, fields):
+        """Create topic's table, or add any fields it lacks."""
+        columns = self.columns.get(topic)
+        if columns is None:
+            columns = self.columns[topic] = set(
+                row[1] for row in self.db.execute('PRAGMA table_info(%s)' % quote(topic)))
+            if not columns:
+                self.db.execute('CREATE TABLE %s (time REAL)' % quote(topic))
+                columns.add('time')
+        for field in fields:
+            if field not in columns:
+                self.db.execute('ALTER TABLE %s ADD COLUMN %s' % (quote(topic), quote(field)))
+                columns.add(field)
+
+    def write(self, rows):
+        # one executemany per topic and set of fields
+        groups = {}
+        for t, message in rows:
+            values = message.values
+            fields = tuple(sorted(values))
+            groups.setdefault((message.topic, fields), []).append(
+                (t,) + tuple(values[f] for f in fields))
+        try:
+            with self.db:
+                # tables before rows: some sqlite3 modules commit before
+                # altering a table, which would split the batch
+                for topic, fields in groups:
+                    self._table(topic, fields)
+                for (topic, fields), params in groups.items():
+                    self.db.executemany('INSERT INTO %s (time%s) VALUES (?%s)' % (
+                        quote(topic), ''.join(', ' + quote(f) for f in fields), ', ?' * len(fields)),
+                                        params)
+        except Exception:
+            # tables and columns added may have been rolled back with the rows
+            self.columns.clear()
+            raise
+
+    def close(self):
+        self.db.close()
+
+def quote(name):
+    """Quote an SQL identifier.
+
+    >>> print(quote('group'))
+    "group"
+    """
+    return '"%s"' % name.replace('"', '""')
+
+class FileSink(Sink):
+    """Appends a line per message to a file.
+
+    Each flush is one write. stop() fsyncs the file before closing it.
+    Subclasses implement format(time, message), returning a line.
+
+    >>> import tempfile
+    >>> from rfxcom.message import TempMessage
+    >>> path = os.path.join(tempfile.mkdtemp(), 'temp.csv')
+    >>> sink = CSVSink(path, batch=10, interval=None)
+    >>> sink(TempMessage(source='thn132n.4d', temp=21.3))
+    >>> sink.stop()
+    >>> with open(path) as f:
+    ...     print(f.read().split(',', 1)[1].strip())
+    temp,source=thn132n.4d,temp=21.3
+    """
+
+    def __init__(self, path, batch=500, interval=1.0):
+        self.path = path
+        self.f = open(path, 'ab')
+        super(FileSink, self).__init__(batch, interval)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.path)
+
+    def write(self, rows):
+        format = self.format
+        data = ''.join([format(t, message) + '\n' for t, message in rows])
+        self.f.write(data.encode('utf-8'))
+        self.f.flush()
+
+    def close(self):
+        os.fsync(self.f.fileno())
+        self.f.close()
+
+class LineProtocolSink(FileSink):
+    """Appends messages in InfluxDB line protocol.
+
+    The topic is the measurement and source and sensor are tags; other
+    fields are fields, with a nanosecond timestamp.
+
+    >>> from rfxcom.message import TempMessage, X10Message
+    >>> print(LineProtocolSink.format(1500000000.25, TempMessage(source='thn132n.4d', temp=21.3, battery=90)))
+    temp,source=thn132n.4d battery=90i,temp=21.3 1500000000250000000
+    >>> print(LineProtocolSink.format(1500000000, X10Message('a', '11', 'on', 'a 11')))
+    x10,source=a\\ 11 command="on",device="11",group="a" 1500000000000000000
+    """
+
+    tags = ('source', 'sensor')
+
+    @staticmethod
+    def format(t, message):
+        tags = []
+        fields = []
+        for k, v in sorted(message.values.items()):
+            if k in LineProtocolSink.tags:
+                tags.append(',%s=%s' % (escape(k), escape(str(v))))
+            elif isinstance(v, bool):
+                fields.append('%s=%s' % (escape(k), v and 'true' or 'false'))
+            elif isinstance(v, int):
+                fields.append('%s=%di' % (escape(k), v))
+            elif isinstance(v, float):
+                fields.append('%s=%r' % (escape(k), v))
+            else:
+                fields.append('%s="%s"' % (escape(k), str(v).replace('\\', '\\\\').replace('"', '\\"')))
+        return '%s%s %s %d' % (escape(message.topic), ''.join(tags), ','.join(fields),
+                               int(round(t * 1e6)) * 1000)
+
+def escape(s):
+    return s.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+class CSVSink(FileSink):
+    """Appends messages to a CSV file of time, topic and field=value pairs.
+
+    >>> from rfxcom.message import TempMessage
+    >>> print(CSVSink.format(1500000000.25, TempMessage(source='thn132n.4d', temp=21.3, battery=90)))
+    1500000000.25,temp,battery=90,source=thn132n.4d,temp=21.3
+    """
+
+    @staticmethod
+    def format(t, message):
+        cells = ['%r' % t, message.topic]
+        cells.extend('%s=%s' % (k, v) for k, v in sorted(message.values.items()))
+        return ','.join(csv_quote(c) for c in cells)
+
+class JSONSink(FileSink):
+    """Appends messages as JSON lines, each with the time it arrived.
+
+    Lines are the message's cached JSON (see rfxcom.serialize) with the
+    time spliced in, so a message also going to other consumers as JSON
+    is encoded once.
+
+    >>> from rfxcom.message import TempMessage
+    >>> print(JSONSink.format(1500000000.25, TempMessage(source='thn132n.4d', temp=21.3, battery=90)))
+    {"timestamp":1500000000.25,"topic":"temp","source":"thn132n.4d","temp":21.3,"battery":90}
+    """
+
+    @staticmethod
+    def format(t, message):
+        return '{"timestamp":%r,%s' % (t, encoded(message)[1:])
+
+def csv_quote(s):
+    if ',' in s or '"' in s or '\n' in s:
+        return '"%s"' % s.replace('"', '""')
+    return s
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,170 @@
+"""Latest reading of each source, and passing on only those that change."""
+
+import time
+
+# example thresholds, by field, below which a change is not passed on
+THRESHOLDS = {
+    'temp': 0.1,
+    'humidity': 1,
+    'baro': 1,
+    'current1': 0.1,
+    'current2': 0.1,
+    'current3': 0.1,
+}
+
+class State(object):
+    """The latest message from each source, and when it was seen.
+
+    >>> from rfxcom.message import TempMessage
+    >>> state = State()
+    >>> state.update(TempMessage(source='thn132n.4d', temp=21.3), now=100)
+    >>> state.update(TempMessage(source='thn132n.4d', temp=21.4), now=140)
+    >>> state['thn132n.4d']
+    Message('temp', source='thn132n.4d', temp=21.4)
+    >>> state.last_seen('thn132n.4d'), state.get('a11'), 'thn132n.4d' in state, len(state)
+    (140, None, True, 1)
+
+    Messages without a source are not kept.
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.seen = {}
+
+    def update(self, message, now=None):
+        source = message.get('source')
+        if source is not None:
+            self.messages[source] = message
+            self.seen[source] = time.time() if now is None else now
+
+    def __getitem__(self, source):
+        return self.messages[source]
+
+    def get(self, source, default=None):
+        return self.messages.get(source, default)
+
+    def last_seen(self, source):
+        """Time source was last heard, or None."""
+        return self.seen.get(source)
+
+    def __contains__(self, source):
+        return source in self.messages
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+class ChangeFilter(object):
+    """Calls on_message only with messages that differ from the last it passed on.
+
+    Like WorkerPool, a ChangeFilter is itself an on_message callable.
+    Messages from each source (and topic) are compared with the last one
+    passed on: a numeric field in thresholds must have moved by at least
+    its threshold, any other field must differ. A message that has not
+    changed is still passed on once heartbeat seconds have gone by since
+    the last, so a quiet source can be told from a dead one. Messages
+    without a source are always passed on.
+
+    Every message updates state, so the latest reading is at hand either
+    way.
+
+    >>> from rfxcom.message import TempMessage
+    >>> def on_message(message):
+    ...     print(message)
+    >>> f = ChangeFilter(on_message, THRESHOLDS, heartbeat=600)
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.3, battery=90), now=0)
+    True
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.35, battery=90), now=40)
+    False
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.4, battery=90), now=80)
+    True
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.4, battery=10), now=120)
+    True
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.4, battery=10), now=680)
+    False
+    >>> f.check(TempMessage(source='thn132n.4d', temp=21.4, battery=10), now=720)
+    True
+    >>> f.state['thn132n.4d']['temp'], f.passed, f.suppressed
+    (21.4, 4, 2)
+    >>> f(TempMessage(source='thn132n.4d', temp=22.0, battery=10))
+    topic: temp, source: thn132n.4d, temp: 22.0, battery: 10
+    True
+    """
+
+    def __init__(self, on_message, thresholds=None, heartbeat=600, state=None):
+        self.on_message = on_message
+        self.thresholds = dict(thresholds or {})
+        self.heartbeat = heartbeat
+        self.state = State() if state is None else state
+        # last message passed on, and when, by (topic, source)
+        self.last = {}
+        self.passed = 0
+        self.suppressed = 0
+
+    def __call__(self, message, *args):
+        """Pass message on if it has changed, returning whether it was."""
+        if not self.check(message):
+            return False
+        self.on_message(message, *args)
+        return True
+
+    def check(self, message, now=None):
+        """Record message, returning whether it should be passed on."""
+        if now is None:
+            now = time.time()
+        self.state.update(message, now)
+        source = message.get('source')
+        if source is None:
+            self.passed += 1
+            return True
+
+        key = (message.topic, source)
+        last = self.last.get(key)
+        if last is not None and now - last[1] < self.heartbeat and not self.changed(last[0], message):
+            self.suppressed += 1
+            return False
+        self.last[key] = (message, now)
+        self.passed += 1
+        return True
+
+    def changed(self, last, message):
+        """Whether message differs from last by more than the thresholds.
+
+        >>> from rfxcom.message import OwlMessage
+        >>> f = ChangeFilter(None, {'current1': 0.1})
+        >>> f.changed(OwlMessage(current1=2.0, current2=0.0), OwlMessage(current1=2.08, current2=0.0))
+        False
+        >>> f.changed(OwlMessage(current1=2.0, current2=0.0), OwlMessage(current1=1.9, current2=0.0))
+        True
+        >>> f.changed(OwlMessage(current1=2.0, current2=0.0), OwlMessage(current1=2.0, current2=0.01))
+        True
+        """
+        if message == last:
+            # the common case, a sensor repeating itself
+            return False
+        thresholds = self.thresholds
+        new, old = message.values, last.values
+        if len(new) != len(old):
+            return True
+        for field, value in new.items():
+            if field not in old:
+                return True
+            previous = old[field]
+            if value == previous:
+                continue
+            threshold = thresholds.get(field)
+            if threshold is None:
+                return True
+            try:
+                # rounded, so a reading 0.1 apart is 0.1 apart
+                if round(abs(value - previous), 9) >= threshold:
+                    return True
+            except TypeError:
+                return True
+        return False
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,114 @@
+"""Keeping a receiver running through the device being lost."""
+
+import time
+import logging
+
+from rfxcom import DeviceError
+from rfxcom.metrics import clock
+
+class Supervisor(object):
+    """Runs an RFXCom, reconnecting whenever the device is lost.
+
+    When a read fails (the dongle reset or was unplugged), the device is
+    closed and connected again: the device glob is resolved afresh, as the
+    port may come back under another name, and the handshake redone with
+    reads timing out after handshake_timeout. Failed attempts are retried
+    after backoff seconds, doubling up to max_backoff. Reconnects and the
+    time each took are kept in rfx.metrics. Only a DeviceError counts as
+    the device being lost: anything else, such as an IOError raised by
+    on_message, is raised from run().
+
+    >>> from rfxcom import RFXCom, FakeRFXSerial
+    >>> class Flaky(FakeRFXSerial):
+    ...     connects = 0
+    ...     def __init__(self, *args, **kwargs):
+    ...         Flaky.connects += 1
+    ...         if Flaky.connects == 2:
+    ...             raise DeviceError('Error: No USB serial ports found')
+    ...         FakeRFXSerial.__init__(self)
+    ...     def read(self, size=1):
+    ...         if Flaky.connects == 1 and len(self.packets) == 2:
+    ...             raise IOError('device disconnected')
+    ...         return FakeRFXSerial.read(self, size)
+    >>> def on_message(message):
+    ...     print(message)
+    ...     if message['source'] == '31F8177G':
+    ...         rfx.stop()
+    >>> rfx = RFXCom(on_message, serial_type=Flaky)
+    >>> rfx.setup()
+    >>> Supervisor(rfx, backoff=0.01).run()
+    topic: x10, group: a, device: 11, command: on, source: a11
+    topic: x10, group: a, device: 01, command: off, source: a01
+    topic: homeeasy, address: 31f8177, device: group, command: off, source: 31F8177G
+    >>> Flaky.connects, rfx.metrics.reconnects, rfx.stats()['downtime'] < 1
+    (3, 1, True)
+
+    >>> class DiskFull(EnvironmentError):
+    ...     pass
+    >>> def save(message):
+    ...     raise DiskFull('No space left on device')
+    >>> rfx = RFXCom(save, serial_type=FakeRFXSerial)
+    >>> rfx.setup()
+    >>> try:
+    ...     Supervisor(rfx, backoff=0.01).run()
+    ... except DiskFull as e:
+    ...     print(e)
+    No space left on device
+    >>> rfx.metrics.reconnects
+    0
+    """
+
+    def __init__(self, rfx, backoff=0.05, max_backoff=5.0, handshake_timeout=0.1):
+        self.rfx = rfx
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.handshake_timeout = handshake_timeout
+        self.logger = logging.getLogger('rfxcom')
+
+    def run(self):
+        """Run until rfx is stopped, or a replayed capture ends."""
+        rfx = self.rfx
+        while not rfx.stopping:
+            try:
+                rfx.run()
+                return
+            except DeviceError as e:
+                if rfx.stopping:
+                    return
+                self.logger.error('Device lost: %s', e)
+            self.reconnect()
+
+    def reconnect(self):
+        """Connect and initialise the device again, however long it takes."""
+        rfx = self.rfx
+        lost = clock()
+        try:
+            rfx.disconnect()
+        except EnvironmentError:
+            pass
+        backoff = self.backoff
+        attempts = 1
+        while not rfx.stopping:
+            try:
+                rfx.setup(retries=1, timeout=self.handshake_timeout)
+                break
+            except DeviceError as e:
+                self.logger.info('Reconnect failed: %s, retrying in %gs', e, backoff)
+                try:
+                    rfx.disconnect()
+                except EnvironmentError:
+                    pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+            attempts += 1
+        else:
+            return
+
+        elapsed = clock() - lost
+        rfx.metrics.reconnects += 1
+        rfx.metrics.reconnect.observe(elapsed)
+        self.logger.info('Reconnected in %.3fs after %d attempts', elapsed, attempts)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
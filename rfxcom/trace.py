@@ -0,0 +1,72 @@
+import time
+
+class Hex(object):
+    """Formats bytes as hex only when converted to a string.
+
+    >>> str(Hex(b'\\x64\\x9b')), str(Hex((0x64, 0x9b)))
+    ('64 9b', '64 9b')
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return ' '.join('%02x' % d for d in bytearray(self.data))
+
+class FrameTrace(object):
+    """Fixed size ring buffer of the most recently received raw frames.
+
+    Slots are allocated up front and recording a frame only stores
+    references, so it can be left on in production. Frames are formatted
+    only when the trace is dumped.
+
+    >>> t = FrameTrace(2)
+    >>> t.record(32, b'\\x64\\x9b\\x08\\xf7', now=1.0)
+    >>> t.record(12, b'\\x12\\x30', now=2.0)
+    >>> t.record(34, b'\\xc7\\xe0\\x5d\\xe0\\x00', now=3.5)
+    >>> [(when, length) for when, length, data in t.dump()]
+    [(2.0, 12), (3.5, 34)]
+    >>> print(t)
+    2.000  12 [12 30]
+    3.500  34 [c7 e0 5d e0 00]
+    >>> len(t), t.count
+    (2, 3)
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.times = [0.0] * size
+        self.lengths = [0] * size
+        self.frames = [None] * size
+        self.count = 0
+
+    def record(self, length, data, now=None):
+        i = self.count % self.size
+        self.times[i] = time.time() if now is None else now
+        self.lengths[i] = length
+        self.frames[i] = data
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def dump(self):
+        """Recorded (time, length, data) frames, oldest first."""
+        n = len(self)
+        start = self.count - n
+        return [(self.times[i % self.size], self.lengths[i % self.size], self.frames[i % self.size])
+                for i in range(start, start + n)]
+
+    def clear(self):
+        self.count = 0
+        for i in range(self.size):
+            self.frames[i] = None
+
+    def __str__(self):
+        return '\n'.join('%.3f %3d [%s]' % (when, length, Hex(data))
+                         for when, length, data in self.dump())
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
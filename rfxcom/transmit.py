@@ -0,0 +1,309 @@
+"""Sending X10 and HomeEasy commands, paced to the time they take on air."""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from rfxcom.metrics import Histogram, clock, _histogram
+from rfxcom.parsers import X10Parser, HomeEasyParser
+
+# encoder by topic, the inverse of the parser's parse()
+ENCODERS = {
+    'x10': X10Parser.encode,
+    'homeeasy': HomeEasyParser.encode,
+}
+
+# seconds one frame takes to send, by topic: an X10 RF frame is a 9ms
+# leader then 32 bits of 1.1 or 2.2ms, a HomeEasy one 32 or 36 bits of
+# about 2ms after a 10ms sync
+AIRTIME = {
+    'x10': 0.075,
+    'homeeasy': 0.085,
+}
+# times each frame is sent, as remotes do, so a receiver missing one
+# still acts
+REPEATS = {
+    'x10': 5,
+    'homeeasy': 4,
+}
+# commands that change state relative to the current one, never coalesced
+RELATIVE = frozenset(['dim', 'bright'])
+
+def encode(message):
+    """(length, packet) to send for a message.
+
+    >>> from rfxcom.message import Message, X10Message
+    >>> encode(X10Message('a', '11', 'on'))[0]
+    32
+    >>> encode(Message('owl', source='a6'))
+    Traceback (most recent call last):
+    ...
+    ValueError: Cannot send owl messages
+    """
+    encoder = ENCODERS.get(message.topic)
+    if encoder is None:
+        raise ValueError('Cannot send %s messages' % message.topic)
+    return encoder(message)
+
+def frame(message):
+    """A message as the bytes written to the device: length header then packet.
+
+    >>> from rfxcom.message import HomeEasyMessage
+    >>> frame(HomeEasyMessage('31f8177', 'group', command='off')) == b'\\x22\\xc7\\xe0\\x5d\\xe0\\x00'
+    True
+    """
+    length, packet = encode(message)
+    return bytes(bytearray((length,))) + packet
+
+class Command(object):
+    """A message queued to send, with when it was queued and finished.
+
+    done is when its last repeat is due to have been sent, and latency
+    the seconds from being queued until then. A command replaced before
+    it was sent is coalesced, and never done.
+    """
+
+    __slots__ = ('message', 'frame', 'queued', 'started', 'done', 'coalesced', '_event')
+
+    def __init__(self, message, queued):
+        self.message = message
+        self.frame = frame(message)
+        self.queued = queued
+        self.started = self.done = None
+        self.coalesced = False
+        self._event = threading.Event()
+
+    @property
+    def latency(self):
+        if self.done is None:
+            return None
+        return self.done - self.queued
+
+    def wait(self, timeout=None):
+        """Wait for the command to be sent or coalesced, returning whether it was."""
+        self._event.wait(timeout)
+        return self._event.is_set()
+
+    def __repr__(self):
+        return 'Command(%r)' % self.message
+
+class SendQueue(object):
+    """Sends commands to a device, one at a time, as fast as the air allows.
+
+    device is anything with write(bytes): an RFXCom that has been set up,
+    or a serial type. Each command's frame is written repeats times, and
+    the next write is made once the frame before has had its airtime, less
+    the time the bytes take down the serial line, so frames follow each
+    other on air without gaps.
+
+    A command for a source with one already waiting replaces it, keeping
+    its place in the queue: switching a scene twice sends only the last
+    state. A command the same as one being sent is dropped. Relative
+    commands (dim, bright) are always sent. Latency from queueing to the
+    last repeat is recorded per command and in a histogram.
+
+    Commands are sent from a background thread, or with thread=False by
+    calling poll():
+
+    >>> from rfxcom.message import X10Message, HomeEasyMessage
+    >>> written = []
+    >>> class Device(object):
+    ...     def write(self, data):
+    ...         written.append(data)
+    >>> q = SendQueue(Device(), airtime={'x10': 0.1, 'homeeasy': 0.1},
+    ...               repeats={'x10': 2, 'homeeasy': 1}, baudrate=5000, thread=False)
+    >>> on = q.send(X10Message('a', '01', 'on', 'a01'), now=0)
+    >>> q.send(HomeEasyMessage('31f8177', 'group', command='off', source='31F8177G'), now=0)
+    Command(Message('homeeasy', address='31f8177', command='off', device='group', source='31F8177G'))
+    >>> off = q.send(X10Message('a', '01', 'off', 'a01'), now=0)
+    >>> on.coalesced, len(q)
+    (True, 2)
+
+    The X10 frame goes twice, then the HomeEasy one is written 0.012s (its
+    time down the line) before the air is free:
+
+    >>> round(q.poll(now=0), 3), len(written)
+    (0.1, 1)
+    >>> round(q.poll(now=0.1), 3), len(written), round(off.latency, 3)
+    (0.098, 2, 0.21)
+    >>> q.poll(now=0.198), len(written), q.stats()['coalesced']
+    (None, 3, 1)
+    >>> [bytearray(w)[3] & 0x20 for w in written[:2]]
+    [32, 32]
+
+    Switching back to what is on air drops what was waiting in between:
+
+    >>> q.send(X10Message('a', '01', 'on', 'a01'), now=1)
+    Command(Message('x10', command='on', device='01', group='a', source='a01'))
+    >>> q.poll(now=1) > 0
+    True
+    >>> off = q.send(X10Message('a', '01', 'off', 'a01'), now=1)
+    >>> q.send(X10Message('a', '01', 'on', 'a01'), now=1) is q.current, len(q), off.coalesced
+    (True, 1, True)
+
+    A scene sent through an RFXCom:
+
+    >>> from rfxcom import RFXCom, FakeRFXSerial
+    >>> rfx = RFXCom(None, serial_type=FakeRFXSerial)
+    >>> rfx.setup()
+    >>> q = SendQueue(rfx, airtime={'x10': 0.001, 'homeeasy': 0.001})
+    >>> scene = [q.send(X10Message(group, '01', 'on', group + '01')) for group in 'abcd']
+    >>> q.flush(timeout=5), len(rfx.serial.sent), all(c.latency < 1 for c in scene)
+    (True, 20, True)
+    >>> q.stop()
+    """
+
+    # seconds from being queued until the last repeat is sent
+    latency_bounds = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, device, airtime=AIRTIME, repeats=REPEATS, baudrate=4800, thread=True):
+        self.device = device
+        self.airtime = airtime
+        self.repeats = repeats
+        # seconds per byte down the serial line, 10 bits with start and stop
+        self.byte_time = 10.0 / baudrate
+        # waiting commands by source, or (source, n) for relative ones
+        self.queue = OrderedDict()
+        self.current = None
+        self._repeat = 0
+        # when the frame last written will have been sent
+        self._free = 0.0
+        self._relative = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.frames = 0
+        self.latency = Histogram(self.latency_bounds)
+        self.logger = logging.getLogger('rfxcom')
+        self._lock = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        if thread:
+            self._thread = threading.Thread(target=self._run, name='rfxcom-send')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __len__(self):
+        return len(self.queue) + (self.current is not None)
+
+    def send(self, message, now=None):
+        """Queue message to be sent, returning its Command."""
+        command = Command(message, clock() if now is None else now)
+        source = message.get('source')
+        with self._lock:
+            if message.get('command') in RELATIVE or source is None:
+                self._relative += 1
+                self.queue[source, self._relative] = command
+            else:
+                current = self.current
+                if (current is not None and current.frame == command.frame):
+                    # what is on air is the state wanted, so nothing waiting for it is
+                    waiting = self.queue.pop(source, None)
+                    if waiting is not None:
+                        self._coalesce(waiting)
+                    self._coalesce(command)
+                    return current
+                waiting = self.queue.get(source)
+                if waiting is not None:
+                    self._coalesce(waiting)
+                self.queue[source] = command
+            self._lock.notify_all()
+        return command
+
+    def _coalesce(self, command):
+        command.coalesced = True
+        command._event.set()
+        self.coalesced += 1
+
+    def poll(self, now=None):
+        """Write what is due, returning seconds until the next write, or None if idle."""
+        with self._lock:
+            while True:
+                if now is None:
+                    now = clock()
+                command = self.current
+                if command is None:
+                    if not self.queue:
+                        return None
+                    key, command = self.queue.popitem(last=False)
+                    self.current = command
+                    self._repeat = 0
+                topic = command.message.topic
+                transfer = len(command.frame) * self.byte_time
+                due = self._free - transfer
+                if now < due:
+                    return due - now
+                self.device.write(command.frame)
+                self.frames += 1
+                if command.started is None:
+                    command.started = now
+                self._free = max(now + transfer, self._free) + self.airtime[topic]
+                self._repeat += 1
+                if self._repeat >= self.repeats[topic]:
+                    command.done = self._free
+                    self.latency.observe(command.latency)
+                    self.sent += 1
+                    self.current = None
+                    command._event.set()
+                    if not self.queue:
+                        self._lock.notify_all()
+                    self.logger.debug('Sent %s in %.3fs', command.message, command.latency)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                try:
+                    delay = self.poll()
+                except Exception:
+                    self.logger.exception('Error sending')
+                    delay = 1.0
+                if self._stopping:
+                    return
+                self._lock.wait(delay)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued has been sent, or timeout passes.
+
+        Returns whether the queue was emptied.
+        """
+        deadline = None if timeout is None else clock() + timeout
+        with self._lock:
+            while len(self):
+                delay = None
+                if self._thread is None:
+                    delay = self.poll()
+                    if not len(self):
+                        break
+                if deadline is not None:
+                    left = deadline - clock()
+                    if left <= 0:
+                        return False
+                    delay = left if delay is None else min(delay, left)
+                if self._thread is None:
+                    time.sleep(delay)
+                else:
+                    self._lock.wait(delay)
+        return True
+
+    def stop(self):
+        """Stop sending, dropping anything still queued."""
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'frames': self.frames,
+            'queued': len(self),
+            'latency': _histogram(self.latency),
+        }
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
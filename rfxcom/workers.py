@@ -0,0 +1,223 @@
+"""Handing messages off the reading thread to a pool of workers."""
+
+import logging
+import threading
+from collections import deque
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+class BoundedQueue(object):
+    """FIFO of at most size items, with a policy for when it is full.
+
+    BLOCK waits for space, DROP_OLDEST discards the item at the head to make
+    room and DROP_NEWEST discards the item being put. Discarded items are
+    counted in dropped.
+
+    >>> q = BoundedQueue(2, DROP_OLDEST)
+    >>> [q.put(i) for i in range(4)]
+    [True, True, True, True]
+    >>> q.get(), q.get(), q.dropped
+    (2, 3, 2)
+    >>> q = BoundedQueue(2, DROP_NEWEST)
+    >>> [q.put(i) for i in range(4)]
+    [True, True, False, False]
+    >>> q.get(), q.get(), q.dropped
+    (0, 1, 2)
+    >>> q.close(); q.get()
+    Traceback (most recent call last):
+    ...
+    IndexError: queue closed
+    """
+
+    def __init__(self, size, policy=BLOCK):
+        if policy not in POLICIES:
+            raise ValueError('unknown policy: %r' % policy)
+        self.size = size
+        self.policy = policy
+        self.items = deque()
+        self.closed = False
+        self.put_count = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """Add item, returning False if it was dropped."""
+        with self.lock:
+            items = self.items
+            if self.closed:
+                self.dropped += 1
+                return False
+            if len(items) >= self.size:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif self.policy == DROP_OLDEST:
+                    items.popleft()
+                    self.dropped += 1
+                else:
+                    while len(items) >= self.size and not self.closed:
+                        self.not_full.wait()
+                    if self.closed:
+                        self.dropped += 1
+                        return False
+            items.append(item)
+            self.put_count += 1
+            if len(items) > self.high_water:
+                self.high_water = len(items)
+            self.not_empty.notify()
+            return True
+
+    def get(self):
+        """Remove and return the head item, raising IndexError once closed and empty."""
+        with self.lock:
+            items = self.items
+            while not items:
+                if self.closed:
+                    raise IndexError('queue closed')
+                self.not_empty.wait()
+            item = items.popleft()
+            self.not_full.notify()
+            return item
+
+    def close(self, discard=False):
+        """Refuse new items, waking all waiting threads."""
+        with self.lock:
+            self.closed = True
+            if discard:
+                self.dropped += len(self.items)
+                self.items.clear()
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+class WorkerPool(object):
+    """Calls a slow on_message from worker threads, so reading never waits.
+
+    A WorkerPool is itself an on_message callable: pass it to RFXCom (or
+    Hub) and the thread running ``rfx.run()`` only reads, frames and decodes,
+    while messages are queued for workers to handle. The queue is bounded,
+    and policy decides what happens when workers fall behind: BLOCK the
+    reader, DROP_OLDEST or DROP_NEWEST.
+
+    >>> import time
+    >>> started, release = threading.Event(), threading.Event()
+    >>> handled = []
+    >>> def slow(message):
+    ...     started.set()
+    ...     release.wait()
+    ...     handled.append(message)
+    >>> pool = WorkerPool(slow, workers=1, size=2, policy=DROP_OLDEST)
+    >>> pool('a')
+    True
+    >>> started.wait(5)
+    True
+    >>> [pool(m) for m in 'bcde']
+    [True, True, True, True]
+    >>> release.set()
+    >>> pool.close()
+    >>> handled, pool.dropped, pool.processed
+    (['a', 'd', 'e'], 2, 3)
+
+    With ordered, messages from each source go to the same worker, so they
+    are handled in the order they were received:
+
+    >>> from rfxcom.message import X10Message
+    >>> handled = []
+    >>> def record(message):
+    ...     time.sleep(0.001)
+    ...     handled.append(message)
+    >>> pool = WorkerPool(record, workers=4, ordered=True)
+    >>> sent = [X10Message('a', '%02d' % (i % 4), str(i), 'a%d' % (i % 4)) for i in range(40)]
+    >>> for m in sent:
+    ...     ok = pool(m)
+    >>> pool.close()
+    >>> def by_source(messages):
+    ...     return sorted((s, [m for m in messages if m.source == s]) for s in set(m.source for m in messages))
+    >>> by_source(handled) == by_source(sent)
+    True
+    """
+
+    def __init__(self, on_message, workers=4, size=1000, policy=BLOCK, ordered=False, key=None):
+        self.on_message = on_message
+        self.ordered = ordered
+        self.key = key or (lambda message: message.get('source'))
+        self.logger = logging.getLogger('rfxcom')
+        # one queue shared by all workers, or one each when ordered
+        self.queues = [BoundedQueue(size, policy) for i in range(workers if ordered else 1)]
+        self.processed = 0
+        self.errors = 0
+        self._count_lock = threading.Lock()
+        self.threads = []
+        for i in range(workers):
+            queue = self.queues[i % len(self.queues)]
+            t = threading.Thread(target=self._work, args=(queue,), name='rfxcom-worker-%d' % i)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def __call__(self, *args):
+        """Queue a message for the workers, returning False if it was dropped."""
+        queues = self.queues
+        if self.ordered:
+            queue = queues[hash(self.key(args[0])) % len(queues)]
+        else:
+            queue = queues[0]
+        return queue.put(args)
+
+    def _work(self, queue):
+        on_message = self.on_message
+        processed = errors = 0
+        try:
+            while True:
+                try:
+                    args = queue.get()
+                except IndexError:
+                    return
+                try:
+                    on_message(*args)
+                except Exception:
+                    errors += 1
+                    self.logger.exception('Error handling message %s', args[0])
+                processed += 1
+                if not len(queue):
+                    # fold counts in when idle rather than per message
+                    processed, errors = self._count(processed, errors)
+        finally:
+            self._count(processed, errors)
+
+    def _count(self, processed, errors):
+        with self._count_lock:
+            self.processed += processed
+            self.errors += errors
+        return 0, 0
+
+    @property
+    def dropped(self):
+        return sum(q.dropped for q in self.queues)
+
+    @property
+    def queued(self):
+        return sum(len(q) for q in self.queues)
+
+    def close(self, wait=True, discard=False):
+        """Stop accepting messages, and let workers finish those queued.
+
+        With discard, queued messages are dropped instead.
+        """
+        for queue in self.queues:
+            queue.close(discard)
+        if wait:
+            for t in self.threads:
+                t.join()
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
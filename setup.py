@@ -1,7 +1,7 @@
 from setuptools import setup
 
 __version__ = '0.1.0'
-long_description = file('README.md', 'r').read()
+long_description = open('README.md', 'r').read()
 
 setup(name='pyrfxcom',
       version=__version__,
@@ -11,8 +11,12 @@ setup(name='pyrfxcom',
       author='Barnaby Gray',
       author_email='barnaby@pickle.me.uk',
       url='http://github.com/barnybug/pyrfxcom/',
-      packages=['rfxcom'],
+      packages=['rfxcom', 'rfxcom.parsers'],
       install_requires=[],
+      extras_require={'batch': ['numpy']},
+      entry_points={
+        'console_scripts': ['rfxcom-reprocess = rfxcom.reprocess:main'],
+        },
       classifiers=[
         "Development Status :: 3 - Alpha",
         "Topic :: Software Development :: Libraries :: Python Modules",